@@ -10,6 +10,7 @@ import re
 import json
 import signal
 import subprocess as sp
+from collections import OrderedDict
 import cothread
 import cothread.catools as ca
 
@@ -36,8 +37,33 @@ class Delta(object):
             _log.debug("%s (re-)connect %s", val.name, val)
             self.connected = True
 
+# Collects PV writes, which are then flushed together as a single
+# non-blocking caput() from a cothread callback.
+class StatusWriter(object):
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.scheduled = False
+    def put(self, pv, value):
+        self.pending[pv] = value # latest value wins
+        if not self.scheduled:
+            self.scheduled = True
+            cothread.Callback(self.flush)
+    def flush(self):
+        self.scheduled = False
+        pending, self.pending = self.pending, OrderedDict()
+        if not pending:
+            return
+        pvs, values = list(pending.keys()), list(pending.values())
+        _log.debug("Write %s", pending)
+        for ret in ca.caput(pvs, values, wait=False, throw=False):
+            if not ret.ok:
+                _log.warn("Error writing %s: %s", ret.name, ret)
+
+writer = StatusWriter()
+
 class ProcControl(object):
     all_procs = set()
+    by_pid = {} # running children.  {pid:ProcControl}
     def __init__(self, pref, args, logto=None, **kws):
         self.pref = pref
         self.args, self.logto, self.launch_args = args, logto, kws
@@ -51,9 +77,9 @@ class ProcControl(object):
         self.cmd_stop  = ca.camonitor('%sSTOP_'%self.pref, Delta(lambda _val:self.evt.Signal(stop)),  notify_disconnect=True)
         self.cmd_abort = ca.camonitor('%sABRT_'%self.pref, Delta(lambda _val:self.evt.Signal(abort)), notify_disconnect=True)
 
-        ca.caput('%sSTS'%self.pref, 0, wait=True)
-
         self.child = None
+        self.current_status = None
+        self.set_status(0)
 
         # our long running task
         self.ca_task = cothread.Spawn(self.loop)
@@ -78,7 +104,16 @@ class ProcControl(object):
     def child_term(self):
         return self.child is None or self.child.poll() is not None
 
-    def sigchld(self):
+    def exited(self, pid, status):
+        # called from reap_all() with a status from os.waitpid()
+        if os.WIFSIGNALED(status):
+            ret = -os.WTERMSIG(status)
+        else:
+            ret = os.WEXITSTATUS(status)
+        _log.debug("%s Child %d exit %s", self.pref, pid, ret)
+        if self.child is not None and self.child.pid == pid:
+            # we have reaped, so Popen can not
+            self.child.returncode = ret
         self.evt.Signal(sigchld)
 
     def loop(self):
@@ -87,6 +122,9 @@ class ProcControl(object):
                 val = self.evt.Wait()
                 _log.debug("Wakeup with %s", val)
 
+                # a child may have exited before its SIGCHLD is handled.
+                # STS is only written on change, so this is cheap.
+                reap_all()
                 self.check_status()
 
                 if val == start:
@@ -110,7 +148,8 @@ class ProcControl(object):
             sts = 0 # Crash (really Init)
             ret = -1
         else:
-            ret = self.child.poll()
+            # set by exited()
+            ret = self.child.returncode
             _log.debug("%s Child status %s", self.pref, ret)
 
             if ret is None:
@@ -120,9 +159,13 @@ class ProcControl(object):
             else:
                 sts = 0 # Crash
 
-        ca.caput('%sSTS'%self.pref, sts, wait=True)
+        self.set_status(sts)
 
-        self.current_status = sts
+    def set_status(self, sts):
+        # only write STS on transitions
+        if sts != self.current_status:
+            self.current_status = sts
+            writer.put('%sSTS'%self.pref, sts)
 
     def handle_start(self):
         if self.current_status != 2:
@@ -143,13 +186,16 @@ class ProcControl(object):
                 args.update(self.launch_args)
 
                 self.child = sp.Popen(self.args, **args)
+                # SIGCHLD is handled through a cothread.Callback,
+                # so reap_all() can not run before this entry is added
+                self.by_pid[self.child.pid] = self
 
             finally:
                 if fp is not None:
                     fp.close()
 
-            ca.caput('%sSTS'%self.pref, 2, wait=True)
-            ca.caput('%sTS'%self.pref, time.strftime("%Y-%m-%d-%H:%M:%S",time.localtime(sec)), wait=True)
+            self.set_status(2)
+            writer.put('%sTS'%self.pref, time.strftime("%Y-%m-%d-%H:%M:%S",time.localtime(sec)))
 
     def handle_stop(self):
         if self.current_status == 2:
@@ -203,13 +249,26 @@ class KeepAlive(object):
 
             self.incr()
 
-def poke_all():
+def reap_all():
     _log.debug("SIGCHLD 2")
-    [proc.sigchld() for proc in ProcControl.all_procs]
+    # SIGCHLD may be coalesced, so reap until no more exited children.
+    # Notify only the ProcControl of each exited child.
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError: # ECHILD, no children
+            break
+        if pid==0:
+            break # no more exited
+        proc = ProcControl.by_pid.pop(pid, None)
+        if proc is None:
+            _log.debug("Reaped unknown child %d", pid)
+        else:
+            proc.exited(pid, status)
 
 def handle_child(sig, frame):
     _log.debug("SIGCHLD 1")
-    cothread.Callback(poke_all)
+    cothread.Callback(reap_all)
 
 def handle_term(sig, frame):
     _log.debug("SIGTERM")
@@ -1,5 +1,5 @@
 
-from .base import open, IGNORE, WARN, ERROR, RomError
+from .base import open, IGNORE, WARN, ERROR, RomError, DeadlineError
 
 __all__ = [
     'open',
@@ -7,4 +7,5 @@ __all__ = [
     'WARN',
     'ERROR',
     'RomError',
+    'DeadlineError',
 ]
@@ -0,0 +1,156 @@
+"""Vectorized amplitude, phase, and statistics of I/Q waveforms.
+
+Equivalent to the IOC "IQ2AP", "Wf Stats", and "Phase Unwrap"
+calculations (src/rf/calc.c), applied to many captures at once.
+Inputs may have any number of leading dimensions, with samples along
+the last axis.  eg. an array of shape (captures, samples).
+
+>>> caps = numpy.asarray([dev.get_channels([0, 1]) for n in range(100)])
+>>> amp, pha = iq2ap(caps[:, 0], caps[:, 1])
+>>> S = stats(amp, time=T, start=1e-6, width=2e-6)
+>>> S.mean.shape
+(100,)
+"""
+
+import logging
+
+import collections
+
+import numpy
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'phase_wrap',
+    'iq2ap',
+    'unwrap',
+    'stats',
+    'Stats',
+)
+
+Stats = collections.namedtuple('Stats',
+                               ['mean', 'std', 'min', 'max', 'rstd',
+                                'range', 'rms'])
+Stats.__doc__ = """Statistics of each waveform.  As from :py:func:`stats`.
+
+Each is a numpy.ndarray with the leading dimensions of the input.
+"""
+
+
+def _out(out, shape):
+    if out is None:
+        return numpy.empty(shape, dtype='f8')
+    assert out.shape == shape, (out.shape, shape)
+    return out
+
+
+def phase_wrap(pha, out=None):
+    """Wrap phase, in degrees, to [-180, 180).
+
+    :param out: Output array.  May be pha.
+    :returns: A numpy.ndarray
+    """
+    # fmod() of a 0-d array gives a scalar
+    out = numpy.asarray(numpy.fmod(pha, 360.0, out=out))
+    # (-360, 360) -> [-180, 180)
+    out[out < -180.0] += 360.0
+    out[out >= 180.0] -= 360.0
+    return out
+
+
+def iq2ap(i, q, zero_angle=0.0, amp=None, pha=None):
+    """Convert I/Q to amplitude and phase.
+
+    :param i: In phase samples.
+    :param q: Quadrature samples, with the same shape as i.
+    :param float zero_angle: Added to phase, in degrees, before wrapping.
+    :param amp: Output array for amplitude.
+    :param pha: Output array for phase.
+    :returns: A tuple of amplitude and phase in degrees [-180, 180).
+    """
+    i, q = numpy.asarray(i), numpy.asarray(q)
+    assert i.shape == q.shape, (i.shape, q.shape)
+    amp = numpy.hypot(i, q, out=_out(amp, i.shape))
+    pha = numpy.arctan2(q, i, out=_out(pha, i.shape))
+    numpy.rad2deg(pha, out=pha)
+    if zero_angle:
+        pha += zero_angle
+    phase_wrap(pha, out=pha)
+    return amp, pha
+
+
+def unwrap(pha, max_diff=160.0, out=None):
+    """Unwrap phase, in degrees, which may be wrapped to [-180, 180].
+    Only jumps between samples near +-180 which would change the
+    unwrapped phase by less than max_diff are unwrapped.
+
+    :param float max_diff: Maximum change between samples, in degrees.
+    :param out: Output array.  May be pha.
+    :returns: A numpy.ndarray
+    """
+    pha = numpy.asarray(pha, dtype='f8')
+    out = _out(out, pha.shape)
+    if pha.shape[-1] == 0:
+        return out
+    thres = max_diff / 2.0  # half on either side of the fold
+
+    prev, cur = pha[..., :-1], pha[..., 1:]
+    delta = cur - prev
+    # wrapped from positive to negative
+    delta[(prev > 180.0 - thres) & (cur < -180.0 + thres)] += 360.0
+    # wrapped from negative to positive
+    delta[(prev < -180.0 + thres) & (cur > 180.0 - thres)] -= 360.0
+
+    out[..., 0] = pha[..., 0]  # start at same point
+    numpy.cumsum(delta, axis=-1, out=out[..., 1:])
+    out[..., 1:] += out[..., :1]
+    return out
+
+
+def stats(data, time=None, start=None, width=None, phase=False):
+    """Statistics of each waveform within a window.
+
+    :param data: Samples.
+    :param time: 1-d time base, in increasing order, common to all
+                 waveforms.  Required with start or width.
+    :param float start: Start of window.  Default is the first sample.
+    :param float width: Width of window.  Default is all remaining samples.
+    :param bool phase: If True, data is phase in degrees, and mean, min,
+                       and max are wrapped to [-180, 180).
+    :returns: :py:class:`Stats`
+    :raises RuntimeError: If no samples are in the window.
+    """
+    data = numpy.asarray(data)
+    first, last = 0, data.shape[-1]
+    if start is not None or width is not None:
+        time = numpy.asarray(time)
+        if start is None:
+            start = time[0]
+        first = numpy.searchsorted(time, start, side='left')
+        if width is not None:
+            last = numpy.searchsorted(time, start + width, side='left')
+    win = data[..., first:last]
+    N = win.shape[-1]
+    if N <= 0:
+        raise RuntimeError('No samples in window [%s, %s)' % (first, last))
+
+    mean = numpy.asarray(win.mean(axis=-1))
+    # <x^2> without a temporary copy of the window
+    ms = numpy.asarray(numpy.einsum('...i,...i->...', win, win,
+                                    dtype='f8') / N)
+    std = numpy.sqrt(numpy.maximum(ms - mean * mean, 0.0))
+    vmin = numpy.asarray(win.min(axis=-1), dtype='f8')
+    vmax = numpy.asarray(win.max(axis=-1), dtype='f8')
+
+    if phase:
+        # only min/max/mean are wrapped
+        mean, vmin, vmax = [phase_wrap(V) for V in (mean, vmin, vmax)]
+        # avoid confusing users when max wraps to less than min
+        swap = vmax < vmin
+        vmin[swap], vmax[swap] = vmax[swap], vmin[swap]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        rstd = std / numpy.abs(mean)
+
+    return Stats(mean=mean, std=std, min=vmin, max=vmax, rstd=rstd,
+                 range=vmax - vmin, rms=numpy.sqrt(ms))
@@ -2,38 +2,127 @@ import logging
 
 import re
 import os
+import sys
+import time
+import socket
+import threading
+
+import numpy
+
+from .regmap import search, addr_index
+from .stats import Stats
+from .trace import Tracer
 
 
 _log = logging.getLogger(__name__)
 
+if sys.version_info >= (3, 0):
+    unicode = str
+
 
 class RomError(Exception):
     """Exception raised for errors during ROM read."""
     pass
 
 
+class DeadlineError(socket.timeout, RuntimeError):
+    """Exception raised when an operation does not complete
+    before its deadline.  See :py:meth:`DeviceBase.deadline`.
+
+    done and total, when known, are the number of addresses
+    exchanged before the deadline, and the number requested.
+    """
+
+    def __init__(self, msg, done=None, total=None):
+        socket.timeout.__init__(self, msg)
+        self.done, self.total = done, total
+
+    def __str__(self):
+        msg = socket.timeout.__str__(self)
+        if self.total is not None:
+            msg = '%s after %s of %s' % (msg, self.done, self.total)
+        return msg
+
+
 # flags for _wait_acq
 IGNORE = "IGNORE"
 WARN = "WARN"
 ERROR = "ERROR"
 
 
-# Decorator to wrap read/write functions
-def print_reg(fcn):
-    def wrapper(*args, **kwargs):
-        # args[0] is the 'self' reference
-        if args[0].trace:
-            regs = args[1]
-            if len(regs) and isinstance(regs[0], str):
-                # it's a read operation
-                for reg in regs:
-                    print('reading register {}'.format(reg))
-            else:
-                # it's a write operation, 'regs' is now a tuple, not str
-                for reg, val in regs:
-                    print('writing {} to register {}'.format(val, reg))
-        return fcn(*args, **kwargs)
-    return wrapper
+def split_index(name):
+    """Split a register name with optional index or slice.
+
+    Accepts a name string, with an optional index or slice suffix,
+    or a tuple of name and index or slice.
+
+    >>> split_index('reg')
+    ('reg', None)
+    >>> split_index('reg[1]')
+    ('reg', 1)
+    >>> split_index('reg[0:64]')
+    ('reg', slice(0, 64, None))
+    >>> split_index(('reg', slice(0, 64)))
+    ('reg', slice(0, 64, None))
+
+    :returns: A tuple of name and None, an int, or a slice.
+    """
+    if isinstance(name, tuple):
+        name, index = name
+        if not isinstance(index, slice) and index is not None:
+            index = int(index)
+        return name, index
+
+    M = re.match(r'^([^\[\]]+)(?:\[([^\[\]]*)\])?$', name)
+    if M is None:
+        raise RuntimeError('malformed name %s' % name)
+    name, index = M.groups()
+
+    try:
+        if index is None:
+            pass
+        elif ':' in index:
+            parts = [int(P, 0) if P.strip() else None
+                     for P in index.split(':')]
+            if len(parts) > 3:
+                raise ValueError(index)
+            index = slice(*parts)
+        else:
+            index = int(index, 0)
+    except ValueError:
+        raise RuntimeError('malformed index %s' % index)
+
+    return name, index
+
+
+def sign_extend(data, info):
+    """Sign extend raw values read from a register,
+    if the register info marks it as signed.
+
+    :param numpy.ndarray data: Unsigned 32-bit values.  Modified in place.
+    :param dict info: Register info.
+    :returns: A numpy.ndarray
+    """
+    if info.get('sign', 'unsigned') == 'signed':
+        # mask of data bits excluding sign bit
+        mask = (2**(info['data_width'] - 1)) - 1
+        # invert to give mask of sign bit and extension bits
+        mask ^= 0xffffffff
+        # test sign bit
+        neg = (data & mask) != 0
+        # extend only negative numbers
+        data[neg] |= mask
+        # cast to signed
+        data = data.astype('i4')
+    return data
+
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:  # py2
+    _monotonic = time.time
+
+_miss = object()
 
 
 def open(addr, **kws):
@@ -56,6 +145,13 @@ def open(addr, **kws):
     :param str addr: Device Address.
     :param float timeout: Communications timeout.
     :param list instance: List of instance identifiers.
+    :param bool threadsafe: leep:// only.  Allow concurrent requests
+                            from many threads.
+    :param transport: leep:// only.  A :py:class:`mux.MuxTransport`
+                      shared by many devices.
+    :param str image: file:// only.  Keep register values in this file.
+    :param initial: file:// only.  Initial register values.
+                    See :py:class:`file.FileDevice`.
     :returns: :py:class:`base.DeviceBase`
     """
     if addr.startswith('ca://'):
@@ -75,21 +171,326 @@ def open(addr, **kws):
         raise ValueError(msg)
 
 
+class _Deadline(object):
+    def __init__(self, dev, when):
+        self.dev, self.when = dev, when
+
+    def __enter__(self):
+        local = self.dev._deadlines
+        stack = getattr(local, 'stack', None)
+        if stack is None:
+            stack = local.stack = []
+        stack.append(min([self.when] + stack[-1:]))
+        return self
+
+    def __exit__(self, A, B, C):
+        self.dev._deadlines.stack.pop()
+
+
+class TxRead(object):
+    """Result of a read queued in a :py:class:`Transaction`.
+    Values are available after the transaction is committed,
+    and may then be unpacked as with the result of reg_read().
+
+    >>> with dev.transaction() as tx:
+    ...     R = tx.read(['reg_a', 'reg_b'])
+    >>> A, B = R
+    """
+
+    def __init__(self):
+        self._value = None
+
+    def _complete(self, value):
+        self._value = list(value)
+
+    @property
+    def value(self):
+        """The list of values, as returned by reg_read()
+        """
+        if self._value is None:
+            raise RuntimeError('Transaction not committed')
+        return self._value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, i):
+        return self.value[i]
+
+
+class Transaction(object):
+    """A sequence of register reads and writes, performed in order
+    when committed.  See :py:meth:`DeviceBase.transaction`.
+    """
+
+    def __init__(self, dev):
+        self.dev = dev
+        self._ops = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, A, B, C):
+        if A is None:
+            self.commit()
+        else:
+            self._ops = []  # discard on error
+
+    def write(self, ops, instance=[]):
+        """Queue register writes.  Arguments as for reg_write()
+        """
+        self._ops.append(('write', list(ops), instance))
+
+    def read(self, names, instance=[]):
+        """Queue register reads.  Arguments as for reg_read()
+
+        :returns: A :py:class:`TxRead`
+        """
+        result = TxRead()
+        self._ops.append(('read', list(names), instance, result))
+        return result
+
+    def commit(self):
+        """Perform all queued operations.
+        """
+        ops, self._ops = self._ops, []
+        if ops:
+            self.dev._commit(ops)
+
+
 class DeviceBase(object):
     backend = None  # 'ca' or 'leep'
 
+    # May be used concurrently from many threads.  Required by watch()
+    threadsafe = False
+
+    # registers cached by default when the shadow cache is enabled.
+    # See enable_shadow()
+    shadow_registers = ('chan_keep', 'wave_samp_per', 'wave_shift')
+
     def __init__(self, instance=[]):
         self.instance = instance[:]  # shallow copy
 
-        # Machinery to enable r/w tracing. See print_reg decorator.
-        self.trace = False
+        # I/O statistics.  See stats()
+        self._stats = Stats(backend=self.backend)
+
+        # Shadow register cache.  See enable_shadow()
+        # None when disabled, or {'name':(value, time)}
+        self._shadow = None
+
+        # Background polling.  See watch()
+        self._poller = None
+
+        # Per thread stack of deadlines.  See deadline()
+        self._deadlines = threading.local()
+
+        # Machinery to enable r/w tracing. See trace property.
+        self._tracer = None
         pat = re.compile(r'\byes\b | \btrue\b | \b1\b', flags=re.I | re.X)
         tr = os.getenv('LEEP_TRACE_RW')
         if tr is not None and re.match(pat, tr):
             self.trace = True
 
+    @property
+    def trace(self):
+        """Whether register reads and writes are being recorded
+        in :py:attr:`tracer`.
+
+        Tracing may be enabled at any time,
+        or when $LEEP_TRACE_RW is set to 'yes', 'true', or '1'.
+        Untraced reads and writes have no added cost.
+        """
+        return self._tracer is not None and self._tracer.active
+
+    @trace.setter
+    def trace(self, enable):
+        if enable:
+            self.tracer.install()
+        elif self._tracer is not None:
+            self._tracer.remove()
+
+    @property
+    def tracer(self):
+        """The :py:class:`trace.Tracer` for this device.
+        Records are retained after tracing is disabled.
+        """
+        if self._tracer is None:
+            self._tracer = Tracer(self)
+        return self._tracer
+
+    def enable_shadow(self, names=None, ttl=None):
+        """Enable caching of configuration register values.
+
+        Cached values are populated by writes, and by the first read
+        made by acquisition helpers such as :py:meth:`get_channels`.
+        Later reads by these helpers then use cached values instead of
+        reading the device.
+
+        This is only appropriate when this client has exclusive control
+        of these registers.  Changes made by other clients will not be
+        seen until the cache is invalidated or the ttl expires.
+
+        :param list names: Register names which may be cached.
+                           Default is :py:attr:`shadow_registers`.
+        :param float ttl: Maximum age of a cached value, in seconds.
+                          None for no limit.
+        """
+        self._shadow = {}
+        self._shadow_names = set(names or self.shadow_registers)
+        self._shadow_match = {}  # memo of _is_shadowed()
+        self._shadow_ttl = ttl
+
+    def disable_shadow(self):
+        """Disable, and clear, the shadow register cache
+        """
+        self._shadow = None
+
+    def invalidate_shadow(self, names=None, instance=[]):
+        """Discard cached register values.
+
+        :param list names: Register names to discard.  Default is all.
+        :param list instance: List of instance identifiers.
+        """
+        if self._shadow is None:
+            return
+        elif names is None:
+            self._shadow.clear()
+        else:
+            for name in names:
+                if instance is not None:
+                    name = self.expand_regname(name, instance=instance)
+                self._shadow.pop(name, None)
+
+    def _is_shadowed(self, name):
+        try:
+            return self._shadow_match[name]
+        except KeyError:
+            ret = any([name == S or name.endswith('_' + S)
+                       for S in self._shadow_names])
+            self._shadow_match[name] = ret
+            return ret
+
+    def _shadow_lookup(self, name):
+        # returns the cached value, or _miss
+        ent = self._shadow.get(name)
+        if ent is None:
+            return _miss
+        value, T = ent
+        if self._shadow_ttl is not None and \
+                _monotonic() - T > self._shadow_ttl:
+            del self._shadow[name]
+            return _miss
+        if isinstance(value, numpy.ndarray):
+            value = value.copy()
+        return value
+
+    def _shadow_store(self, name, value):
+        self._shadow[name] = (value, _monotonic())
+
+    def _shadowed(self, name, fetch):
+        """Return the cached value of a full register name,
+        or the result of fetch() which is then cached.
+        """
+        if self._shadow is None or not self._is_shadowed(name):
+            return fetch()
+        value = self._shadow_lookup(name)
+        if value is _miss:
+            value = fetch()
+            self._shadow_store(name, value)
+        return value
+
+    def _shadow_update(self, name, value):
+        """Called by backends after writing a full register name
+        by some other means than reg_write()
+        """
+        if self._shadow is not None and self._is_shadowed(name):
+            self._shadow_store(name, value)
+
+    def _shadow_written(self, ops, instance=[]):
+        """Called by backends after a successful reg_write()
+        to update the shadow cache.
+        """
+        if self._shadow is None:
+            return
+        for name, value in ops:
+            name, info, _start, count, scalar = self._resolve_reg(
+                name, instance=instance)
+            if count != 2**info.get('addr_width', 0):
+                # partial write
+                self._shadow.pop(name, None)
+
+            elif name in self._shadow or self._is_shadowed(name):
+                value = sign_extend(numpy.array(value).astype('I'), info)
+                if scalar:
+                    value = value[()]
+                self._shadow_store(name, value)
+
+    def _cached_read(self, names, instance=[]):
+        """As reg_read(), but using the shadow cache when enabled.
+        Registers not cached are read together.
+        """
+        if self._shadow is None:
+            return self.reg_read(names, instance=instance)
+
+        if instance is not None:
+            names = [self.expand_regname(name, instance=instance)
+                     for name in names]
+        # only registers selected by enable_shadow() are cached
+        ret = [self._shadow_lookup(name) if self._is_shadowed(name)
+               else _miss for name in names]
+
+        missing = [name for name, V in zip(names, ret) if V is _miss]
+        if missing:
+            values = self.reg_read(missing, instance=None)
+            for name, value in zip(missing, values):
+                if self._is_shadowed(name):
+                    self._shadow_store(name, value)
+            values = iter(values)
+            ret = [next(values) if V is _miss else V for V in ret]
+
+        return ret
+
+    def deadline(self, timeout):
+        """Bound the total time taken by all operations, by this thread,
+        within a with block.  This includes all messages exchanged,
+        retries, and polling.  Deadlines may be nested, with the earliest
+        taking effect.
+
+        >>> with dev.deadline(0.5):
+        ...     dev.reg_write([('foo', 1)])
+        ...     dev.wait_for_acq(tag=True)
+        ...     A, B = dev.get_channels([0, 1])
+
+        :param float timeout: Time limit in seconds.
+        :raises DeadlineError: From operations which do not complete in time.
+        """
+        return _Deadline(self, _monotonic() + timeout)
+
+    def _remaining(self):
+        """:returns: Seconds until the current deadline, or None
+        """
+        stack = getattr(self._deadlines, 'stack', None)
+        if stack:
+            return stack[-1] - _monotonic()
+
+    def _op_timeout(self, timeout):
+        """:returns: timeout, or less if the current deadline is sooner.
+        :raises DeadlineError: If the deadline has passed.
+        """
+        remaining = self._remaining()
+        if remaining is None:
+            return timeout
+        elif remaining <= 0:
+            raise DeadlineError('Deadline exceeded')
+        return min(timeout, remaining)
+
     def close(self):
-        pass
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
 
     def __enter__(self):
         return self
@@ -97,6 +498,36 @@ class DeviceBase(object):
     def __exit__(self, A, B, C):
         self.close()
 
+    def stats(self, reset=False):
+        """Return a snapshot of I/O statistics for this device.
+
+        :param bool reset: Zero all statistics after taking the snapshot.
+        :returns: A dict with keys 'labels', 'counters', 'latency',
+                  and 'samples'.  See :py:mod:`leep.stats`.
+        """
+        ret = self._stats.snapshot()
+        if reset:
+            self._stats.reset()
+        return ret
+
+    def lookup_addr(self, addr):
+        """Find the register which includes an address.
+
+        >>> D.lookup_addr(0x10003)
+        ('foo_buf', 3)
+
+        :returns: A tuple of register name and offset, or None.
+        """
+        return addr_index(self.regmap).lookup(addr)
+
+    def lookup_addrs(self, addrs):
+        """Find the registers which include each of an array of addresses.
+
+        :returns: A tuple of an array of register names (None if not found),
+                  and an array of offsets (-1 if not found).
+        """
+        return addr_index(self.regmap).lookup_many(addrs)
+
     def expand_regname(self, name, instance=[]):
         """ Return a full register name from the short name and optionally
             instance number(s)
@@ -110,26 +541,121 @@ class DeviceBase(object):
         if name in self.regmap or instance is None:
             return name
 
-        # build a regexp
-        # from a list of name fragments
         fragments = self.instance + instance + [name]
-        # match when consecutive fragments are seperated by
-        #  1. a single '_'.  ['A', 'B'] matches 'A_B'.
-        #  2. two '_' with anything inbetween.  'A_blah_B' or 'A_x_y_z_B'.
-        regx = r'_(?:.*_)?'.join([re.escape(str(i)) for i in fragments])
-        R = re.compile('^.*%s$' % regx)
+        pattern, ret = search(self.regmap, fragments)
 
-        ret = [x for x in self.regmap if R.match(x)]
         if len(ret) == 1:
             return ret[0]
         elif len(ret) > 1:
-            subs = (R.pattern, ' '.join(ret))
+            subs = (pattern, ' '.join(ret))
             msg = '%s Matches more than one register: %s' % subs
             raise RuntimeError(msg)
         else:
-            msg = 'No match for register pattern %s' % R.pattern
+            msg = 'No match for register pattern %s' % pattern
             raise RuntimeError(msg)
 
+    def _resolve_reg(self, name, instance=[]):
+        """Expand a register name, with optional index or slice.
+        See :py:func:`split_index`.
+
+        :returns: A tuple of (name, info, start, count, scalar).
+                  start and count select the addresses within the register.
+                  scalar is True if a single value is selected, either
+                  a scalar register or an index into an array register.
+        """
+        if not isinstance(name, tuple) and name in self.regmap:
+            index = None
+        else:
+            name, index = split_index(name)
+        if instance is not None:
+            name = self.expand_regname(name, instance=instance)
+        info = self.get_reg_info(name, instance=None)
+        L = 2**info.get('addr_width', 0)
+
+        if index is None:
+            return name, info, 0, L, info.get('addr_width', 0) == 0
+
+        elif isinstance(index, slice):
+            start, stop, step = index.indices(L)
+            if step != 1:
+                raise RuntimeError('%s slice step must be 1' % name)
+            return name, info, start, max(0, stop - start), False
+
+        else:
+            if index < 0:
+                index += L
+            if index < 0 or index >= L:
+                msg = '%s offset out of bounds (%s < %s)' % (name, index, L)
+                raise RuntimeError(msg)
+            return name, info, index, 1, True
+
+    def _plan_write(self, ops, instance=[]):
+        """Translate register writes into lists of addresses and values
+        """
+        addrs, values = [], []
+        for name, value in ops:
+            name, info, start, L, scalar = self._resolve_reg(
+                name, instance=instance)
+
+            base_addr = info['base_addr']
+            if isinstance(base_addr, (bytes, str, unicode)):
+                base_addr = int(base_addr, 0)
+            base_addr += start
+
+            value = numpy.array(value).astype('I')
+
+            if not scalar:
+                _log.debug('reg_write %s <- %s ...', name, value[:10])
+                assert value.ndim == 1 and value.shape[0] == L, \
+                    ('must write whole register or slice', value.shape, L)
+                # array register
+                for A, V in enumerate(value, base_addr):
+                    addrs.append(A)
+                    values.append(V)
+            else:
+                assert value.ndim == 0, 'scalar register'
+                _log.debug('reg_write %s <- %s', name, value)
+                addrs.append(base_addr)
+                values.append(value)
+
+        return addrs, values
+
+    def _plan_read(self, names, instance=[]):
+        """Translate register reads into a list of addresses,
+        and a list of information needed by _decode_read()
+        """
+        addrs = []
+        lens = []
+        for name in names:
+            name, info, start, L, scalar = self._resolve_reg(
+                name, instance=instance)
+
+            lens.append((name, info, L, scalar))
+            base_addr = info['base_addr']
+            if isinstance(base_addr, (bytes, str, unicode)):
+                base_addr = int(base_addr, 0)
+            base_addr += start
+            addrs.extend(range(base_addr, base_addr + L))
+
+        return addrs, lens
+
+    def _decode_read(self, raw, lens):
+        """Split, and sign extend, values read from the addresses
+        given by _plan_read()
+        """
+        ret = []
+        for name, info, L, scalar in lens:
+            data, raw = raw[:L], raw[L:]
+            assert len(data) == L, (len(data), L)
+            data = sign_extend(data, info)
+            _log.debug('reg_read %s -> %s ...', name, data[:10])
+            # unwrap scalar from ndarray
+            if scalar:
+                data = data[0]
+            ret.append(data)
+
+        return ret
+
     def reg_write(self, ops, instance=[]):
         """Write to registers.
 
@@ -142,6 +668,14 @@ class DeviceBase(object):
             ('reg_a', 5),
             ('reg_b', 6),
         ])
+
+        Part of an array register may be written by giving an index or
+        slice with the name.  See :py:func:`split_index`.
+
+        >>> D.reg_write([
+            ('reg_arr[1]', 5),
+            (('reg_arr', slice(2, 4)), [6, 7]),
+        ])
         """
         raise NotImplementedError
 
@@ -153,6 +687,11 @@ class DeviceBase(object):
         :returns: A :py:class:`numpy.ndarray` for each register name.
 
         >>> A, B = D.reg_read(['reg_a', 'reg_b'])
+
+        Part of an array register may be read by giving an index or
+        slice with the name.  See :py:func:`split_index`.
+
+        >>> A, B = D.reg_read(['reg_arr[1]', ('reg_arr', slice(0, 64))])
         """
         raise NotImplementedError
 
@@ -162,6 +701,70 @@ class DeviceBase(object):
     def __getitem__(self, key):
         return self.reg_read([key])[0]
 
+    def watch(self, names, callback, period=1.0, mask=None, instance=[]):
+        """Poll registers from a background thread, and call back
+        with only those which have changed.
+
+        >>> W = dev.watch(['status'], print, period=0.1, mask=0x3)
+        ...
+        >>> W.cancel()
+
+        The first poll reports all registers.
+        Registers watched with the same period are read together.
+
+        Polling uses a thread, so the device must be threadsafe.
+        eg. leep:// opened with threadsafe=True, or with a transport.
+
+        :param list names: Register names
+        :param callable callback: Called as callback([(name, value), ...])
+        :param float period: Polling period in seconds.
+        :param mask: An integer bit mask applied to all registers,
+                     or a list of masks, one for each register.
+                     Default is to compare all bits.
+        :param list instance: List of instance identifiers.
+        :returns: A :py:class:`poller.Watch`
+        :raises RuntimeError: If the device is not threadsafe.
+        """
+        if not self.threadsafe:
+            raise RuntimeError('watch() needs a threadsafe device.  '
+                               'eg. open(..., threadsafe=True)')
+        # poller imports from this module
+        from .poller import Poller, Watch
+        W = Watch(names, callback, mask=mask)
+        if self._poller is None:
+            self._poller = Poller(self)
+            self._poller.start()
+        W.group = self._poller.add(W.names, period, W, instance=instance)
+        W.poller = self._poller
+        return W
+
+    def transaction(self):
+        """Begin a sequence of register reads and writes,
+        performed in order when the transaction is committed.
+        Read results are filled in on commit.
+
+        >>> with dev.transaction() as tx:
+        ...     tx.write([('wave_samp_per', 4)])
+        ...     R = tx.read(['wave_samp_per'])
+        >>> dec, = R
+
+        The leep:// backend packs all operations into as few
+        messages as possible.  Other backends perform each in turn.
+
+        :returns: A :py:class:`Transaction`
+        """
+        return Transaction(self)
+
+    def _commit(self, ops):
+        # Perform the queued operations of a Transaction
+        for op in ops:
+            if op[0] == 'write':
+                _op, regs, instance = op
+                self.reg_write(regs, instance=instance)
+            else:
+                _op, regs, instance, result = op
+                result._complete(self.reg_read(regs, instance=instance))
+
     def get_reg_info(self, name, instance=[]):
         """Return a dict describing the named register.
         This dictionary is passed through from the information read from the
@@ -205,11 +808,16 @@ class DeviceBase(object):
         """
         raise NotImplementedError
 
-    def get_channels(self, chans=[], instance=[]):
+    def get_channels(self, chans=[], instance=[], dtype='f8', raw=False):
         """:returns: a list of :py:class:`numpy.ndarray` with the numbered
         channels. `chans` may be a bit mask or a list of channel numbers.
 
         The returned arrays have been scaled.
+
+        :param dtype: Type of scaled samples.  eg. 'f4' to halve size.
+        :param bool raw: If True, return a tuple of a list of unscaled
+                         int32 samples, and a list of the scale factor for
+                         each channel.  Scaled samples are raw / scale.
         """
         raise NotImplementedError
 
@@ -265,18 +873,17 @@ class DeviceBase(object):
                     # eg.
                     #  name
                     #  name[offset]
-                    M = re.match(r'^([^\[\]]+)(?:\[(\d+)\])?$', name)
-                    if M is None:
+                    name, offset = split_index(name)
+                    if offset is None:
+                        offset = 0
+                    elif isinstance(offset, slice):
                         raise RuntimeError('malformed name')
 
-                    name, offset = M.groups()
-                    offset = int(offset or '0', 0)
-
                     name = self.expand_regname(name, instance=instance)
                     info = self.regmap[name]
 
                     N = 2**info.get('addr_width', 0)
-                    if offset >= N:
+                    if offset < 0 or offset >= N:
                         msg = 'offset out of bounds (%s < %s)' % (offset, N)
                         raise RuntimeError(msg)
 
@@ -2,22 +2,26 @@ import logging
 
 import json
 import zlib
+import hashlib
 import datetime
 
 import numpy
 
 from functools import reduce
 
-from .base import DeviceBase, print_reg
+from .base import DeviceBase, DeadlineError
+from .regmap import RegMap, shared
+from .stats import timed
 
 try:
     from cothread.catools import caget as _caget, caput as _caput
     from cothread.catools import camonitor, FORMAT_TIME, DBR_CHAR_STR
+    from cothread.catools import ca_nothing
 except ImportError:
     msg = 'ca:// not available, cothread module not found in PYTHONPATH'
     raise RuntimeError(msg)
 else:
-    from cothread import Event
+    from cothread import Event, Timedout
 
 
 _log = logging.getLogger(__name__)
@@ -39,6 +43,40 @@ def caput(*args, **kws):
     _caput(*args, **kws)
 
 
+def _with_meta(value, wf):
+    """Copy CA meta-data (eg. raw_stamp) of the waveform wf onto
+    value, a new array derived from wf.
+    """
+    if value is not wf and type(wf) is not numpy.ndarray and \
+            isinstance(wf, numpy.ndarray):
+        value = value.view(type(wf))
+        value.__dict__.update(getattr(wf, '__dict__', {}))
+    return value
+
+
+class _Deadlined(object):
+    """Within a with block, re-raise CA timeouts caused by the current
+    deadline of dev as DeadlineError.  Set done to report progress.
+    """
+    # cothread timers may wake slightly before our deadline
+    slack = 0.01
+
+    def __init__(self, dev, total=None):
+        self.dev, self.done, self.total = dev, 0, total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, A, B, C):
+        if A is None or not issubclass(A, (Timedout, ca_nothing)):
+            return
+        remaining = self.dev._remaining()
+        if remaining is not None and remaining <= self.slack:
+            raise DeadlineError('Deadline exceeded',
+                                done=None if self.total is None else self.done,
+                                total=self.total)
+
+
 class CADevice(DeviceBase):
     backend = 'ca'
 
@@ -47,6 +85,7 @@ class CADevice(DeviceBase):
         self.timeout = timeout
         assert self.timeout > 0.1, self.timeout  # must be reasonable
         self.prefix = str(addr)  # PV prefix
+        self._stats.labels['device'] = self.prefix
 
         # fetch mapping from register name to info dict
         # {'records':{'reg_name':{'<info>':'<value>'}}}
@@ -60,13 +99,20 @@ class CADevice(DeviceBase):
 
         # raw JSON blob from device
         # {'reg_name:{'base_addr':0, ...}}
-        jstr = zlib.decompress(caget(self.prefix + 'CTRL_JSON'))
-        self.regmap = json.loads(jstr)
+        # IOCs serving identical firmware share a RegMap.
+        raw = caget(self.prefix + 'CTRL_JSON')
+        key = ('ca', hashlib.sha1(raw).hexdigest(), tuple(sorted(self._info)))
+
+        def build():
+            regmap = json.loads(zlib.decompress(raw))
+
+            extra_reg = set(self._info) - set(regmap)
+            if extra_reg:
+                # inject empty info for fake/missing registers
+                regmap.update([(K, {}) for K in extra_reg])
+            return RegMap(regmap)
 
-        extra_reg = set(self._info) - set(self.regmap)
-        if extra_reg:
-            # inject empty info for fake/missing registers
-            self.regmap.update([(K, {}) for K in extra_reg])
+        self.regmap = shared(key, build)
 
         self._S = None  # placeholder for subscription
         # Event acts as a cache for the last received value.
@@ -74,6 +120,7 @@ class CADevice(DeviceBase):
         self._E = Event()
 
     def close(self):
+        DeviceBase.close(self)
         if self._S is not None:
             self._S.close()
             self._S = None
@@ -87,42 +134,95 @@ class CADevice(DeviceBase):
         """Read associated PV
         """
         pvname = self.pv_name(name, tag, instance=instance)
-        return caget(pvname, timeout=self.timeout)
+        self._stats.counters['ca_get'] += 1
+        with _Deadlined(self):
+            return caget(pvname, timeout=self._op_timeout(self.timeout))
 
     def pv_write(self, name, tag, value, instance=[], wait=True, timeout=None):
         """Write associated PV
         """
         pvname = self.pv_name(name, tag, instance=instance)
-        caput(pvname, value, wait=wait, timeout=timeout or self.timeout)
+        self._stats.counters['ca_put'] += 1
+        with _Deadlined(self):
+            caput(pvname, value, wait=wait,
+                  timeout=self._op_timeout(timeout or self.timeout))
 
-    @print_reg
+    @timed('reg_write')
     def reg_write(self, ops, instance=[]):
+        with _Deadlined(self, len(ops)) as P:
+            self._reg_write(ops, instance, P)
+        self._shadow_written(ops, instance=instance)
+
+    def _reg_write(self, ops, instance, P):
         for name, value in ops:
-            name = self.expand_regname(name, instance=instance)
+            name, _info, start, count, scalar = self._resolve_reg(
+                name, instance=instance)
             info = self._info[name]
             pvname = str(info['output'])
 
             # CA only has signed integers
             value = numpy.array(value).astype(dtype='i')
 
-            caput(pvname, value, wait=True, timeout=self.timeout)
-
-    @print_reg
+            L = 2**self.regmap[name].get('addr_width', 0)
+            if count != L:
+                # CA can not write at an offset, so non-atomic
+                # read-modify-write of the whole array.
+                tmo = self._op_timeout(self.timeout)
+                whole = numpy.array(caget(pvname, timeout=tmo), dtype='i')
+                self._stats.counters['ca_get'] += 1
+                assert value.ndim == (0 if scalar else 1), \
+                    ('must write whole register or slice', value.shape)
+                whole[start:start + count] = value
+                value = whole
+
+            caput(pvname, value, wait=True,
+                  timeout=self._op_timeout(self.timeout))
+            self._stats.counters['ca_put'] += 1
+            P.done += 1
+
+    @timed('reg_read')
     def reg_read(self, names, instance=[]):
+        with _Deadlined(self, len(names)) as P:
+            return self._reg_read(names, instance, P)
+
+    def _reg_read(self, names, instance, P):
+        C = self._stats.counters
         ret = [None] * len(names)
+        seen = {}  # read each register only once
         for i, name in enumerate(names):
-            name = self.expand_regname(name, instance=instance)
+            name, _info, start, count, scalar = self._resolve_reg(
+                name, instance=instance)
+            if (name, start, count, scalar) in seen:
+                V = ret[seen[(name, start, count, scalar)]]
+                ret[i] = V.copy() if isinstance(V, numpy.ndarray) else V
+                continue
+            seen[(name, start, count, scalar)] = i
             info = self._info[name]
             pvname = str(info['input'])
 
-            caput(pvname + '.PROC', 1, wait=True, timeout=self.timeout)
+            kws = {}
+            L = 2**self.regmap[name].get('addr_width', 0)
+            if count != L:
+                # only fetch the elements needed
+                kws['count'] = start + count
+
+            caput(pvname + '.PROC', 1, wait=True,
+                  timeout=self._op_timeout(self.timeout))
             # force as unsigned
-            pv_val = caget(pvname, timeout=self.timeout)
+            pv_val = caget(pvname, timeout=self._op_timeout(self.timeout),
+                           **kws)
+            C['ca_put'] += 1
+            C['ca_get'] += 1
             ret[i] = numpy.asanyarray(pv_val, dtype='i')
+            if count != L:
+                ret[i] = ret[i][start:start + count]
+                if scalar:
+                    ret[i] = ret[i][0]
             # cope with lack of unsigned in CA
             info = self.regmap[name]
             if info.get('sign', 'unsigned') == 'unsigned':
                 ret[i] = ret[i].view(dtype='I')
+            P.done = i + 1
 
         return ret
 
@@ -141,11 +241,16 @@ class CADevice(DeviceBase):
 
     def get_decimate(self, instance=[]):
         # return list to be compatible with raw.py get_decimate
-        return [self.pv_read('wave_samp_per', 'setting', instance=instance)]
+        key = self.expand_regname('wave_samp_per', instance=instance)
+        return [self._shadowed(key, lambda: self.pv_read(
+            'wave_samp_per', 'setting', instance=instance))]
 
     def set_decimate(self, dec, instance=[]):
         assert dec >= 1 and dec <= 255
         self.pv_write('wave_samp_per', 'setting', dec, instance=instance)
+        if self._shadow is not None:
+            self._shadow_update(
+                self.expand_regname('wave_samp_per', instance=instance), dec)
 
     def set_channel_mask(self, chans=None, instance=[]):
         """ Enabled specified channels.
@@ -171,19 +276,38 @@ class CADevice(DeviceBase):
             for ch in chans:
                 self.pv_write('circle_data', 'enable%d' % ch, 'Enable')
 
-    def get_channel_mask(self, instance=[]):
-        # make list of masks for each bit which is set.
-        chans = [2**(11 - n) for n in range(12)
-                 if self.pv_read('circle_data', 'enable%d' % n)]
-        return reduce(lambda ll, r: ll | r, chans, 0)
+        if self._shadow is not None:
+            mask = reduce(lambda ll, r: ll | r,
+                          [2**(11 - n) for n in chans], 0)
+            self._shadow_update(
+                self.expand_regname('chan_keep', instance=instance), mask)
 
+    def get_channel_mask(self, instance=[]):
+        def fetch():
+            # make list of masks for each bit which is set.
+            chans = [2**(11 - n) for n in range(12)
+                     if self.pv_read('circle_data', 'enable%d' % n)]
+            return reduce(lambda ll, r: ll | r, chans, 0)
+        if self._shadow is None:
+            return fetch()
+        # cached as the equivalent register
+        return self._shadowed(
+            self.expand_regname('chan_keep', instance=instance), fetch)
+
+    @timed('wait_for_acq')
     def wait_for_acq(self, toggle_tag=False, tag=False, timeout=5.0,
                      instance=[]):
         """Wait for next waveform acquisition to complete.
         If tag=True, then wait for the next acquisition which includes the
         side-effects of all preceding register writes
+
+        :param float timeout: Overall time limit, in seconds.
+        :raises DeadlineError: On timeout.
         """
+        with self.deadline(timeout), _Deadlined(self):
+            return self._wait_for_acq(toggle_tag, tag, timeout, instance)
 
+    def _wait_for_acq(self, toggle_tag, tag, timeout, instance):
         if tag or toggle_tag:
             self.pv_write('dsp_tag', 'increment', 1, instance=instance)
 
@@ -197,11 +321,12 @@ class CADevice(DeviceBase):
             _log.debug('Monitoring %s', pv)
             self._S = camonitor(pv, self._E.Signal, format=FORMAT_TIME)
             # wait for, and consume, initial update
-            self._E.Wait(timeout=timeout)
+            self._E.Wait(timeout=self._op_timeout(timeout))
 
         while True:
-            slow = self._E.Wait(timeout=timeout)
+            slow = self._E.Wait(timeout=self._op_timeout(timeout))
             now = datetime.datetime.utcnow()
+            self._stats.counters['acq_polls'] += 1
 
             tag_old = slow[34]
             tag_new = slow[33]
@@ -220,12 +345,20 @@ class CADevice(DeviceBase):
                 raise RuntimeError(msg)
 
             _log.debug('Acquire retry')
+            self._stats.counters['acq_retries'] += 1
 
         return tag_match, slow, now
 
-    def get_channels(self, chans=[], instance=[]):
+    def get_channels(self, chans=[], instance=[], dtype='f8', raw=False):
         """:returns: a list of :py:class:`numpy.ndarray` with the numbered channels.
         chans may be a bit mask or a list of channel numbers
+
+        :param dtype: Type of scaled samples.  eg. 'f4' to halve size.
+        :param bool raw: If True, return a tuple of a list of unscaled
+                         samples, and a list of the IOC scale factor for
+                         each channel.  Scaled samples are raw / scale.
+                         Integer samples are int32.  Others are
+                         returned as served by the IOC.
         """
         names = [self.pv_name('circle_data', 'input%d' % ch, instance=instance)
                  for ch in chans]
@@ -234,12 +367,9 @@ class CADevice(DeviceBase):
                   for ch in chans]
 
         ret = caget(names, format=FORMAT_TIME)
+        self._stats.counters['ca_get'] += len(names)
 
         wfs, scales = ret[:len(chans)], ret[len(chans):]
-        # print('scales', scales)
-        for wf, scale in zip(wfs, scales):
-            # reverse scaling applied in IOC to give [0, 1) scale
-            wf /= scale
 
         # ensure that waveform timestamps are consistent
         if len(wfs) >= 2 and not \
@@ -247,13 +377,28 @@ class CADevice(DeviceBase):
             msg = "Inconsistent timestamps! %s" % [R.raw_stamp for R in wfs]
             raise RuntimeError(msg)
 
-        return wfs
+        if raw:
+            # samples as served by the IOC.  Do not truncate if floating
+            raws = [_with_meta(wf.astype('i4'), wf)
+                    if wf.dtype.kind in 'iu' else wf for wf in wfs]
+            return raws, [float(scale) for scale in scales]
+
+        # reverse scaling applied in IOC to give [0, 1) scale
+        ret = []
+        for wf, scale in zip(wfs, scales):
+            if wf.dtype == numpy.dtype(dtype):
+                wf /= scale
+            else:
+                wf = _with_meta(numpy.true_divide(wf, scale, dtype=dtype), wf)
+            ret.append(wf)
+        return ret
 
     def get_timebase(self, chans=[], instance=[]):
         ret = caget([self.pv_name('circle_data', 'time%d' % ch,
                                   instance=instance)
                      for ch in chans],
                     format=FORMAT_TIME)
+        self._stats.counters['ca_get'] += len(chans)
         if len(ret) >= 2 and not \
                 all([ret[0].raw_stamp == R.raw_stamp for R in ret[1:]]):
             msg = "Inconsistent timestamps! %s" % [R.raw_stamp for R in ret]
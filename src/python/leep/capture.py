@@ -0,0 +1,107 @@
+"""In-memory capture of LEEP datagrams.
+
+Sent and received datagrams are appended, with a timestamp, to a
+fixed size ring buffer.  The ring may be written out as a .pcap file,
+to be opened with Wireshark and the leep.lua dissector.
+
+>>> C = dev.enable_capture(on_error='/tmp/leep-error.pcap')
+>>> dev.reg_read(['foo'])
+>>> C.dump('/tmp/leep.pcap')
+
+A single Capture may be shared by many devices.
+"""
+
+import logging
+
+import collections
+import socket
+import struct
+import time
+
+from .base import _monotonic
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'Capture',
+)
+
+# pcap file header for IPv4 packets w/o link layer (LINKTYPE_RAW)
+_pcap_header = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 101)
+
+
+def _checksum(hdr):
+    S = sum(struct.unpack('!%dH' % (len(hdr) // 2), hdr))
+    while S >> 16:
+        S = (S & 0xffff) + (S >> 16)
+    return ~S & 0xffff
+
+
+class Capture(object):
+    """Ring buffer of datagrams.
+
+    :param int size: Maximum number of datagrams retained.
+    :param str on_error: If set, the name of a .pcap file written
+                         each time a device reports an I/O error.
+    """
+
+    def __init__(self, size=4096, on_error=None):
+        self.ring = collections.deque(maxlen=size)
+        self.on_error = on_error
+        # to convert monotonic timestamps to wall clock when written
+        self._offset = time.time() - _monotonic()
+        self._hosts = {}  # memo of resolved names
+
+    def record(self, src, dst, data):
+        """Append one datagram.  src and dst are (host, port) tuples.
+        """
+        self.ring.append((_monotonic(), src, dst, data))
+
+    def clear(self):
+        self.ring.clear()
+
+    def error(self):
+        """Called by devices on I/O errors
+        """
+        if self.on_error:
+            _log.info('Writing capture to %s', self.on_error)
+            self.dump(self.on_error)
+
+    def dump(self, fname):
+        """Write all retained datagrams to a .pcap file
+        """
+        with open(fname, 'wb') as F:
+            self.write(F)
+
+    def write(self, F):
+        """Write all retained datagrams, in pcap format,
+        to a binary file-like object.
+        """
+        F.write(_pcap_header)
+        for T, src, dst, data in list(self.ring):
+            T += self._offset
+            pkt = self._packet(src, dst, data)
+            F.write(struct.pack('<IIII', int(T), int((T % 1) * 1e6),
+                                len(pkt), len(pkt)))
+            F.write(pkt)
+
+    def _addr(self, host):
+        try:
+            return self._hosts[host]
+        except KeyError:
+            try:
+                A = socket.inet_aton(socket.gethostbyname(host))
+            except socket.error:
+                A = b'\0\0\0\0'
+            self._hosts[host] = A
+            return A
+
+    def _packet(self, src, dst, data):
+        # IPv4 and UDP headers.  UDP checksum is optional.
+        ulen = 8 + len(data)
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + ulen, 0, 0x4000,
+                         64, socket.IPPROTO_UDP, 0,
+                         self._addr(src[0]), self._addr(dst[0]))
+        ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+        udp = struct.pack('!HHHH', src[1], dst[1], ulen, 0)
+        return ip + udp + data
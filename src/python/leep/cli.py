@@ -12,6 +12,8 @@ from collections import defaultdict
 
 from . import open
 from . import RomError
+from .regmap import to_jsonable
+from .display import envelope
 
 
 _log = logging.getLogger(__name__)
@@ -49,6 +51,9 @@ def acquire(args, dev):
     dev.wait_for_acq(tag=args.tag, toggle_tag=args.toggle)
     for T, ch in zip(dev.get_timebase(args.channels),
                      dev.get_channels(args.channels)):
+        if args.envelope:
+            n = min(len(T), len(ch))
+            T, ch = envelope(ch[:n], T[:n], buckets=args.envelope)
         if args.plot:
             pylab.plot(T, ch)
             pylab.hold(True)
@@ -77,23 +82,34 @@ def dumpaddrs(args, dev):
             base = int(base, 0)
         if info.get('addr_width', 0) == 0:
             # scalar
-            addrs.append((base, value & 0xffffffff))
+            addrs.append((base, int(value) & 0xffffffff))
         else:
             # vector
-            for pair in enumerate(value & 0xffffffff, base):
+            for pair in enumerate(value.astype('u4'), base):
                 addrs.append(pair)
 
     # sort by address increasing
     addrs.sort(key=lambda pair: pair[0])
 
-    for addr, value in addrs:
-        if value == 0 and args.ignore_zeros:
-            continue
-        print("%08x %08x" % (addr, value))
+    if args.ignore_zeros:
+        addrs = [(addr, value) for addr, value in addrs if value != 0]
+
+    if not args.names:
+        for addr, value in addrs:
+            print("%08x %08x" % (addr, value))
+        return
+
+    names, offsets = dev.lookup_addrs([addr for addr, _value in addrs])
+    for (addr, value), name, offset in zip(addrs, names, offsets):
+        if name is None:
+            name = '?'
+        elif dev.regmap[name].get('addr_width', 0) != 0:
+            name = '%s[%d]' % (name, offset)
+        print("%08x %08x %s" % (addr, value, name))
 
 
 def dumpjson(args, dev):
-    json.dump(dev.regmap, sys.stdout, indent=2)
+    json.dump(dev.regmap, sys.stdout, indent=2, default=to_jsonable)
     sys.stdout.write('\n')
 
 
@@ -227,6 +243,8 @@ def getargs():
                    help='Increment tag and wait for acquisition w/ new tag')
     S.add_argument('-P', '--plot', action='store_true', default=False,
                    help='Plot acquired data with matplotlib')
+    S.add_argument('-E', '--envelope', type=int, metavar='N', default=0,
+                   help='Reduce each channel to the min/max of N buckets')
     S.add_argument('channels', nargs='+', type=int, help='Channel numbers')
 
     S = SP.add_parser('decim', help='Set decimation')
@@ -239,6 +257,8 @@ def getargs():
     S = SP.add_parser('dump', help='dump registers')
     S.add_argument('-Z', '--ignore-zeros', action='store_true',
                    help="Only print registers with non-zero values")
+    S.add_argument('-N', '--names', action='store_true',
+                   help="Print register name with each address")
     S.set_defaults(func=dumpaddrs)
 
     S = SP.add_parser('json', help='print json')
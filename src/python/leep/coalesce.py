@@ -0,0 +1,125 @@
+"""Coalescing of concurrent register reads.
+
+>>> dev = leep.open('leep://192.168.42.1', threadsafe=True)
+>>> shared = SingleFlight(dev)
+>>> # then from many threads
+>>> A, B = shared.reg_read(['reg_a', 'reg_b'])
+"""
+
+import logging
+
+import threading
+import time
+
+import numpy
+
+from .base import split_index
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'SingleFlight',
+)
+
+
+class _Batch(object):
+    def __init__(self):
+        self.keys = {}  # used as an ordered set
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Wraps a device so that reg_read() calls made concurrently,
+    from different threads, are merged into a single reg_read() of
+    the union of the requested registers.  The results are then fanned
+    out to all callers.
+
+    The first caller waits for window seconds to collect other requests.
+
+    Other attributes are passed through to the wrapped device.
+
+    :param dev: A :py:class:`base.DeviceBase`
+    :param float window: Time, in seconds, to wait for other requests.
+    """
+
+    def __init__(self, dev, window=0.002):
+        self.dev = dev
+        self.window = window
+        self._lock = threading.Lock()
+        self._batch = None
+        # Serialize I/O unless the device is thread-safe
+        self._io = None
+        if getattr(dev, '_mux', None) is None:
+            self._io = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.dev, name)
+
+    def _key(self, name, instance):
+        # a hashable, and fully expanded, form of a register name
+        name, index = split_index(name)
+        if instance is not None:
+            name = self.dev.expand_regname(name, instance=instance)
+        if isinstance(index, slice):
+            index = (index.start, index.stop, index.step)
+        return name, index
+
+    @staticmethod
+    def _name(key):
+        # inverse of _key()
+        name, index = key
+        if index is None:
+            return name
+        elif isinstance(index, tuple):
+            return name, slice(*index)
+        return name, index
+
+    def reg_read(self, names, instance=[]):
+        keys = [self._key(name, instance) for name in names]
+
+        with self._lock:
+            B = self._batch
+            leader = B is None
+            if leader:
+                B = self._batch = _Batch()
+            for K in keys:
+                B.keys[K] = None
+
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                self._batch = None  # no more joiners
+            self._flush(B)
+        else:
+            B.done.wait()
+
+        if B.error is not None:
+            raise B.error
+
+        ret = []
+        for K in keys:
+            V = B.result[K]
+            if isinstance(V, numpy.ndarray):
+                V = V.copy()  # callers may modify
+            ret.append(V)
+        return ret
+
+    def _flush(self, B):
+        keys = list(B.keys)
+        _log.debug('Coalesced read of %d registers', len(keys))
+        try:
+            if self._io is not None:
+                self._io.acquire()
+            try:
+                values = self.dev.reg_read([self._name(K) for K in keys],
+                                           instance=None)
+            finally:
+                if self._io is not None:
+                    self._io.release()
+            B.result = dict(zip(keys, values))
+        except Exception as e:
+            B.error = e
+        finally:
+            B.done.set()
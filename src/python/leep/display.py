@@ -0,0 +1,62 @@
+"""Reduction of waveforms for display.
+
+A screen shows far fewer points than are acquired.  Reducing each
+waveform to the minimum and maximum of each of ~1000 buckets keeps the
+envelope, including single sample spikes, while shipping and rendering
+an order of magnitude less data.
+
+>>> T, = dev.get_timebase([0])
+>>> A, = dev.get_channels([0])
+>>> T, A = envelope(A, T, buckets=800)
+>>> plot(T, A)
+"""
+
+import logging
+
+import numpy
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'envelope',
+)
+
+
+def envelope(data, time=None, buckets=1000):
+    """Reduce waveforms along the last axis to the minimum and maximum
+    of each of a number of buckets of (nearly) equal size.
+
+    Waveforms which are already no longer than the output
+    are returned unchanged.
+
+    :param data: Samples.  eg. of shape (channels, samples)
+    :param time: 1-d time base, eg. from get_timebase(), or None.
+    :param int buckets: Number of buckets.  The output has 2*buckets
+                        samples, alternating min and max.
+    :returns: A tuple of reduced time base (or None), and reduced data.
+              Both the min and max of a bucket have the time of the
+              first sample in the bucket.
+    """
+    data = numpy.asarray(data)
+    N = data.shape[-1]
+    if buckets < 1:
+        raise RuntimeError('buckets must be positive, not %s' % buckets)
+    if time is not None:
+        time = numpy.asarray(time)
+        if time.shape != (N,):
+            raise RuntimeError('time base shape %s does not match %d samples'
+                               % (time.shape, N))
+    if N <= 2 * buckets:
+        return time, data
+
+    # first sample of each bucket
+    edges = numpy.arange(buckets) * N // buckets
+
+    out = numpy.empty(data.shape[:-1] + (buckets, 2), dtype=data.dtype)
+    numpy.minimum.reduceat(data, edges, axis=-1, out=out[..., 0])
+    numpy.maximum.reduceat(data, edges, axis=-1, out=out[..., 1])
+    out = out.reshape(data.shape[:-1] + (2 * buckets,))
+
+    if time is not None:
+        time = time[edges].repeat(2)
+    return time, out
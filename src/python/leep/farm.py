@@ -0,0 +1,189 @@
+"""Acquisition from many devices with a pool of worker processes.
+
+Each device is opened, and acquired from, in a separate worker process.
+Workers publish frames into a :py:class:`ring.WaveRing`, from which the
+parent reads without copying or pickling.  Workers which fail are
+restarted.
+
+>>> F = Farm(['leep://192.168.42.%d' % i for i in range(1, 81)],
+...          chans=[0, 1], nsamp=2048)
+>>> F.start()
+>>> data, stamps = F.capture()
+>>> data.shape
+(80, 2, 2048)
+>>> F.stop()
+"""
+
+import logging
+
+import multiprocessing
+import threading
+import time
+
+import numpy
+
+from .ring import WaveRing
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'Farm',
+)
+
+
+def _worker(addr, name, chans, tag, kws, stop):
+    # runs in worker process
+    from . import open
+    ring = WaveRing.attach(name)
+    try:
+        with open(addr, **kws) as dev:
+            while not stop.is_set():
+                dev.wait_for_acq(tag=tag)
+                ring.publish(dev.get_channels(chans))
+    except Exception:
+        _log.exception('Worker for %s fails', addr)
+        raise SystemExit(1)
+    finally:
+        ring.close()
+
+
+class _Member(object):
+    def __init__(self, addr, ring):
+        self.addr = addr
+        self.ring = ring
+        self.proc = None
+        self.restarts = 0
+        self.restart_at = None
+
+
+class Farm(object):
+    """Acquire from many devices, each in its own worker process.
+
+    :param list addrs: Device addresses, as for open()
+    :param list chans: Channel numbers, as for get_channels()
+    :param int nsamp: Samples per channel.  Extra samples are discarded.
+    :param int nframes: Ring buffer size for each device.
+    :param bool tag: As for wait_for_acq()
+    :param dict open_kws: Passed to open() by each worker.
+    :param float restart_delay: Time, in seconds, before a failed worker
+                                is restarted.
+    :param str method: multiprocessing start method.  Default is
+                       'spawn', as workers are restarted from a thread,
+                       and forking a threaded process may deadlock.
+    """
+
+    def __init__(self, addrs, chans, nsamp, nframes=4, tag=False,
+                 open_kws={}, restart_delay=1.0, method='spawn'):
+        self.chans = list(chans)
+        self.tag = tag
+        self.open_kws = dict(open_kws)
+        self.restart_delay = restart_delay
+        self._ctx = multiprocessing.get_context(method)
+        self._stop = self._ctx.Event()
+        self.members = [_Member(addr, WaveRing.create(
+            None, nframes=nframes, nchans=len(self.chans), nsamp=nsamp))
+            for addr in addrs]
+        self._lock = threading.Lock()
+        self._T = None
+
+    def start(self):
+        """Start all workers, and a thread which restarts failed workers.
+        """
+        assert self._T is None, 'Already started'
+        self._stop.clear()
+        for M in self.members:
+            self._spawn(M)
+        self._T = threading.Thread(target=self._monitor, name='leep.farm')
+        self._T.daemon = True
+        self._T.start()
+
+    def _spawn(self, M):
+        M.proc = self._ctx.Process(target=_worker,
+                                   args=(M.addr, M.ring.name, self.chans,
+                                         self.tag, self.open_kws,
+                                         self._stop),
+                                   name='leep.farm %s' % M.addr)
+        M.proc.daemon = True
+        M.proc.start()
+
+    def _monitor(self):
+        while not self._stop.wait(0.1):
+            self.check()
+
+    def check(self):
+        """Restart any failed workers.  Called periodically once started.
+        """
+        with self._lock:
+            if self._stop.is_set():
+                return
+            now = time.time()
+            for M in self.members:
+                if M.proc is None or M.proc.is_alive():
+                    continue
+                elif M.restart_at is None:
+                    _log.warning('Worker for %s exited with %s',
+                                 M.addr, M.proc.exitcode)
+                    M.restart_at = now + self.restart_delay
+                elif now >= M.restart_at:
+                    M.restarts += 1
+                    M.restart_at = None
+                    self._spawn(M)
+
+    def stop(self):
+        """Stop all workers, and release ring buffers.
+        """
+        self._stop.set()
+        if self._T is not None:
+            self._T.join()
+            self._T = None
+        with self._lock:
+            for M in self.members:
+                if M.proc is not None:
+                    M.proc.join(5.0)
+                    if M.proc.is_alive():
+                        M.proc.terminate()
+                        M.proc.join()
+                    M.proc = None
+                M.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, A, B, C):
+        self.stop()
+
+    def latest(self):
+        """:returns: A list of the latest frame from each device,
+        as from :py:meth:`ring.WaveRing.latest`.  These are views.
+        """
+        return [M.ring.latest() for M in self.members]
+
+    def capture(self, timeout=5.0):
+        """Wait for a new frame from every device.
+
+        :returns: A tuple of a numpy.ndarray of shape
+                  (devices, channels, samples), and a list of frame
+                  timestamps.
+        :raises RuntimeError: On timeout.
+        """
+        if not self.members:
+            return numpy.zeros((0, len(self.chans), 0)), []
+        R = self.members[0].ring
+        out = numpy.zeros((len(self.members), R.nchans, R.nsamp),
+                          dtype=R.dtype)
+
+        first = [M.ring.seq for M in self.members]
+        deadline = time.time() + timeout
+        stamps = []
+        for i, (M, seq) in enumerate(zip(self.members, first)):
+            F = M.ring.wait(seq, timeout=max(0, deadline - time.time()))
+            while F is not None:
+                seq, stamp, view = F
+                out[i] = view
+                if M.ring.valid(seq):
+                    break  # not overwritten while copying
+                F = M.ring.latest()
+            if F is None:
+                raise RuntimeError('Timeout waiting for %s' % M.addr)
+            stamps.append(stamp)
+        return out, stamps
@@ -5,29 +5,140 @@ import logging
 import hashlib
 import json
 
+import numpy
+
 from .base import DeviceBase
+from .regmap import RegMap, shared, addr_index
 
 
 _log = logging.getLogger(__name__)
 
 
+def load_dump(fname):
+    """Read the output of "leep.cli dump".
+
+    :returns: A tuple of arrays of addresses and values.
+    """
+    addrs, values = [], []
+    with open(fname, 'r') as F:
+        for line in F:
+            parts = line.split()
+            if len(parts) < 2 or line.startswith('#'):
+                continue
+            addrs.append(int(parts[0], 16))
+            values.append(int(parts[1], 16))
+    return numpy.asarray(addrs, dtype='i8'), numpy.asarray(values, dtype='u4')
+
+
 class FileDevice(DeviceBase):
+    """An offline device.  Register values are kept in an array,
+    with one element for each address of each register.
+    The address ranges of registers are packed together, so unused
+    addresses take no space.
+
+    :param str image: If set, the name of a file in which the register
+                      image is kept (memory mapped).
+                      Created if it does not exist.
+    :param initial: Preload register values.  Either the name of a file
+                    written by "leep.cli dump", or a dict of {addr: value}.
+    """
     backend = 'file'
 
-    def __init__(self, jfile, timeout=None, **kws):
+    def __init__(self, jfile, timeout=None, image=None, initial=None, **kws):
         DeviceBase.__init__(self, **kws)
 
         with open(jfile, 'rb') as F:
             J = F.read()
 
-        self.regmap = json.loads(J)
-
         self.descript = 'Offline JSON'
         self.codehash = '0000000000000000000000000000000000000000'
         self.jsonhash = hashlib.new('sha1', J).hexdigest()
 
+        self.regmap = shared(('file', self.jsonhash),
+                             lambda: RegMap(json.loads(J)))
+
+        # merge overlapping register address ranges into spans
+        index = addr_index(self.regmap)
+        starts, ends = [], []
+        for S, E in zip(index.starts, index.ends):
+            if ends and S <= ends[-1]:
+                ends[-1] = max(ends[-1], E)
+            else:
+                starts.append(S)
+                ends.append(E)
+        self._starts = numpy.asarray(starts, dtype='i8')
+        self._ends = numpy.asarray(ends, dtype='i8')
+        # position of each span in the image
+        lens = self._ends - self._starts
+        self._offsets = numpy.cumsum(lens) - lens
+        size = int(lens.sum())
+
+        if image is None or size == 0:
+            self._image = numpy.zeros(size, dtype='u4')
+        else:
+            with open(image, 'ab') as F:
+                if F.tell() < 4 * size:
+                    F.truncate(4 * size)
+            self._image = numpy.memmap(image, dtype='<u4', mode='r+',
+                                       shape=(size,))
+
+        if isinstance(initial, dict):
+            self.exchange(list(initial), list(initial.values()))
+        elif initial is not None:
+            addrs, values = load_dump(initial)
+            self.exchange(addrs, values)
+
+    def close(self):
+        DeviceBase.close(self)
+        if isinstance(self._image, numpy.memmap):
+            self._image.flush()
+
     def reg_write(self, ops, instance=[]):
-        pass
+        addrs, values = self._plan_write(ops, instance=instance)
+        self.exchange(addrs, values)
+        self._shadow_written(ops, instance=instance)
 
     def reg_read(self, names, instance=[]):
-        return [0] * len(names)
+        addrs, lens = self._plan_read(names, instance=instance)
+        return self._decode_read(self.exchange(addrs), lens)
+
+    def _locate(self, addrs):
+        # position of each address in the image
+        i = numpy.searchsorted(self._starts, addrs, side='right') - 1
+        bad = i < 0
+        if len(self._starts):
+            i[bad] = 0
+            bad |= addrs >= self._ends[i]
+        else:
+            bad[:] = True
+        if bad.any():
+            raise RuntimeError('No register at address 0x%x'
+                               % addrs[bad][0])
+        return addrs - self._starts[i] + self._offsets[i]
+
+    def exchange(self, addrs, values=None):
+        """Accepts a list of address and values (None to read).
+        Returns a numpy.ndarray in the same order.
+
+        :raises RuntimeError: If an address is not part of any register.
+        """
+        addrs = self._locate(numpy.asarray(addrs, dtype='i8') & 0x00ffffff)
+        ret = numpy.zeros(len(addrs), dtype='u4')
+        if len(addrs) == 0:
+            return ret
+        elif values is None:
+            ret[:] = self._image[addrs]
+            return ret
+
+        # perform in order, as a sequence of runs of reads or writes
+        values = list(values)
+        isread = numpy.asarray([V is None for V in values], dtype=bool)
+        edges = numpy.flatnonzero(numpy.diff(isread)) + 1
+        for S, E in zip([0] + list(edges), list(edges) + [len(addrs)]):
+            if isread[S]:
+                ret[S:E] = self._image[addrs[S:E]]
+            else:
+                # values are stored as unsigned
+                self._image[addrs[S:E]] = numpy.asarray(
+                    values[S:E], dtype='i8').astype('u4')
+        return ret
@@ -0,0 +1,112 @@
+"""Synchronized waveform capture from several devices.
+
+>>> devs = [leep.open('leep://192.168.42.%d' % i) for i in (1, 2, 3)]
+>>> G = group_capture(devs, chans=[0, 1])
+>>> G.data.shape
+(3, 2, 2048)
+>>> G.tags
+[5, 12, 7]
+
+One thread is used for each device.  All threads re-arm their device
+together, then wait for, and read out, acquisitions concurrently.
+So a group capture takes about as long as the slowest single capture.
+"""
+
+import logging
+
+import collections
+import threading
+import time
+
+import numpy
+
+from .base import _monotonic
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'GroupData',
+    'group_capture',
+)
+
+GroupData = collections.namedtuple('GroupData',
+                                   ['data', 'armed', 'ready', 'tags'])
+GroupData.__doc__ = """Result of :py:func:`group_capture`.
+
+data is a numpy.ndarray of shape (devices, channels, samples),
+truncated to the shortest capture.  armed and ready are lists with
+the time.time() of the re-arm, and of ready, for each device.
+tags is a list of the acquisition tag (slow_data[33]) of each device,
+or None for devices without tags.
+"""
+
+
+class _Member(object):
+    def __init__(self, dev, instance):
+        self.dev = dev
+        self.instance = instance
+        self.armed = self.ready = self.tag = self.data = None
+        self.error = None
+
+        self.acq = dev._acq_setup(instance)
+
+    def capture(self, go, chans, deadline):
+        dev = self.dev
+        try:
+            go.wait()
+
+            self.armed = time.time()
+            dev._acq_arm(self.acq)
+
+            with dev.deadline(deadline - _monotonic()):
+                slow = dev._acq_poll(self.acq, self.instance)
+
+                self.ready = time.time()
+                if slow is not None:
+                    self.tag = int(slow[33])
+
+                self.data = dev.get_channels(chans, instance=self.instance)
+        except Exception as e:
+            _log.exception('group capture from %s', dev)
+            self.error = e
+
+
+def group_capture(devices, chans, timeout=5.0, instances=None):
+    """Capture waveforms from several leep:// devices at the same time.
+
+    :param list devices: A list of :py:class:`base.DeviceBase`
+    :param list chans: Channel numbers, as for get_channels()
+    :param float timeout: Maximum time, in seconds, for the whole capture.
+    :param list instances: A list of instance lists, one for each device.
+    :returns: :py:class:`GroupData`
+    :raises RuntimeError: If any capture fails, after all have completed.
+    """
+    if instances is None:
+        instances = [[]] * len(devices)
+    members = [_Member(dev, inst) for dev, inst in zip(devices, instances)]
+
+    deadline = _monotonic() + timeout
+    go = threading.Event()
+    workers = [threading.Thread(target=M.capture,
+                                args=(go, chans, deadline),
+                                name='leep.group')
+               for M in members]
+    [T.start() for T in workers]
+    go.set()  # all re-arm together
+    [T.join() for T in workers]
+
+    for M in members:
+        if M.error is not None:
+            raise RuntimeError('group capture from %s failed: %s'
+                               % (M.dev, M.error))
+
+    nsamp = min([len(D) for M in members for D in M.data] or [0])
+    data = numpy.zeros((len(members), len(chans), nsamp), dtype='f8')
+    for i, M in enumerate(members):
+        for j, D in enumerate(M.data):
+            data[i, j] = D[:nsamp]
+
+    return GroupData(data=data,
+                     armed=[M.armed for M in members],
+                     ready=[M.ready for M in members],
+                     tags=[M.tag for M in members])
@@ -0,0 +1,189 @@
+"""Sharing of one UDP socket between concurrent requesters.
+
+Replies are read from the socket, and each is handed to the requester
+waiting for a reply from the same source address with the same
+header (nonce).  Replies for which no requester is waiting are dropped.
+
+One MuxTransport may be shared by many devices.
+
+>>> T = MuxTransport()
+>>> devs = [leep.open('leep://192.168.42.%d' % i, transport=T)
+...         for i in range(1, 101)]
+
+By default, a dedicated thread reads replies.  With thread=False,
+replies are read by whichever requester is waiting, or by an event loop
+when the socket is readable.  eg. with asyncio
+
+>>> T = MuxTransport(thread=False)
+>>> loop.add_reader(T.fileno(), T.handle_read)
+"""
+
+import logging
+
+import errno
+import select
+import socket
+import threading
+
+from .base import _monotonic
+
+_log = logging.getLogger(__name__)
+
+
+class _Waiter(object):
+    __slots__ = ('replies', 'callback')
+
+    def __init__(self, callback=None):
+        self.replies = []
+        self.callback = callback
+
+
+class MuxTransport(object):
+    """Shares one UDP socket between any number of threads and devices,
+    each with a request in flight.
+
+    :param float poll: Interval at which the receiver checks for close().
+    :param bool thread: Start a dedicated receiver thread.
+    """
+
+    def __init__(self, poll=0.5, thread=True):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, 0)
+        self.sock.bind(('', 0))
+        self.unmatched = 0  # count of replies dropped by the receiver
+
+        self._lock = threading.Lock()
+        # notified when a reply is queued, or when _pumping is cleared
+        self._cond = threading.Condition(self._lock)
+        self._pending = {}  # {((host, port), header): _Waiter}
+        self._pumping = False  # a waiter is reading replies
+        self._running = True
+        self._T = None
+        if thread:
+            self.sock.settimeout(poll)
+            self._T = threading.Thread(target=self._run, name='leep.mux')
+            self._T.daemon = True
+            self._T.start()
+        else:
+            self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self._running = False
+        if self._T is not None:
+            try:
+                # wake up receiver
+                self.sock.sendto(b'', ('127.0.0.1',
+                                       self.sock.getsockname()[1]))
+            except socket.error:
+                pass
+            self._T.join()
+        self.sock.close()
+
+    def register(self, dest, header, callback=None):
+        """Begin waiting for replies from dest with header.
+        Must be called before the request is sent.
+
+        :param callable callback: If set, called as callback(reply)
+                                  for each reply instead of queuing
+                                  for :py:meth:`wait`.
+        :returns: A key for :py:meth:`wait` and :py:meth:`unregister`,
+                  or None if the same header is already in use.
+        """
+        key = (dest, header)
+        with self._lock:
+            if key in self._pending:
+                return None
+            self._pending[key] = _Waiter(callback)
+        return key
+
+    def unregister(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def wait(self, key, timeout):
+        """Wait for, and return, the next reply for key.
+
+        :raises socket.timeout: If no reply arrives in time.
+        """
+        deadline = _monotonic() + timeout
+        while True:
+            with self._lock:
+                W = self._pending[key]
+                while not W.replies:
+                    remaining = deadline - _monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout('timed out')
+                    elif self._T is None and not self._pumping:
+                        # no receiver thread.  read replies until ours arrives
+                        self._pumping = True
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    return W.replies.pop(0)
+
+            try:
+                select.select([self.sock], [], [], remaining)
+                self.handle_read()
+            finally:
+                with self._lock:
+                    self._pumping = False
+                    self._cond.notify_all()
+
+    def handle_read(self):
+        """Read, and dispatch, all replies which are ready.
+        For use when thread=False.
+        """
+        while True:
+            try:
+                reply, src = self.sock.recvfrom(2048)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            self._dispatch(reply, src)
+
+    def _dispatch(self, reply, src):
+        with self._lock:
+            W = self._pending.get((src, reply[:8]))
+            if W is not None and W.callback is None:
+                W.replies.append(reply)
+                self._cond.notify_all()
+                return
+            elif W is None:
+                self.unmatched += 1
+        if W is not None:
+            W.callback(reply)
+        else:
+            _log.error('Ignore reply w/o matching nonce from %s', src)
+
+    def _run(self):
+        while self._running:
+            try:
+                reply, src = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except socket.error:
+                if self._running:
+                    _log.exception('receiver error')
+                break
+            if not self._running:
+                break
+
+            self._dispatch(reply, src)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_transport():
+    """:returns: A process wide :py:class:`MuxTransport`,
+    created when first needed.  Never closed.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = MuxTransport()
+        return _default
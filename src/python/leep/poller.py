@@ -0,0 +1,297 @@
+"""Periodic polling of register groups at different rates.
+
+Due times of all groups are aligned to a common epoch, so that
+groups with related periods fall due in the same tick.
+All groups due in one tick are read with a single exchange,
+sharing messages.
+
+>>> P = Poller(dev)
+>>> P.add(['status_a', 'status_b'], 0.1, fast_callback)
+>>> P.add(['temperature'], 10.0, slow_callback)
+>>> P.start()
+...
+>>> P.stop()
+>>> P.report()
+"""
+
+import logging
+
+import threading
+
+import numpy
+
+from .stats import Histogram
+from .base import _monotonic, split_index
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'Poller',
+    'Watch',
+)
+
+
+class Group(object):
+    """A set of registers polled with one period.
+    Returned by :py:meth:`Poller.add`.
+    """
+
+    def __init__(self, names, period, callback, instance):
+        self.names = list(names)
+        self.period = float(period)
+        self.callback = callback
+        self.instance = instance
+        self.next_due = None
+        self.count = 0  # number of polls completed
+        self.misses = 0  # number of due times skipped
+        # from due time to completion of read, in seconds
+        self.latency = Histogram()
+        self.plan = None  # (addrs, lens) when dev has exchange()
+        self.regs = None  # expanded names otherwise
+
+    def report(self):
+        return {
+            'names': self.names,
+            'period': self.period,
+            'count': self.count,
+            'misses': self.misses,
+            'latency': {
+                'count': self.latency.count,
+                'sum': self.latency.sum,
+                'buckets': self.latency.cumulative(),
+            },
+        }
+
+
+class Poller(object):
+    """Poll groups of registers, each with its own period.
+
+    For leep:// devices, register addresses for each group are
+    computed once when the group is added, and all groups due in one
+    tick are read through a single call to exchange().
+    Other devices receive a single reg_read() of all registers due.
+
+    :param dev: A :py:class:`base.DeviceBase`
+    :param float slack: Groups due within slack seconds of a tick
+                        are included in that tick.
+    """
+
+    def __init__(self, dev, slack=0.001):
+        self.dev = dev
+        self.slack = slack
+        self.groups = []
+        self.ticks = 0  # number of ticks with I/O
+        self.errors = 0  # number of ticks with I/O errors
+        self._epoch = _monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._T = None
+
+    def add(self, names, period, callback, instance=[]):
+        """Begin polling a group of registers.
+
+        :param list names: Register names, as for reg_read()
+        :param float period: Polling period in seconds.
+        :param callable callback: Called as callback(values) with
+                                  a list of values, as from reg_read()
+        :param list instance: List of instance identifiers.
+        :returns: A :py:class:`Group`
+        """
+        G = Group(names, period, callback, instance)
+        if hasattr(self.dev, 'exchange'):
+            addrs, lens = self.dev._plan_read(G.names, instance=instance)
+            G.plan = numpy.asarray(addrs, dtype='u4'), lens
+        else:
+            G.regs = [self._expand(name, instance) for name in G.names]
+        now = _monotonic()
+        # align to the common epoch.  first poll at next multiple of period
+        N = (now - self._epoch) // G.period + 1
+        G.next_due = self._epoch + N * G.period
+        with self._lock:
+            self.groups.append(G)
+        return G
+
+    def remove(self, group):
+        with self._lock:
+            self.groups.remove(group)
+
+    def next_due(self):
+        """:returns: The earliest due time (time.monotonic()) of any group,
+        or None.
+        """
+        with self._lock:
+            if not self.groups:
+                return None
+            return min([G.next_due for G in self.groups])
+
+    def poll(self, now=None):
+        """Poll all groups which are due.
+
+        :returns: The list of groups polled.
+        """
+        if now is None:
+            now = _monotonic()
+        with self._lock:
+            due = [G for G in self.groups if G.next_due <= now + self.slack]
+        if not due:
+            return due
+
+        self.ticks += 1
+        try:
+            results = self._read(due)
+        except Exception:
+            self.errors += 1
+            _log.exception('Error polling %s', self.dev)
+            results = None
+
+        done = _monotonic()
+        for i, G in enumerate(due):
+            G.latency.observe(done - G.next_due)
+
+            # advance to next due time, skipping any missed
+            N = max(1, (done - G.next_due) // G.period + 1)
+            if N > 1:
+                G.misses += int(N) - 1
+                _log.debug('Group %s missed %d deadlines', G.names, N - 1)
+            G.next_due += N * G.period
+
+            if results is None:
+                continue
+            G.count += 1
+            try:
+                G.callback(results[i])
+            except Exception:
+                _log.exception('Error in callback for %s', G.names)
+
+        return due
+
+    def _expand(self, name, instance):
+        # expand the name, keeping any index or slice
+        if instance is None or (not isinstance(name, tuple) and
+                                name in self.dev.regmap):
+            return name
+        name, index = split_index(name)
+        name = self.dev.expand_regname(name, instance=instance)
+        return name if index is None else (name, index)
+
+    def _read(self, due):
+        if all([G.plan is not None for G in due]):
+            addrs = numpy.concatenate([G.plan[0] for G in due])
+            # groups may overlap.  read each address only once
+            uaddrs, idx = numpy.unique(addrs, return_inverse=True)
+            raw = self.dev.exchange(uaddrs)[idx]
+            results, offset = [], 0
+            for G in due:
+                results.append(self.dev._decode_read(raw[offset:],
+                                                     G.plan[1]))
+                offset += len(G.plan[0])
+            return results
+
+        names = []
+        for G in due:
+            names.extend(G.regs)
+        values = self.dev.reg_read(names, instance=None)
+        results, offset = [], 0
+        for G in due:
+            results.append(values[offset:offset + len(G.names)])
+            offset += len(G.names)
+        return results
+
+    def run(self):
+        """Poll until :py:meth:`stop` is called.
+        """
+        while not self._stop.is_set():
+            due = self.next_due()
+            if due is None:
+                self._stop.wait(0.1)
+                continue
+            delay = due - _monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            self.poll()
+
+    def start(self):
+        """Poll from a daemon thread.
+        """
+        assert self._T is None, 'Already started'
+        self._stop.clear()
+        self._T = threading.Thread(target=self.run, name='leep.poller')
+        self._T.daemon = True
+        self._T.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._T is not None:
+            self._T.join()
+            self._T = None
+
+    def report(self):
+        """:returns: A dict of polling statistics, with a list of
+        per group statistics.
+        """
+        with self._lock:
+            groups = list(self.groups)
+        return {
+            'ticks': self.ticks,
+            'errors': self.errors,
+            'groups': [G.report() for G in groups],
+        }
+
+
+class Watch(object):
+    """Calls back with only those registers which have changed
+    since the previous poll.  Returned by
+    :py:meth:`base.DeviceBase.watch`.
+
+    All values of a group are compared at once, as a single array,
+    against the previous snapshot.
+
+    :param list names: Register names
+    :param callable callback: Called as callback([(name, value), ...])
+    :param mask: None to compare all bits.  An integer bit mask
+                 applied to all registers, or a list of masks,
+                 one for each register.
+    """
+
+    def __init__(self, names, callback, mask=None):
+        self.names = list(names)
+        self.callback = callback
+        if mask is None:
+            mask = 0xffffffff
+        self.mask = numpy.broadcast_to(numpy.asarray(mask, dtype='i8'),
+                                       (len(self.names),))
+        self.group = None
+        self.poller = None
+        self._prev = None
+        self._ends = None  # cumulative number of elements, by register
+
+    def cancel(self):
+        """Stop watching
+        """
+        if self.poller is not None:
+            self.poller.remove(self.group)
+            self.poller = None
+
+    def __call__(self, values):
+        # values as from reg_read(), one for each name
+        if self._ends is None:
+            lens = [numpy.size(V) for V in values]
+            self._ends = numpy.cumsum([0] + lens)
+            self._emask = numpy.repeat(self.mask, lens)
+
+        cur = numpy.concatenate([numpy.ravel(V) for V in values] +
+                                [numpy.zeros(0, 'i8')]).astype('i8')
+
+        if self._prev is None:
+            # the first poll reports all
+            changed = [True] * len(values)
+        else:
+            diff = ((cur ^ self._prev) & self._emask) != 0
+            cs = numpy.cumsum(numpy.concatenate([[0], diff]))
+            changed = cs[self._ends[1:]] != cs[self._ends[:-1]]
+
+        self._prev = cur
+        ret = [(name, V)
+               for name, V, C in zip(self.names, values, changed) if C]
+        if ret:
+            self.callback(ret)
@@ -5,11 +5,14 @@ import json
 import zlib
 import random
 import socket
-import sys
 from functools import reduce
 
 from . import RomError
-from .base import DeviceBase, print_reg
+from .base import DeviceBase, DeadlineError, _monotonic
+from .regmap import RegMap, get_shared, shared
+from .stats import timed
+from .mux import MuxTransport
+from .capture import Capture
 import logging
 
 
@@ -18,9 +21,6 @@ _log = logging.getLogger(__name__)
 _spam = logging.getLogger(__name__ + '.packets')
 _spam.propagate = False
 
-if sys.version_info >= (3, 0):
-    unicode = str
-
 be32 = numpy.dtype('>u4')
 be16 = numpy.dtype('>u2')
 
@@ -105,6 +105,18 @@ def yscale_rfs(wave_samp_per=1):
         raise RuntimeError("yscale_rfs(%s) %s" % (wave_samp_per, e))
 
 
+def _tabulate(yscale):
+    # (wave_shift, Ymax) indexed by decimation 1..255.  [0] is unused.
+    return [None] + [yscale(dec) for dec in range(1, 256)]
+
+
+_yscale_tables = {
+    'rfs': _tabulate(yscale_rfs),
+    'resctrl': _tabulate(yscale_resctrl),
+    'injector': _tabulate(yscale_inj),
+}
+
+
 class LEEPDevice(DeviceBase):
     backend = 'leep'
     init_rom_addr = 0x800
@@ -114,21 +126,40 @@ class LEEPDevice(DeviceBase):
         40 + 10 + 10 = 60. Plus 4 for each of the types.
     '''
     preamble_max_size = 64
-    ''' Hash = 10 + 10 and descriptor for each type
-        (hash and description) is one.
-    '''
-    hash_descriptor_size = 24
     size_desc = 0
     size_rom = 0
     the_rom = []
 
-    def __init__(self, addr, timeout=0.1, **kws):
+    def __init__(self, addr, timeout=0.1, threadsafe=False, transport=None,
+                 **kws):
+        """
+        :param float timeout: Timeout waiting for each reply
+        :param bool threadsafe: Allow concurrent calls from many threads.
+                                Replies are received by a dedicated thread,
+                                and dispatched to callers by nonce.
+        :param transport: A :py:class:`mux.MuxTransport` to share with
+                          other devices.  Implies threadsafe=True.
+        """
         DeviceBase.__init__(self, **kws)
         host, _sep, port = addr.partition(':')
         self.dest = (host, int(port or '50006'))
-
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, 0)
-        self.sock.settimeout(timeout)
+        self._stats.labels['device'] = '%s:%d' % self.dest
+        self.timeout = timeout
+
+        # Datagram capture.  See enable_capture()
+        self._capture = None
+
+        self._mux = None
+        self._own_mux = transport is None
+        if threadsafe or transport is not None:
+            # replies are matched with their source address
+            self.dest = (socket.gethostbyname(host), self.dest[1])
+            self._mux = transport or MuxTransport()
+            self.sock = self._mux.sock
+            self.threadsafe = True
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, 0)
+            self.sock.settimeout(timeout)
 
         self._readrom()
 
@@ -147,105 +178,118 @@ class LEEPDevice(DeviceBase):
             self.rfs = True
 
     def close(self):
-        self.sock.close()
         super(LEEPDevice, self).close()
+        if self._mux is None:
+            self.sock.close()
+        elif self._own_mux:
+            self._mux.close()
 
-    @print_reg
+    def enable_capture(self, capture=None, **kws):
+        """Begin recording sent and received datagrams.
+
+        :param capture: A :py:class:`capture.Capture` to share,
+                        or None to create one with kws.
+        :returns: The :py:class:`capture.Capture`
+        """
+        if capture is None:
+            capture = Capture(**kws)
+        if self.sock.getsockname()[1] == 0:
+            self.sock.bind(('', 0))  # as sendto() would
+        self._local = self.sock.getsockname()
+        self._capture = capture
+        return capture
+
+    def disable_capture(self):
+        self._capture = None
+
+    @timed('reg_write')
     def reg_write(self, ops, instance=[]):
 
         assert isinstance(ops, (list, tuple))
 
-        addrs, values = [], []
-        for name, value in ops:
-            if instance is not None:
-                name = self.expand_regname(name, instance=instance)
-            info = self.get_reg_info(name, instance=None)
-            L = 2**info.get('addr_width', 0)
-
-            base_addr = info['base_addr']
-            if isinstance(base_addr, (bytes, unicode)):
-                base_addr = int(base_addr, 0)
-
-            value = numpy.array(value).astype('I')
-
-            if L > 1:
-                _log.debug('reg_write %s <- %s ...', name, value[:10])
-                assert value.ndim == 1 and value.shape[0] == L, \
-                    ('must write whole register', value.shape, L)
-                # array register
-                for A, V in enumerate(value, base_addr):
-                    addrs.append(A)
-                    values.append(V)
-            else:
-                assert value.ndim == 0, 'scalar register'
-                _log.debug('reg_write %s <- %s', name, value)
-                addrs.append(base_addr)
-                values.append(value)
+        addrs, values = self._plan_write(ops, instance=instance)
 
         addrs = numpy.asarray(addrs)
         values = numpy.asarray(values)
 
         self.exchange(addrs, values)
+        self._shadow_written(ops, instance=instance)
 
-    @print_reg
+    @timed('reg_read')
     def reg_read(self, names, instance=[]):
-        addrs = []
-        lens = []
-        for name in names:
-            if instance is not None:
-                name = self.expand_regname(name, instance=instance)
-            info = self.get_reg_info(name, instance=None)
-            L = 2**info.get('addr_width', 0)
-
-            lens.append((info, L))
-            base_addr = info['base_addr']
-            if isinstance(base_addr, (bytes, str, unicode)):
-                base_addr = int(base_addr, 0)
-            addrs.extend(range(base_addr, base_addr + L))
+        addrs, lens = self._plan_read(names, instance=instance)
+
+        if len(lens) > 1:
+            # read each address only once
+            addrs = numpy.asarray(addrs)
+            uaddrs, idx = numpy.unique(addrs, return_inverse=True)
+            if len(uaddrs) < len(addrs):
+                return self._decode_read(self.exchange(uaddrs)[idx], lens)
 
         raw = self.exchange(addrs)
 
-        ret = []
-        for i, (info, L) in enumerate(lens):
-            data, raw = raw[:L], raw[L:]
-            assert len(data) == L, (len(data), L)
-            if info.get('sign', 'unsigned') == 'signed':
-                # sign extend
-                # mask of data bits excluding sign bit
-                mask = (2**(info['data_width'] - 1)) - 1
-                # invert to give mask of sign bit and extension bits
-                mask ^= 0xffffffff
-                # test sign bit
-                neg = (data & mask) != 0
-                # extend only negative numbers
-                data[neg] |= mask
-                # cast to signed
-                data = data.astype('i4')
-            _log.debug('reg_read %s -> %s ...', names[i], data[:10])
-            # unwrap scalar from ndarray
-            if info.get('addr_width', 0) == 0:
-                data = data[0]
-            ret.append(data)
+        return self._decode_read(raw, lens)
 
-        return ret
+    @timed('transaction')
+    def _commit(self, ops):
+        """Pack all operations of a transaction, in order,
+        into as few messages as possible.
+        """
+        addrs, values, reads = [], [], []
+        for op in ops:
+            if op[0] == 'write':
+                _op, regs, instance = op
+                A, V = self._plan_write(regs, instance=instance)
+                values.extend(V)
+            else:
+                _op, regs, instance, result = op
+                A, lens = self._plan_read(regs, instance=instance)
+                reads.append((len(addrs), lens, result))
+                values.extend([None] * len(A))
+            addrs.extend(A)
 
-    def set_decimate(self, dec, instance=[]):
+        raw = self.exchange(addrs, values)
+
+        for offset, lens, result in reads:
+            result._complete(self._decode_read(raw[offset:], lens))
+
+        for op in ops:
+            if op[0] == 'write':
+                self._shadow_written(op[1], instance=op[2])
+
+        if self.trace:
+            for op in ops:
+                if op[0] == 'write':
+                    self.tracer.record_write(op[1], op[2])
+                else:
+                    self.tracer.record_read(op[1], op[3], op[2])
+
+    def _yscale(self, dec):
+        """:returns: (wave_shift, Ymax) for this device type and decimation
+        """
         if self.rfs:
-            wave_shift, _Ymax = yscale_rfs(dec)
+            kind = 'rfs'
         elif self.resctrl:
-            wave_shift, _Ymax = yscale_resctrl(dec)
+            kind = 'resctrl'
         elif self.injector:
-            wave_shift, _Ymax = yscale_inj(dec)
+            kind = 'injector'
+        else:
+            raise RuntimeError('No waveform scaling for %s' % self)
+
+        if not 1 <= dec <= 255:
+            raise RuntimeError('Decimation %s out of range' % dec)
+        return _yscale_tables[kind][int(dec)]
 
-        assert dec >= 1 and dec <= 255
+    def set_decimate(self, dec, instance=[]):
+        wave_shift, _Ymax = self._yscale(dec)
         self.reg_write([
             ('wave_samp_per', dec),
             ('wave_shift', wave_shift),
         ], instance=instance)
 
     def get_decimate(self, instance=[]):
-        return self.reg_read(['wave_samp_per'],
-                             instance=instance)
+        return self._cached_read(['wave_samp_per'],
+                                 instance=instance)
 
     def set_channel_mask(self, chans=[], instance=[]):
         """Enabled specified channels.
@@ -259,24 +303,54 @@ class LEEPDevice(DeviceBase):
         self.reg_write([('chan_keep', chans)], instance=instance)
 
     def get_channel_mask(self, instance=[]):
-        chans, =  self.reg_read(['chan_keep'], instance=instance)
+        chans, = self._cached_read(['chan_keep'], instance=instance)
         return chans
 
+    @timed('wait_for_acq')
     def wait_for_acq(self, tag=False, toggle_tag=False, timeout=5.0,
                      instance=[]):
         """Wait for next waveform acquisition to complete.
         If tag=True, then wait for the next acquisition which includes the
         side-effects of all preceding register writes
+
+        :param float timeout: Overall time limit, in seconds, including
+                              all messages exchanged while polling.
+        :raises DeadlineError: On timeout.
         """
-        start = datetime.utcnow()
+        with self.deadline(timeout):
+            return self._wait_for_acq(tag, toggle_tag, instance)
 
+    def _wait_for_acq(self, tag, toggle_tag, instance):
         if self.rfs:
             T, = self.reg_read(['dsp_tag'], instance=instance)
+            T = int(T)
             if tag or toggle_tag:
                 T = (T + 1) & 0xff
                 self.reg_write([('dsp_tag', T)], instance=instance)
                 _log.debug('Set Tag %d', T)
 
+        acq = self._acq_setup(instance)
+        while True:
+            self._acq_arm(acq)
+            slow = self._acq_poll(acq, instance)
+            now = datetime.utcnow()
+            if not self.rfs:
+                return now
+
+            tag_match = self._acq_check_tag(T, slow, retry=tag)
+            if not tag or tag_match:
+                break
+
+        # datetimestr = now.isoformat()+'Z'
+        return tag_match, slow, now
+
+    def _acq_setup(self, instance=[]):
+        """Acquisition parameters, as used by wait_for_acq(),
+        :py:func:`scan.scan`, and :py:func:`group.group_capture`.
+
+        :returns: A tuple of the circle_buf_flip mask,
+                  and the name of the ready register.
+        """
         inst = self.instance + instance
         # assume that the shell_#_ number is the first
         mask = 1
@@ -286,60 +360,78 @@ class LEEPDevice(DeviceBase):
         if self.resctrl:
             mask = 0xF  # Always re-arm 4 channels
 
-        while True:
-            if self.injector:
-                self.reg_write([('circle_buf_flip', mask)], instance=[])
-            else:
-                self.reg_write([('circle_buf_flip', mask)], instance=None)
-
-            while True:
-                now = datetime.utcnow()
-                delta = now - start
-                delta_us = delta.seconds + delta.microseconds / 1e6
-                if delta_us >= timeout:
-                    raise RuntimeError('Timeout')
-
-                ''' TODO:
-                    use exchange() and optimize to fetch slow_data[33] as well
-                '''
-                if self.rfs or self.injector:
-                    ready_register = 'llrf_circle_ready'
-                else:
-                    ready_register = 'circle_data_ready'
-                ready, = self.reg_read([ready_register], instance=None)
-
-                if ready & mask:
-                    break
-
-            if self.rfs:
-                slow, = self.reg_read(['slow_data'], instance=instance)
-                tag_old = slow[34]
-                tag_new = slow[33]
-                dT = (tag_old - T) & 0xff
-                tag_match = dT == 0 and tag_new == tag_old
-
-                if not tag:
-                    break
+        if self.rfs or self.injector:
+            ready_register = 'llrf_circle_ready'
+        else:
+            ready_register = 'circle_data_ready'
+        return mask, ready_register
 
-                if tag_match:
-                    # all done, waveform reflects latest parameter changes
-                    break
+    def _acq_arm(self, acq, tx=None):
+        """Re-arm acquisition, now or as part of a Transaction
+        """
+        op = [('circle_buf_flip', acq[0])]
+        instance = [] if self.injector else None
+        if tx is None:
+            self.reg_write(op, instance=instance)
+        else:
+            tx.write(op, instance=instance)
 
-                if dT != 0xff:
-                    msg = 'acquisition collides with another client:'
-                    msg += '%d %d %d' % (tag_old, tag_new, T)
-                    raise RuntimeError(msg)
-            else:
-                return now
+    def _acq_poll(self, acq, instance=[]):
+        """Poll until an acquisition is ready.
 
-            _log.debug('Acquire retry')
+        :returns: slow_data, if rfs, or None
+        :raises DeadlineError: If the current deadline passes.
+        """
+        mask, ready_register = acq
+        S = None
+        while True:
+            if self._remaining() <= 0:
+                raise DeadlineError('Timeout')
+
+            # poll ready and tags together
+            with self.transaction() as tx:
+                R = tx.read([ready_register], instance=None)
+                if self.rfs:
+                    S = tx.read(['slow_data'], instance=instance)
+            self._stats.counters['acq_polls'] += 1
+            ready, = R
+            if ready & mask:
+                return None if S is None else S[0]
+
+    def _acq_check_tag(self, T, slow, retry=True):
+        """:returns: True if the acquisition with slow_data reflects
+        all register writes preceding tag T.
+
+        If retry, then False means that the acquisition began before
+        the tag change, and should be re-armed.
+
+        :raises RuntimeError: If retry, and another client changed the tag.
+        """
+        tag_old = int(slow[34])
+        tag_new = int(slow[33])
+        dT = (tag_old - T) & 0xff
+        tag_match = dT == 0 and tag_new == tag_old
+        if tag_match or not retry:
+            return tag_match
+
+        if dT != 0xff:
+            msg = 'acquisition collides with another client:'
+            msg += '%d %d %d' % (tag_old, tag_new, T)
+            raise RuntimeError(msg)
 
-        # datetimestr = now.isoformat()+'Z'
-        return tag_match, slow, now
+        # acquisition began before tag change.  try again
+        _log.debug('Acquire retry')
+        self._stats.counters['acq_retries'] += 1
+        return False
 
-    def get_channels(self, chans=[], instance=[]):
+    def get_channels(self, chans=[], instance=[], dtype='f8', raw=False):
         """:returns: a list of :py:class:`numpy.ndarray` with the numbered channels.
         chans may be a bit mask or a list of channel numbers
+
+        :param dtype: Type of scaled samples.  eg. 'f4' to halve size.
+        :param bool raw: If True, return a tuple of a list of unscaled
+                         int32 samples, and a list of the scale factor for
+                         each channel.  Scaled samples are raw / scale.
         """
         info = self.get_reg_info('chan_keep', instance=instance)
         nch = info['data_width']
@@ -347,22 +439,20 @@ class LEEPDevice(DeviceBase):
                             [2**(nch - 1 - n) for n in chans], 0)
 
         if self.rfs:
-            keep, dec = self.reg_read(['chan_keep', 'wave_samp_per'],
-                                      instance=instance)
+            keep, dec = self._cached_read(['chan_keep', 'wave_samp_per'],
+                                          instance=instance)
             data, = self.reg_read(['circle_data'], instance=instance)
-            wave_shift, Ymax = yscale_rfs(dec)
         else:
             if self.resctrl:
-                keep, dec = self.reg_read(['chan_keep', 'wave_samp_per'],
-                                          instance=None)
+                keep, dec = self._cached_read(
+                    ['chan_keep', 'wave_samp_per'], instance=None)
                 data, = self.reg_read(['circle_data_%s' % (instance[0])],
                                       instance=None)
-                wave_shift, Ymax = yscale_resctrl(dec)
             elif self.injector:
-                keep, dec = self.reg_read(['chan_keep', 'wave_samp_per'],
-                                          instance=[])
+                keep, dec = self._cached_read(
+                    ['chan_keep', 'wave_samp_per'], instance=[])
                 data, = self.reg_read(['circle_data'], instance=[])
-                wave_shift, Ymax = yscale_inj(dec)
+        wave_shift, Ymax = self._yscale(dec)
 
         # assume wave_shift has been set properly
         assert Ymax != 0, dec
@@ -381,25 +471,31 @@ class LEEPDevice(DeviceBase):
 
         # Lop off extra samples to get same number of samples per channel
         L = len(data)
-        xtra = L % nbits
-        data = numpy.delete(data, range(L - xtra, L))
+        data = data[:L - L % nbits]
         cdata, M = {}, 0
         for ch in range(nch):
             cmask = 2**(nch - 1 - ch)
             if not (keep & cmask):
                 continue
-            if interested & cmask:
-                cdata[ch] = data[M::nbits] / Ymax
+            if raw and interested & cmask:
+                cdata[ch] = numpy.ascontiguousarray(data[M::nbits],
+                                                    dtype='i4')
+            elif interested & cmask:
+                cdata[ch] = numpy.true_divide(data[M::nbits], Ymax,
+                                              dtype=dtype)
 
             M += 1
 
         # finally, ensure the results are in the same order as args
-        return list([cdata[ch] for ch in chans])
+        ret = list([cdata[ch] for ch in chans])
+        if raw:
+            return ret, [Ymax] * len(ret)
+        return ret
 
     def get_timebase(self, chans=[], instance=[]):
         if self.rfs:
             info = self.get_reg_info('circle_data', instance=instance)
-            keep, dec = self.reg_read([
+            keep, dec = self._cached_read([
                 'chan_keep',
                 'wave_samp_per',
             ], instance=instance)
@@ -407,8 +503,8 @@ class LEEPDevice(DeviceBase):
         else:
             info = self.get_reg_info('circle_%s_data' % instance[0],
                                      instance=None)
-            keep, dec = self.reg_read(['chan_keep', 'wave_samp_per'],
-                                      instance=None)
+            keep, dec = self._cached_read(['chan_keep', 'wave_samp_per'],
+                                          instance=None)
             if self.resctrl:
                 period = dec / 8e3
             elif self.injector:
@@ -446,8 +542,6 @@ class LEEPDevice(DeviceBase):
             values.extend([None] * pad)
 
         msg = numpy.zeros(2 + 2 * len(addrs), dtype=be32)
-        msg[0] = random.randint(0, 0xffffffff)
-        msg[1] = msg[0] ^ 0xffffffff
 
         for i, (A, V) in enumerate(zip(addrs, values), 1):
             A &= 0x00ffffff
@@ -456,36 +550,129 @@ class LEEPDevice(DeviceBase):
             msg[2 * i] = A
             msg[2 * i + 1] = V or 0
 
+        if self._mux is None:
+            reply = self._sendrecv(msg)
+        else:
+            reply = self._mux_sendrecv(msg)
+
+        ret = reply[3::2]
+        if pad:
+            ret = ret[:-pad]
+        return ret
+
+    def _sendrecv(self, msg):
+        """Send request message, and wait for a matching reply
+        """
+        # bound the wait for a matching reply, including ignored replies
+        timeout = self._op_timeout(self.timeout)
+        end = _monotonic() + timeout
+
+        msg[0] = random.randint(0, 0xffffffff)
+        msg[1] = msg[0] ^ 0xffffffff
+
         tosend = msg.tobytes()
         _spam.debug("%s Send (%d) %s", self.dest, len(tosend), repr(tosend))
         self.sock.sendto(tosend, self.dest)
+        if self._capture is not None:
+            self._capture.record(self._local, self.dest, tosend)
+        C = self._stats.counters
+        C['packets_sent'] += 1
+        C['bytes_sent'] += len(tosend)
 
         while True:
-            reply, src = self.sock.recvfrom(1024)
-            _spam.debug("%s Recv (%d) %s", src, len(reply), repr(reply))
+            try:
+                remaining = end - _monotonic()
+                if remaining <= 0:
+                    raise socket.timeout('timed out')
+                self.sock.settimeout(remaining)
+                reply, src = self.sock.recvfrom(1024)
+            except socket.timeout:
+                C['timeouts'] += 1
+                if self._capture is not None:
+                    self._capture.error()
+                if timeout < self.timeout:
+                    raise DeadlineError('Deadline exceeded')
+                raise
+            reply = self._check_reply(msg, reply, src)
+            if reply is not None:
+                return reply
 
-            if len(reply) % 8:
-                reply = reply[:-(len(reply) % 8)]
+    def _mux_sendrecv(self, msg):
+        """Send request message, and wait for the receiver thread to
+        pass back a matching reply
+        """
+        timeout = self._op_timeout(self.timeout)
+        end = _monotonic() + timeout
 
-            if len(tosend) != len(reply):
-                _log.error("Reply truncated %d %d", len(tosend), len(reply))
-                continue
+        while True:
+            msg[0] = random.randint(0, 0xffffffff)
+            msg[1] = msg[0] ^ 0xffffffff
+            key = self._mux.register(self.dest, msg[:2].tobytes())
+            if key is not None:
+                break  # otherwise, nonce in use.  try again
+
+        try:
+            tosend = msg.tobytes()
+            _spam.debug("%s Send (%d) %s", self.dest, len(tosend),
+                        repr(tosend))
+            self.sock.sendto(tosend, self.dest)
+            if self._capture is not None:
+                self._capture.record(self._local, self.dest, tosend)
+            C = self._stats.counters
+            C['packets_sent'] += 1
+            C['bytes_sent'] += len(tosend)
 
+            while True:
+                try:
+                    reply = self._mux.wait(key, end - _monotonic())
+                except socket.timeout:
+                    C['timeouts'] += 1
+                    if self._capture is not None:
+                        self._capture.error()
+                    if timeout < self.timeout:
+                        raise DeadlineError('Deadline exceeded')
+                    raise
+                reply = self._check_reply(msg, reply, self.dest)
+                if reply is not None:
+                    return reply
+        finally:
+            self._mux.unregister(key)
+
+    def _check_reply(self, msg, reply, src):
+        """:returns: Reply as numpy.ndarray, or None if reply should be
+        ignored.
+        """
+        _spam.debug("%s Recv (%d) %s", src, len(reply), repr(reply))
+        if self._capture is not None:
+            self._capture.record(src, self._local, reply)
+        C = self._stats.counters
+        C['packets_received'] += 1
+        C['bytes_received'] += len(reply)
+
+        if len(reply) % 8:
+            reply = reply[:-(len(reply) % 8)]
+
+        err = None
+        if 4 * len(msg) != len(reply):
+            _log.error("Reply truncated %d %d", 4 * len(msg), len(reply))
+            err = 'replies_truncated'
+        else:
             reply = numpy.frombuffer(reply, be32)
             if (msg[:2] != reply[:2]).any():
                 _log.error('Ignore reply w/o matching nonce %s %s',
                            msg[:2], reply[:2])
-                continue
+                err = 'replies_nonce_mismatch'
             elif (msg[2::2] != reply[2::2]).any():
                 _log.error('reply addresses are out of order')
-                continue
+                err = 'replies_out_of_order'
 
-            break
+        if err is not None:
+            C[err] += 1
+            if self._capture is not None:
+                self._capture.error()
+            return None
 
-        ret = reply[3::2]
-        if pad:
-            ret = ret[:-pad]
-        return ret
+        return reply
 
     def exchange(self, addrs, values=None):
         """Accepts a list of address and values (None to read).
@@ -493,93 +680,78 @@ class LEEPDevice(DeviceBase):
         """
         addrs = list(addrs)
 
+        ret = numpy.zeros(len(addrs), be32)
+        done = 0
+        try:
+            for i, P in self._iexchange(addrs, values):
+                ret[i:i + len(P)] = P
+                done = i + len(P)
+        except DeadlineError as e:
+            e.done, e.total = done, len(addrs)
+            raise
+
+        return ret
+
+    def _iexchange(self, addrs, values=None):
+        """Generator of (offset, numpy.ndarray) for each message
+        exchanged, as each reply arrives.
+        """
+        addrs = list(addrs)
+
         if values is None:
             values = [None] * len(addrs)
         else:
             values = list(values)
 
-        ret = numpy.zeros(len(addrs), be32)
         for i in range(0, len(addrs), 127):
             A, B = addrs[i:i + 127], values[i:i + 127]
 
-            P = self._exchange(A, B)
-            ret[i:i + 127] = P
-
-        return ret
+            yield i, self._exchange(A, B)
 
     def _trysize(self, start_addr):
-        end_addr = start_addr + self.preamble_max_size
-        values = self.exchange(range(start_addr, end_addr))
-        values_preamble = numpy.array(values)
-        self._checkrom(values, True)
-        if self.size_rom != 0:
-            total_rom_size = (self.hash_descriptor_size
-                              + self.size_desc + self.size_rom)
-            stop_addr = end_addr + total_rom_size - self.preamble_max_size
-            values_json = self.exchange(range(end_addr, stop_addr))
-            preamble_json = numpy.concatenate((values_preamble, values_json))
-            values_full = numpy.array(preamble_json, be32)
-            self._checkrom(values_full)
-            return values_full
-        else:
-            raise RomError("ROM not found, size is zero")
+        """Read ROM beginning at start_addr.
 
-    def _checkrom(self, values, preamble_check=False):
-        rom_bad_value = 0xdeadf00d
-        if values[0] == rom_bad_value:
+        The preamble is read first to locate the JSON blob.
+        The remainder is then passed to the parser as each reply arrives.
+        """
+        end_addr = start_addr + self.preamble_max_size
+        values_preamble = self.exchange(range(start_addr, end_addr))
+        if values_preamble[0] == _RomParser.rom_bad_value:
             raise RomError("ROM not found, bad value")
-        values = numpy.frombuffer(values, be16)
-        _log.debug("ROM[0] %08d", values[0])
-        values = values[1::2]  # discard upper bytes
-        desc_ix = 1
-        desc_addr = 0
-
-        while len(values):
-            type = values[0] >> 14
-            size = values[0] & 0x3fff
-            pp = desc_ix, desc_addr, type, size
-            _log.debug("ROM Descriptor #%d addr=%d type=%d size=%d" % pp)
-            desc_ix += 1
-            desc_addr += (size + 1)
-
-            if type == 0:
-                break
-
-            blob, values = values[1:size + 1], values[size + 1:]
-            if len(blob) != size and preamble_check is False:
-                _log.error("Truncated: %d", len(blob))
-                raise RomError("Truncated ROM Descriptor")
 
-            if type == 1:
-                blob = blob.tobytes()
-                self.size_desc = size
-                if self.descript is None:
-                    self.descript = blob
-                else:
-                    _log.debug("Extra ROM Text '%s'", blob)
-
-            elif type == 2:
-                blob = ''.join(["%04x" % b for b in blob])
-                if self.jsonhash is None:
-                    self.jsonhash = blob
-                elif self.codehash is None:
-                    self.codehash = blob
-                else:
-                    _log.debug("Extra ROM Hash %s", blob)
+        parser = _RomParser()
+        parser.feed(values_preamble)
+        if parser.json_end is None:
+            raise RomError("ROM not found, size is zero")
 
-            elif type == 3 and preamble_check is False:
-                if self.regmap is not None:
-                    _log.error("Ignoring additional JSON blob in ROM")
-                else:
-                    _log.debug("Found JSON blob in ROM")
-                    self.regmap = json.loads(zlib.decompress(
-                        blob.tobytes()).decode('ascii'))
+        self.size_desc = parser.size_desc
+        self.size_rom = parser.size_rom
+
+        # Devices with identical firmware share a RegMap.
+        # When the JSON hash is found in the preamble, and already known,
+        # then the JSON blob need not be read at all.
+        key = None
+        if parser.jsonhash is not None:
+            key = ('leep', parser.jsonhash)
+        regmap = get_shared(key)
+
+        parts = [values_preamble]
+        if regmap is None:
+            stop_addr = start_addr + parser.json_end
+            for _i, P in self._iexchange(range(end_addr, stop_addr)):
+                parser.feed(P)
+                parts.append(P)
+
+            regmap = shared(key, parser.regmap)
+        else:
+            _log.debug("Reuse JSON w/ hash %s", parser.jsonhash)
 
-            elif type == 3:
-                self.size_rom = size
+        self.descript = parser.descript
+        self.jsonhash = parser.jsonhash
+        self.codehash = parser.codehash
+        self.regmap = regmap
 
-        if self.regmap is None and preamble_check is False:
-            raise RomError('ROM contains no JSON')
+        return numpy.concatenate(parts)
 
     def _readrom(self):
         self.descript = None
@@ -602,3 +774,113 @@ class LEEPDevice(DeviceBase):
                 msg = "Could not read ROM using either start addresses"
                 raise ValueError(msg)
         _log.debug("ROM was successfully read")
+
+
+class _RomParser(object):
+    """Incremental parser of Configuration ROM contents.
+
+    ROM words may be fed in arbitrary pieces, as they arrive.
+    The (first) JSON blob is passed through a zlib decompressor
+    as it arrives instead of being accumulated.
+    """
+    rom_bad_value = 0xdeadf00d
+
+    def __init__(self):
+        self.descript = None
+        self.jsonhash = None
+        self.codehash = None
+        self.size_desc = 0
+        self.size_rom = 0
+        # offset, in words, of the end of the first JSON blob once known
+        self.json_end = None
+        self.done = False
+
+        self._nwords = 0  # words consumed so far
+        self._ndesc = 0
+        self._type = None  # type of current descriptor
+        self._remain = 0  # words remaining in current descriptor
+        self._blob = []
+        self._Z = None
+        self._text = None
+
+    def feed(self, values):
+        # only the lower half of each word is used
+        values = numpy.asarray(values, be32).astype(be16)
+        pos, N = 0, len(values)
+
+        while pos < N and not self.done:
+            if self._type is None:
+                D = int(values[pos])
+                pos += 1
+                type, size = D >> 14, D & 0x3fff
+                self._ndesc += 1
+                pp = self._ndesc, self._nwords + pos - 1, type, size
+                _log.debug("ROM Descriptor #%d addr=%d type=%d size=%d" % pp)
+
+                if type == 0:
+                    self.done = True
+                    break
+
+                self._type, self._remain = type, size
+                if type == 1:
+                    self.size_desc = size
+                elif type == 3 and self.json_end is None:
+                    _log.debug("Found JSON blob in ROM")
+                    self.size_rom = size
+                    self.json_end = self._nwords + pos + size
+                    self._Z = zlib.decompressobj()
+                    self._text = []
+                elif type == 3:
+                    _log.error("Ignoring additional JSON blob in ROM")
+
+            else:
+                blob = values[pos:pos + self._remain]
+                pos += len(blob)
+                self._remain -= len(blob)
+
+                if self._type == 3:
+                    if self._Z is not None:
+                        self._text.append(self._Z.decompress(blob.tobytes()))
+                else:
+                    self._blob.append(blob)
+
+            if self._type is not None and self._remain == 0:
+                self._complete()
+
+        self._nwords += pos
+
+    def _complete(self):
+        type, self._type = self._type, None
+        blob, self._blob = numpy.concatenate(self._blob or [[]]), []
+        blob = blob.astype(be16)
+
+        if type == 1:
+            blob = blob.tobytes()
+            if self.descript is None:
+                self.descript = blob
+            else:
+                _log.debug("Extra ROM Text '%s'", blob)
+
+        elif type == 2:
+            blob = ''.join(["%04x" % b for b in blob])
+            if self.jsonhash is None:
+                self.jsonhash = blob
+            elif self.codehash is None:
+                self.codehash = blob
+            else:
+                _log.debug("Extra ROM Hash %s", blob)
+
+        elif type == 3 and self._Z is not None:
+            self._text.append(self._Z.flush())
+            self._text = b''.join(self._text)
+            self._Z = None
+
+    def regmap(self):
+        """:returns: A :py:class:`regmap.RegMap` decoded from the JSON blob
+        """
+        if self._Z is not None:
+            _log.error("Truncated: %d", self._remain)
+            raise RomError("Truncated ROM Descriptor")
+        elif self._text is None:
+            raise RomError('ROM contains no JSON')
+        return RegMap(json.loads(self._text.decode('ascii')))
@@ -0,0 +1,267 @@
+"""Compact, immutable register map representation.
+
+The JSON blob read from a device describes each register with a small
+Object.  Decoded naively, this becomes a dict of dicts, with most of the
+memory spent on per-register dict overhead.  Here each register is
+instead stored as a RegInfo record with fixed slots, while still
+behaving as a read-only mapping so that existing code using
+``info['base_addr']`` or ``info.get('addr_width', 0)`` is unaffected.
+"""
+
+import re
+import sys
+import threading
+import weakref
+
+import numpy
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # py2
+    from collections import Mapping
+
+if sys.version_info >= (3, 0):
+    from sys import intern
+    unicode = str
+
+
+_missing = object()
+
+
+class RegInfo(Mapping):
+    """Read-only mapping describing a single register.
+
+    Common keys are stored in slots.  Any others, including all of
+    the "__metadata__" entries, are kept in a secondary dict.
+    """
+    fields = ('access', 'addr_width', 'base_addr', 'data_width', 'sign',
+              'description')
+    __slots__ = fields + ('_extra',)
+
+    def __init__(self, info):
+        extra = None
+        for key in self.fields:
+            value = info.get(key, _missing)
+            if isinstance(value, unicode) and key in ('access', 'sign'):
+                # few distinct values, shared by all registers
+                value = intern(str(value))
+            object.__setattr__(self, key, value)
+        for key, value in info.items():
+            if key not in self.fields:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        object.__setattr__(self, '_extra', extra)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RegInfo is immutable')
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            value = getattr(self, key)
+            if value is not _missing:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.fields:
+            if getattr(self, key) is not _missing:
+                yield key
+        if self._extra is not None:
+            for key in self._extra:
+                yield key
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return 'RegInfo(%r)' % dict(self)
+
+    def __reduce__(self):
+        return (RegInfo, (dict(self),))
+
+
+class RegMap(Mapping):
+    """Read-only mapping from register name to :py:class:`RegInfo`
+    """
+    __slots__ = ('_regs', '_search', '_index', '__weakref__')
+
+    def __init__(self, regmap):
+        regs = {}
+        for name, info in regmap.items():
+            if not isinstance(info, RegInfo):
+                info = RegInfo(info)
+            regs[name] = info
+        object.__setattr__(self, '_regs', regs)
+        # cache of search() results
+        object.__setattr__(self, '_search', {})
+        # see addr_index()
+        object.__setattr__(self, '_index', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RegMap is immutable')
+
+    def __getitem__(self, name):
+        return self._regs[name]
+
+    def __contains__(self, name):
+        return name in self._regs
+
+    def __iter__(self):
+        return iter(self._regs)
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __repr__(self):
+        return 'RegMap(<%d registers>)' % len(self._regs)
+
+    def __reduce__(self):
+        return (RegMap, (self.to_dict(),))
+
+    def to_dict(self):
+        """:returns: A (mutable) dict of dicts equivalent to the decoded JSON
+        """
+        return dict([(name, dict(info)) for name, info in self._regs.items()])
+
+
+def search(regmap, fragments):
+    """Find register names matching a list of name fragments.
+
+    Consecutive fragments must be separated by either a single '_',
+    or by two '_' with anything in between.  eg. ['A', 'B'] matches
+    'A_B', 'A_blah_B', or 'A_x_y_z_B'.
+
+    Results are cached when regmap is a :py:class:`RegMap`,
+    and so are shared by all devices sharing that RegMap.
+
+    :returns: A tuple of the regexp pattern and a tuple of matching names.
+    """
+    fragments = tuple([str(i) for i in fragments])
+    cache = getattr(regmap, '_search', None)
+    if cache is not None:
+        try:
+            return cache[fragments]
+        except KeyError:
+            pass
+
+    regx = r'_(?:.*_)?'.join([re.escape(i) for i in fragments])
+    R = re.compile('^.*%s$' % regx)
+
+    ret = R.pattern, tuple([x for x in regmap if R.match(x)])
+    if cache is not None:
+        cache[fragments] = ret
+    return ret
+
+
+class AddrIndex(object):
+    """Maps addresses back to register names.
+
+    Registers are sorted by base address, and the address range of each
+    is found by binary search.  Where register address ranges overlap,
+    the register with the greatest base address not above an address
+    is used.
+    """
+
+    def __init__(self, regmap):
+        regs = []
+        for name, info in regmap.items():
+            base = info.get('base_addr')
+            if base is None or name == '__metadata__':
+                continue
+            if isinstance(base, (bytes, str, unicode)):
+                base = int(base, 0)
+            regs.append((base, 1 << info.get('addr_width', 0), name))
+        regs.sort()
+
+        self.starts = numpy.asarray([R[0] for R in regs], dtype='i8')
+        self.ends = self.starts + [R[1] for R in regs]
+        self.names = numpy.asarray([R[2] for R in regs], dtype=object)
+
+    def lookup(self, addr):
+        """:returns: A tuple of register name and offset,
+        or None if no register includes addr.
+        """
+        i = int(numpy.searchsorted(self.starts, addr, side='right')) - 1
+        if i < 0 or addr >= self.ends[i]:
+            return None
+        return self.names[i], int(addr - self.starts[i])
+
+    def lookup_many(self, addrs):
+        """Vectorized form of :py:meth:`lookup`.
+
+        :returns: A tuple of an array of register names (None if not found),
+                  and an array of offsets (-1 if not found).
+        """
+        addrs = numpy.asarray(addrs, dtype='i8')
+        idx = numpy.searchsorted(self.starts, addrs, side='right') - 1
+        found = idx >= 0
+        idx[~found] = 0
+        if len(self.starts):
+            found &= addrs < self.ends[idx]
+        else:
+            found[:] = False
+
+        names = numpy.empty(addrs.shape, dtype=object)
+        offsets = numpy.full(addrs.shape, -1, dtype='i8')
+        names[found] = self.names[idx[found]]
+        offsets[found] = addrs[found] - self.starts[idx[found]]
+        return names, offsets
+
+
+def addr_index(regmap):
+    """:returns: An :py:class:`AddrIndex` for regmap.
+
+    The index is built once, and shared by all devices sharing
+    a :py:class:`RegMap`.
+    """
+    index = getattr(regmap, '_index', None)
+    if index is None:
+        index = AddrIndex(regmap)
+        if isinstance(regmap, RegMap):
+            object.__setattr__(regmap, '_index', index)
+    return index
+
+
+# Process wide registry of RegMaps which may be shared between devices.
+# Entries are removed when no longer referenced by any device.
+_shared = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+
+def get_shared(key):
+    """:returns: The RegMap registered under key, or None
+    """
+    if key is None:
+        return None
+    with _shared_lock:
+        return _shared.get(key)
+
+
+def shared(key, build):
+    """Return the RegMap registered under key.
+    If none is registered, then one is created by calling build(),
+    and registered.
+
+    Keys identify the JSON content.  eg. the ROM JSON hash.
+
+    :param key: A hashable, or None to skip the registry.
+    :param callable build: Returns a :py:class:`RegMap`
+    """
+    regmap = get_shared(key)
+    if regmap is None:
+        regmap = build()
+        if key is not None:
+            with _shared_lock:
+                regmap = _shared.setdefault(key, regmap)
+    return regmap
+
+
+def to_jsonable(obj):
+    """For use as json.dump(..., default=to_jsonable)
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError('%r is not JSON serializable' % (obj,))
@@ -0,0 +1,239 @@
+"""Publish acquired waveforms to local processes through shared memory.
+
+One process acquires, and publishes each frame into a ring buffer
+in shared memory.  Any number of other processes attach to the ring,
+and read frames as numpy.ndarray views, without copying.
+So the device is read once regardless of the number of readers.
+
+Producer:
+
+>>> dev = leep.open('leep://192.168.42.1')
+>>> ring = WaveRing.create('llrf1', nframes=16, nchans=2, nsamp=2048)
+>>> produce(dev, ring, chans=[0, 1])
+
+Consumer:
+
+>>> ring = WaveRing.attach('llrf1')
+>>> seq = 0
+>>> while True:
+...     seq, stamp, data = ring.wait(seq)
+...     # data is valid until ring.valid(seq) is False
+
+Requires python >= 3.8 for multiprocessing.shared_memory.
+"""
+
+import logging
+
+import struct
+import time
+
+import numpy
+
+_log = logging.getLogger(__name__)
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # py < 3.8
+    shared_memory = None
+
+__all__ = (
+    'WaveRing',
+    'produce',
+)
+
+# magic, nframes, nchans, nsamp, dtype, padding, last published sequence
+# number.  The sequence number is 8 byte aligned so that stores are atomic.
+_header = struct.Struct('<8sIII8s4xQ')
+_magic = b'LEEPRNG2'
+_align = 64
+# per frame sequence number and time.time() stamp
+_frame_meta = struct.Struct('<Qd')
+
+
+def _check():
+    if shared_memory is None:
+        raise RuntimeError('WaveRing requires multiprocessing.shared_memory')
+
+
+def _aligned(N):
+    return (N + _align - 1) // _align * _align
+
+
+def _fill(out, D):
+    # copy D into out, clearing any remainder
+    N = min(len(D), len(out))
+    out[:N] = D[:N]
+    out[N:] = numpy.nan if out.dtype.kind in 'fc' else 0
+
+
+class WaveRing(object):
+    """A ring of frames of shape (nchans, nsamp) in shared memory,
+    with a common time base.
+
+    Each frame has a sequence number, starting with 1, and a timestamp.
+    Frame sequence numbers are cleared while a frame is being written.
+    Use :py:meth:`create` or :py:meth:`attach`.
+    """
+
+    def __init__(self, shm, owner):
+        _check()
+        self.shm, self.owner = shm, owner
+        magic, self.nframes, self.nchans, self.nsamp, dtype, _seq = \
+            _header.unpack_from(shm.buf, 0)
+        if magic != _magic:
+            raise RuntimeError('%s is not a WaveRing' % shm.name)
+        self.dtype = numpy.dtype(dtype.rstrip(b'\0').decode())
+
+        shape = (self.nchans, self.nsamp)
+        fsize = _aligned(self.dtype.itemsize * self.nchans * self.nsamp)
+        tboff = _aligned(_header.size)
+        self.timebase = numpy.ndarray(shape, dtype='f8', buffer=shm.buf,
+                                      offset=tboff)
+        metaoff = tboff + _aligned(8 * self.nchans * self.nsamp)
+        dataoff = metaoff + _aligned(_frame_meta.size * self.nframes)
+        self.frames = [numpy.ndarray(shape, dtype=self.dtype, buffer=shm.buf,
+                                     offset=dataoff + i * fsize)
+                       for i in range(self.nframes)]
+        # sequence numbers of the last frame published, and of each frame
+        self._seq = numpy.ndarray((), dtype='<u8', buffer=shm.buf,
+                                  offset=_header.size - 8)
+        meta = numpy.ndarray((self.nframes,), buffer=shm.buf,
+                             offset=metaoff,
+                             dtype=[('seq', '<u8'), ('stamp', '<f8')])
+        self._fseq, self._fstamp = meta['seq'], meta['stamp']
+
+    @classmethod
+    def create(cls, name, nframes, nchans, nsamp, dtype='f8'):
+        """Create, as producer, a new ring.
+
+        :param str name: Shared memory name.  None for a random name.
+        """
+        _check()
+        dtype = numpy.dtype(dtype)
+        size = (_aligned(_header.size) + _aligned(8 * nchans * nsamp) +
+                _aligned(_frame_meta.size * nframes) +
+                nframes * _aligned(dtype.itemsize * nchans * nsamp))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _header.pack_into(shm.buf, 0, _magic, nframes, nchans, nsamp,
+                          dtype.str.encode(), 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach, as consumer, to an existing ring
+        """
+        _check()
+        try:
+            # only the producer should unlink
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # py < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        """Sequence number of the last frame published.  0 if none.
+        """
+        return int(self._seq)
+
+    def close(self):
+        """Detach.  The producer also removes the ring.
+        """
+        # views must be released before the mapping is closed
+        self.frames = self.timebase = None
+        self._seq = self._fseq = self._fstamp = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, A, B, C):
+        self.close()
+
+    def publish(self, data, stamp=None):
+        """Write the next frame.  Extra samples are discarded.
+        Missing samples, eg. from a channel one sample shorter than the
+        others, are filled with NaN, or 0 for integer types.
+
+        :param data: A list of arrays, one for each channel.
+        :param float stamp: Default is time.time()
+        :returns: The sequence number of this frame.
+        """
+        seq = self.seq + 1
+        i = seq % self.nframes
+        self._fseq[i] = 0  # mark as being written
+        F = self.frames[i]
+        for ch, D in enumerate(data):
+            _fill(F[ch], D)
+        self._fstamp[i] = time.time() if stamp is None else stamp
+        self._fseq[i] = seq
+        self._seq[()] = seq
+        return seq
+
+    def valid(self, seq):
+        """:returns: True if the frame with this sequence number has not
+        been overwritten.
+        """
+        return int(self._fseq[seq % self.nframes]) == seq
+
+    def get(self, seq):
+        """:returns: A tuple of timestamp and frame view,
+        or None if the frame is not available.
+        """
+        i = seq % self.nframes
+        stamp = float(self._fstamp[i])
+        if int(self._fseq[i]) != seq:
+            return None
+        return stamp, self.frames[i]
+
+    def latest(self):
+        """:returns: A tuple of sequence number, timestamp, and frame view,
+        or None if nothing has been published.
+        """
+        while True:
+            seq = self.seq
+            if seq == 0:
+                return None
+            F = self.get(seq)
+            if F is not None:
+                return (seq,) + F
+
+    def wait(self, after=0, timeout=None, poll=0.001):
+        """Wait for a frame newer than after.
+
+        :returns: As :py:meth:`latest`, or None on timeout.
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while self.seq <= after:
+            if timeout is not None and time.time() >= deadline:
+                return None
+            time.sleep(poll)
+        return self.latest()
+
+
+def produce(dev, ring, chans, count=None, tag=False, instance=[]):
+    """Acquire and publish frames.
+
+    :param dev: A :py:class:`base.DeviceBase`
+    :param ring: A :py:class:`WaveRing` from :py:meth:`WaveRing.create`
+    :param list chans: Channel numbers, as for get_channels()
+    :param int count: Number of frames to publish.  None to continue forever.
+    :param bool tag: As for wait_for_acq()
+    """
+    for ch, T in enumerate(dev.get_timebase(chans, instance=instance)):
+        _fill(ring.timebase[ch], T)
+
+    N = 0
+    while count is None or N < count:
+        dev.wait_for_acq(tag=tag, instance=instance)
+        data = dev.get_channels(chans, instance=instance)
+        seq = ring.publish(data)
+        _log.debug('Published %d', seq)
+        N += 1
@@ -0,0 +1,137 @@
+"""Parameter scans with tagged waveform acquisition.
+
+Each scan point is a list of register writes.  For each point,
+the writes, the tag increment, and the re-arm of the circular buffer
+are sent together, and a waveform acquired which reflects them.
+
+>>> points = [[('some_setpoint', V)] for V in range(10)]
+>>> data = scan(dev, points, chans=[0, 1])
+>>> data.shape
+(10, 2, 2048)
+
+The steps for consecutive points are overlapped.  The next point is
+armed as soon as the waveform for the previous point has been read,
+and the previous waveform is then processed while the next is acquired.
+"""
+
+import logging
+
+import numpy
+
+from .raw import yscale_rfs
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'scan',
+)
+
+# registers which change the layout or scaling of acquired waveforms
+_layout_registers = ('chan_keep', 'wave_samp_per', 'wave_shift')
+
+
+def scan(dev, points, chans, out=None, callback=None, timeout=5.0,
+         instance=[]):
+    """Acquire one waveform for each of a list of register settings.
+
+    :param dev: A leep:// :py:class:`base.DeviceBase` for an RF station
+                (uses dsp_tag and slow_data[33:35]).
+    :param list points: For each point, a list of (name, value) tuples
+                        as for reg_write().  May be empty.
+    :param list chans: Channel numbers, as for get_channels()
+    :param numpy.ndarray out: An array of shape (points, channels, samples)
+                              to be filled in.  Allocated if None.
+    :param callable callback: Called as callback(i, out[i]) as each point
+                              is completed.
+    :param float timeout: Maximum time, in seconds, to wait for each point.
+    :returns: out
+    """
+    if not getattr(dev, 'rfs', False):
+        raise RuntimeError('scan() requires tagged acquisition')
+
+    for point in points:
+        for name, _value in point:
+            # may include an index or slice, as for reg_write()
+            reg = dev._resolve_reg(name, instance=instance)[0]
+            if reg.endswith(_layout_registers):
+                raise RuntimeError('scan() may not change %s' % reg)
+
+    S = _Scan(dev, chans, instance)
+    if out is None:
+        out = numpy.zeros((len(points), len(chans), S.nsamp), dtype='f8')
+    assert out.shape == (len(points), len(chans), S.nsamp), out.shape
+
+    return S.run(points, out, callback, timeout)
+
+
+class _Scan(object):
+    def __init__(self, dev, chans, instance):
+        self.dev = dev
+        self.instance = instance
+
+        self.acq = dev._acq_setup(instance)
+
+        nch = dev.get_reg_info('chan_keep', instance=instance)['data_width']
+        keep, dec = dev.reg_read(['chan_keep', 'wave_samp_per'],
+                                 instance=instance)
+        _wave_shift, self.Ymax = yscale_rfs(dec)
+
+        # position of each kept channel in the interleaved data
+        kept = [ch for ch in range(nch) if keep & 2**(nch - 1 - ch)]
+        for ch in chans:
+            if ch not in kept:
+                msg = 'Requested channel %d not kept (%x)' % (ch, keep)
+                raise RuntimeError(msg)
+        self.cols = [kept.index(ch) for ch in chans]
+        self.nbits = len(kept)
+
+        info = dev.get_reg_info('circle_data', instance=instance)
+        self.nsamp = 2**info['addr_width'] // self.nbits
+
+    def run(self, points, out, callback, timeout):
+        dev, instance = self.dev, self.instance
+
+        T, = dev.reg_read(['dsp_tag'], instance=instance)
+        T = int(T)
+        prev = None  # (index, raw data) of the previous point
+        for i, point in enumerate(points):
+            T = (T + 1) & 0xff
+            # arm this point in a single exchange
+            with dev.transaction() as tx:
+                tx.write(point, instance=instance)
+                tx.write([('dsp_tag', T)], instance=instance)
+                dev._acq_arm(self.acq, tx=tx)
+
+            # meanwhile, process the previous point
+            if prev is not None:
+                self._finish(out, callback, *prev)
+
+            prev = i, self._acquire(T, timeout)
+
+        if prev is not None:
+            self._finish(out, callback, *prev)
+        return out
+
+    def _acquire(self, T, timeout):
+        # wait for an acquisition with tag T, then read it
+        with self.dev.deadline(timeout):
+            return self._poll(T)
+
+    def _poll(self, T):
+        dev, instance = self.dev, self.instance
+        while True:
+            slow = dev._acq_poll(self.acq, instance)
+            if dev._acq_check_tag(T, slow):
+                break
+            dev._acq_arm(self.acq)
+
+        data, = dev.reg_read(['circle_data'], instance=instance)
+        return data
+
+    def _finish(self, out, callback, i, data):
+        # demux interleaved channels, and scale
+        N = self.nsamp * self.nbits
+        data = data[:N].reshape(self.nsamp, self.nbits)
+        numpy.divide(data[:, self.cols].T, self.Ymax, out=out[i])
+        if callback is not None:
+            callback(i, out[i])
@@ -0,0 +1,192 @@
+"""Windowed FFTs, and averaged power spectra, of captured waveforms.
+
+Transforms a whole batch of captures, of shape (captures, channels,
+samples), in one call.  :py:class:`Welch` keeps a running average of
+power spectral density as captures arrive, so memory use does not grow
+with the length of an acquisition.
+
+>>> T, = dev.get_timebase([0])
+>>> W = Welch(nsamp=len(T), period=T[1] - T[0], nperseg=1024)
+>>> while True:
+...     dev.wait_for_acq()
+...     W.update(dev.get_channels([0, 1]))
+...     plot(W.freq, W.psd[0])
+"""
+
+import logging
+
+import numpy
+from numpy.lib.stride_tricks import as_strided
+
+_log = logging.getLogger(__name__)
+
+__all__ = (
+    'get_window',
+    'rfft',
+    'Welch',
+)
+
+# periodic windows, as coefficients of cos(2*pi*k*n/N)
+_windows = {
+    'rect': (1.0,),
+    'hann': (0.5, 0.5),
+    'hamming': (0.54, 0.46),
+    'blackman': (0.42, 0.5, 0.08),
+}
+
+_window_cache = {}
+
+
+def get_window(name, N):
+    """:returns: A periodic window of length N as a numpy.ndarray.
+    Results are cached.
+
+    :param name: One of 'rect', 'hann', 'hamming', or 'blackman'.
+                 Or an array of length N, which is returned unchanged.
+    """
+    if not isinstance(name, str):
+        W = numpy.asarray(name, dtype='f8')
+        if W.shape != (N,):
+            raise RuntimeError('window must have shape (%d,) not %s'
+                               % (N, W.shape))
+        return W
+
+    key = (name, N)
+    W = _window_cache.get(key)
+    if W is None:
+        try:
+            coeffs = _windows[name]
+        except KeyError:
+            raise RuntimeError('Unknown window %r' % name)
+        phase = 2 * numpy.pi * numpy.arange(N) / N
+        W = numpy.zeros(N)
+        for k, C in enumerate(coeffs):
+            W += (-1)**k * C * numpy.cos(k * phase)
+        W.flags.writeable = False
+        _window_cache[key] = W
+    return W
+
+
+def rfft(data, period, window='hann'):
+    """Windowed FFT along the last axis of real samples.
+
+    With window='rect' this gives the same result as the IOC FFT,
+    which is normalized by the number of samples.  Other windows are
+    normalized by the sum of the window, so a sinusoid of amplitude A
+    gives a peak of A/2.
+
+    :param data: Samples.  eg. of shape (captures, channels, samples)
+    :param float period: Sample period in seconds.
+    :returns: A tuple of frequencies in Hz, and complex spectra.
+    """
+    data = numpy.asarray(data)
+    N = data.shape[-1]
+    W = get_window(window, N)
+    X = numpy.fft.rfft(data * W, axis=-1)
+    X /= W.sum()
+    return numpy.fft.rfftfreq(N, period), X
+
+
+class Welch(object):
+    """Running average of power spectral density (PSD) by Welch's method.
+
+    Each channel of each capture is split into overlapping segments,
+    which are windowed and transformed together.  The PSD of all
+    segments is averaged.
+
+    :param int nsamp: Samples per channel in each capture.
+                      Extra samples are discarded.
+    :param float period: Sample period in seconds.  eg. from
+                         get_timebase()
+    :param int nperseg: Samples per segment.  Default is nsamp.
+    :param float overlap: Fraction of each segment shared with the next.
+    :param window: As for :py:func:`get_window`
+
+    The one sided PSD is in units of input squared per Hz.
+    """
+
+    def __init__(self, nsamp, period, nperseg=None, overlap=0.5,
+                 window='hann'):
+        self.nperseg = nperseg or nsamp
+        if not 0 < self.nperseg <= nsamp:
+            raise RuntimeError('nperseg %s not in (0, %d]'
+                               % (nperseg, nsamp))
+        self.step = max(1, int(self.nperseg * (1.0 - overlap)))
+        self.nseg = 1 + (nsamp - self.nperseg) // self.step
+        self.nsamp = nsamp
+        self.period = period
+
+        self.window = get_window(window, self.nperseg)
+        self.freq = numpy.fft.rfftfreq(self.nperseg, period)
+
+        # |X|^2 -> one sided PSD
+        self._scale = numpy.full(len(self.freq),
+                                 2.0 * period / (self.window**2).sum())
+        self._scale[0] /= 2  # DC
+        if self.nperseg % 2 == 0:
+            self._scale[-1] /= 2  # Nyquist
+
+        self.reset()
+
+    def reset(self):
+        """Discard the average.
+        """
+        self.count = 0  # number of segments averaged
+        self.psd = None
+
+    @property
+    def asd(self):
+        """Amplitude spectral density.  sqrt(psd)
+        """
+        return None if self.psd is None else numpy.sqrt(self.psd)
+
+    def segments(self, data):
+        """:returns: A view of data of shape (..., nseg, nperseg)
+        """
+        data = numpy.asarray(data, dtype='f8')[..., :self.nsamp]
+        if data.shape[-1] != self.nsamp:
+            raise RuntimeError('Expected %d samples, not %d'
+                               % (self.nsamp, data.shape[-1]))
+        S = data.strides[-1]
+        return as_strided(data,
+                          shape=data.shape[:-1] + (self.nseg, self.nperseg),
+                          strides=data.strides[:-1] + (self.step * S, S),
+                          writeable=False)
+
+    def periodogram(self, data):
+        """:returns: The PSD of each segment, of shape
+        (..., nseg, len(freq))
+        """
+        X = numpy.fft.rfft(self.segments(data) * self.window, axis=-1)
+        P = numpy.square(X.real)
+        P += numpy.square(X.imag)
+        P *= self._scale
+        return P
+
+    def update(self, data):
+        """Add captures to the average.
+
+        :param data: Samples of shape (channels, samples), or
+                     (captures, channels, samples)
+        :returns: The average PSD, of shape (channels, len(freq))
+        """
+        if isinstance(data, list):
+            # eg. from get_channels(), where lengths may differ by one
+            data = [numpy.asarray(D)[..., :self.nsamp] for D in data]
+        data = numpy.asarray(data)
+        if data.ndim == 2:
+            data = data[None]
+        elif data.ndim != 3:
+            raise RuntimeError('Expected (captures, channels, samples), not %s'
+                               % (data.shape,))
+        P = self.periodogram(data)
+        N = P.shape[0] * P.shape[2]
+        total = P.sum(axis=(0, 2))
+
+        if self.psd is None:
+            self.psd = total / N
+        else:
+            # running mean
+            self.psd += (total - N * self.psd) / (self.count + N)
+        self.count += N
+        return self.psd
@@ -0,0 +1,248 @@
+"""Low overhead I/O statistics for devices.
+
+Each device keeps a :py:class:`Stats` instance with simple counters,
+and latency histograms for its public operations.
+These are available through :py:meth:`base.DeviceBase.stats`,
+or in the Prometheus text exposition format through
+:py:func:`exposition` and :py:func:`serve`.
+
+>>> dev = leep.open('leep://192.168.42.1')
+>>> dev.reg_read(['foo'])
+>>> dev.stats()['counters']['packets_sent']
+1
+"""
+
+import logging
+
+import collections
+import functools
+import threading
+import time
+import os
+from bisect import bisect_left
+
+_log = logging.getLogger(__name__)
+
+try:
+    _clock = time.perf_counter
+except AttributeError:  # py2
+    _clock = time.time
+
+# upper bounds, in seconds
+default_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# all counters, and their descriptions
+counters = collections.OrderedDict([
+    ('packets_sent', 'Request messages sent'),
+    ('packets_received', 'Reply messages received, including ignored'),
+    ('bytes_sent', 'Request bytes sent'),
+    ('bytes_received', 'Reply bytes received, including ignored'),
+    ('timeouts', 'Timeouts waiting for reply'),
+    ('replies_truncated', 'Replies ignored due to length mismatch'),
+    ('replies_nonce_mismatch', 'Replies ignored due to header mismatch'),
+    ('replies_out_of_order', 'Replies ignored due to address mismatch'),
+    ('ca_get', 'CA get operations'),
+    ('ca_put', 'CA put operations'),
+    ('acq_polls', 'Polls for acquisition ready'),
+    ('acq_retries', 'Acquisitions retried due to tag mismatch'),
+])
+
+
+class Histogram(object):
+    """Counts of observations by bucket, with sum and count.
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        # counts[i] is number of observations <= buckets[i], not cumulative.
+        # counts[-1] is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """:returns: A list of tuples of upper bound and cumulative count.
+        """
+        ret, total = [], 0
+        for le, N in zip(self.buckets + (float('inf'),), self.counts):
+            total += N
+            ret.append((le, total))
+        return ret
+
+
+class Stats(object):
+    """Statistics for a single device.
+
+    Every Nth timed operation, when N=sample_every is non-zero, is
+    recorded as a dict in the samples ring and logged to the
+    'leep.stats' logger at DEBUG level.
+    The default is taken from $LEEP_STATS_SAMPLE .
+    """
+
+    def __init__(self, sample_every=None, nsamples=128, **labels):
+        self.labels = labels
+        self.counters = dict.fromkeys(counters, 0)
+        self.latency = collections.defaultdict(Histogram)
+        if sample_every is None:
+            sample_every = int(os.getenv('LEEP_STATS_SAMPLE') or '0')
+        self.sample_every = sample_every
+        self.samples = collections.deque(maxlen=nsamples)
+        self._nops = 0
+
+    def reset(self):
+        for K in self.counters:
+            self.counters[K] = 0
+        self.latency.clear()
+        self.samples.clear()
+
+    def observe(self, op, seconds, args=()):
+        """Record the duration of one operation
+        """
+        self.latency[op].observe(seconds)
+
+        if self.sample_every:
+            self._nops += 1
+            if self._nops % self.sample_every == 0:
+                self._sample(op, seconds, args)
+
+    def _sample(self, op, seconds, args):
+        regs = None
+        if op in ('reg_read', 'reg_write') and args:
+            regs = [R if isinstance(R, str) else R[0] for R in args[0]]
+        S = {
+            'time': time.time(),
+            'op': op,
+            'duration': seconds,
+            'regs': regs,
+        }
+        self.samples.append(S)
+        _log.debug('%s %s %.6f %s', self.labels, op, seconds, regs)
+
+    def snapshot(self):
+        """:returns: A dict with copies of the current statistics
+        """
+        return {
+            'labels': dict(self.labels),
+            'counters': dict(self.counters),
+            'latency': dict([(op, {
+                'count': H.count,
+                'sum': H.sum,
+                'buckets': H.cumulative(),
+            }) for op, H in self.latency.items()]),
+            'samples': list(self.samples),
+        }
+
+    def exposition(self):
+        """:returns: A list of tuples of metric family name and
+        a line in the Prometheus text format.
+        """
+        def fmt(name, value, extra={}):
+            L = dict(self.labels)
+            L.update(extra)
+            L = ','.join(['%s="%s"' % (K, str(V).replace('"', '\\"'))
+                          for K, V in sorted(L.items())])
+            return 'leep_%s{%s} %s' % (name, L, value)
+
+        lines = []
+        for K in counters:
+            name = K + '_total'
+            lines.append(('leep_' + name, fmt(name, self.counters[K])))
+
+        for op, H in sorted(self.latency.items()):
+            for le, N in H.cumulative():
+                le = '+Inf' if le == float('inf') else repr(le)
+                lines.append(('leep_op_seconds',
+                              fmt('op_seconds_bucket', N,
+                                  {'op': op, 'le': le})))
+            lines.append(('leep_op_seconds',
+                          fmt('op_seconds_sum', repr(H.sum), {'op': op})))
+            lines.append(('leep_op_seconds',
+                          fmt('op_seconds_count', H.count, {'op': op})))
+
+        return lines
+
+
+def timed(op):
+    """Decorator to record latency of a device method
+    """
+    def decorate(fcn):
+        @functools.wraps(fcn)
+        def wrapper(self, *args, **kws):
+            T0 = _clock()
+            try:
+                return fcn(self, *args, **kws)
+            finally:
+                self._stats.observe(op, _clock() - T0, args)
+        return wrapper
+    return decorate
+
+
+def exposition(devices):
+    """Format statistics for a list of devices in the
+    Prometheus text exposition format.
+
+    :param list devices: A list of :py:class:`base.DeviceBase`
+    :returns: str
+    """
+    families = collections.OrderedDict()
+    for K, desc in counters.items():
+        families['leep_%s_total' % K] = [
+            '# HELP leep_%s_total %s' % (K, desc),
+            '# TYPE leep_%s_total counter' % K,
+        ]
+    families['leep_op_seconds'] = [
+        '# HELP leep_op_seconds Operation latency',
+        '# TYPE leep_op_seconds histogram',
+    ]
+
+    for dev in devices:
+        for family, line in dev._stats.exposition():
+            families[family].append(line)
+
+    lines = []
+    for L in families.values():
+        lines.extend(L)
+    return '\n'.join(lines) + '\n'
+
+
+def serve(devices, addr=('', 9100)):
+    """Start a daemon thread serving statistics over HTTP, in the
+    Prometheus text exposition format.
+
+    :param list devices: A list of :py:class:`base.DeviceBase`
+    :param tuple addr: The (interface, port) to bind.
+    :returns: The server object.  Call .shutdown() to stop.
+    """
+    try:
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+    except ImportError:  # py2
+        from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = exposition(devices).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            _log.debug(fmt, *args)
+
+    server = HTTPServer(addr, Handler)
+    T = threading.Thread(target=server.serve_forever, name='leep.stats')
+    T.daemon = True
+    T.start()
+    return server
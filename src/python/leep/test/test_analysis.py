@@ -0,0 +1,104 @@
+
+import unittest
+import math
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from ..analysis import phase_wrap, iq2ap, unwrap, stats
+
+
+def _phase_wrap(pha):
+    # as phase_wrap() in calc.c
+    out = math.fmod(pha, 360.0)
+    if out < -180.0:
+        out += 360.0
+    elif out >= 180.0:
+        out -= 360.0
+    return out
+
+
+def _unwrap(pha, thres):
+    # as unwrap() in calc.c
+    thres /= 2.0
+    out = [pha[0]]
+    for i in range(1, len(pha)):
+        delta = pha[i] - pha[i - 1]
+        if pha[i - 1] > 180.0 - thres and pha[i] < -180.0 + thres:
+            delta += 360.0
+        elif pha[i - 1] < -180.0 + thres and pha[i] > 180.0 - thres:
+            delta -= 360.0
+        out.append(out[-1] + delta)
+    return out
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_wrap(self):
+        pha = np.asarray([-720.0, -540.0, -181.0, -180.0, 0.0, 179.0,
+                          180.0, 359.0, 360.0, 725.0])
+        assert_equal(phase_wrap(pha), [_phase_wrap(P) for P in pha])
+        self.assertEqual(phase_wrap(np.float64(190.0)), -170.0)
+
+        phase_wrap(pha, out=pha)
+        self.assertTrue((pha >= -180.0).all() and (pha < 180.0).all())
+
+    def test_iq2ap(self):
+        rng = np.random.RandomState(42)
+        i, q = rng.uniform(-1, 1, size=(2, 5, 64))
+        amp, pha = iq2ap(i, q, zero_angle=100.0)
+        self.assertEqual(amp.shape, (5, 64))
+        for n in range(5):
+            for s in range(64):
+                self.assertAlmostEqual(amp[n, s], math.hypot(i[n, s], q[n, s]))
+                P = math.atan2(q[n, s], i[n, s]) * 180 / math.pi
+                self.assertAlmostEqual(pha[n, s], _phase_wrap(P + 100.0))
+
+        A, P = np.zeros_like(i), np.zeros_like(i)
+        R = iq2ap(i, q, zero_angle=100.0, amp=A, pha=P)
+        self.assertIs(R[0], A)
+        self.assertIs(R[1], P)
+        assert_equal(A, amp)
+        assert_equal(P, pha)
+
+    def test_unwrap(self):
+        pha = np.linspace(0, 1000, 101)
+        wrapped = phase_wrap(np.stack([pha, -pha]))
+        U = unwrap(wrapped)
+        assert_allclose(U[0], pha, atol=1e-9)
+        assert_allclose(U[1], -pha, atol=1e-9)
+
+        rng = np.random.RandomState(42)
+        noisy = rng.uniform(-180, 180, size=(3, 32))
+        U = unwrap(noisy, max_diff=40.0)
+        for n in range(3):
+            assert_allclose(U[n], _unwrap(noisy[n], 40.0))
+
+        unwrap(noisy, max_diff=40.0, out=noisy)
+        assert_equal(noisy, U)
+
+    def test_stats(self):
+        T = np.arange(10) * 0.5
+        data = np.asarray([np.arange(10.0), np.arange(10.0)[::-1] * 2])
+        S = stats(data, time=T, start=1.0, width=2.0)
+        # window is samples [2, 6)
+        assert_allclose(S.mean, [3.5, 11.0])
+        assert_allclose(S.std, [np.std([2, 3, 4, 5]), np.std([14, 12, 10, 8])])
+        assert_equal(S.min, [2, 8])
+        assert_equal(S.max, [5, 14])
+        assert_equal(S.range, [3, 6])
+        assert_allclose(S.rstd, S.std / S.mean)
+        assert_allclose(S.rms, [np.sqrt(np.mean(np.arange(2, 6)**2)),
+                                np.sqrt(np.mean(np.arange(8, 15, 2)**2))])
+
+        S = stats(data[0])
+        self.assertEqual(S.mean, 4.5)
+        self.assertEqual(S.max, 9)
+
+        self.assertRaises(RuntimeError, stats, data, time=T, start=100.0)
+
+    def test_stats_phase(self):
+        S = stats([[170.0, 200.0]], phase=True)
+        # mean 185 -> -175.  max 200 -> -160, swapped with min 170
+        assert_equal(S.mean, [-175.0])
+        assert_equal(S.min, [-160.0])
+        assert_equal(S.max, [170.0])
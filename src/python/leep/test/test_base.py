@@ -1,7 +1,7 @@
 
 import unittest
 
-from ..base import DeviceBase
+from ..base import DeviceBase, split_index
 
 
 class DummyDevice(DeviceBase):
@@ -64,3 +64,25 @@ class TestTGEN(unittest.TestCase):
             0x0000, 0x30300, 0x0102, 0x0304,
             0x0000, 0x30301, 0x0506, 0x0708,
         ])
+
+
+class TestIndex(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(split_index('reg'), ('reg', None))
+        self.assertEqual(split_index('reg[1]'), ('reg', 1))
+        self.assertEqual(split_index('reg[0x10]'), ('reg', 16))
+        self.assertEqual(split_index('reg[2:]'), ('reg', slice(2, None)))
+        self.assertEqual(split_index('reg[:64]'), ('reg', slice(None, 64)))
+        self.assertEqual(split_index(('reg', 3)), ('reg', 3))
+        self.assertEqual(split_index(('reg', slice(0, 4))),
+                         ('reg', slice(0, 4)))
+        self.assertRaises(RuntimeError, split_index, 'reg[1')
+        self.assertRaises(RuntimeError, split_index, 'reg[x]')
+
+    def test_resolve(self):
+        D = DummyDevice()
+        self.assertEqual(D._resolve_reg('test2')[2:], (0, 2, False))
+        self.assertEqual(D._resolve_reg('test2[1]')[2:], (1, 1, True))
+        self.assertEqual(D._resolve_reg('test2[1:]')[2:], (1, 1, False))
+        self.assertEqual(D._resolve_reg('test1')[2:], (0, 1, True))
+        self.assertRaises(RuntimeError, D._resolve_reg, 'test2[2]')
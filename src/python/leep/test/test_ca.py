@@ -1,6 +1,7 @@
 import logging
 
 import sys
+import time
 import unittest
 import json
 import zlib
@@ -9,7 +10,8 @@ from types import ModuleType
 import numpy as np
 from numpy.testing import assert_equal
 
-from ..base import open
+from ..base import open, DeadlineError
+from ..poller import Poller
 
 _log = logging.getLogger(__name__)
 
@@ -21,6 +23,13 @@ sys.modules['cothread'] = CM
 
 CM.Event = object
 
+
+class Timedout(Exception):
+    pass
+
+
+CM.Timedout = Timedout
+
 CA = ModuleType('cothread.catools')
 sys.modules['cothread.catools'] = CA
 
@@ -28,10 +37,38 @@ _PVs = {}
 
 CA.FORMAT_TIME = 1
 CA.DBR_CHAR_STR = 2
+CA.ca_nothing = type('ca_nothing', (Exception,), {})
+
+_hang = object()  # PV value which never arrives
+
+
+class _Augmented(np.ndarray):
+    raw_stamp = None
+
+
+def _waveform(value, stamp):
+    W = np.asarray(value).view(_Augmented)
+    W.raw_stamp = stamp
+    return W
+
 
+def _get1(name, timeout=None, count=None):
+    if _PVs[name] is _hang:
+        time.sleep(timeout)
+        raise Timedout()
+    if count is not None:
+        return _PVs[name][:count]
+    V = _PVs[name]
+    if isinstance(V, _Augmented):
+        # a new array for each caget()
+        V = _waveform(V.copy(), V.raw_stamp)
+    return V
 
-def caget(name, timeout=None):
-    return _PVs[name]
+
+def caget(name, timeout=None, count=None, format=None):
+    if isinstance(name, list):
+        return [_get1(N, timeout=timeout) for N in name]
+    return _get1(name, timeout=timeout, count=count)
 
 
 CA.caget = caget
@@ -59,6 +96,12 @@ class TestCA(unittest.TestCase):
             'uval': {'input': 'TST:reg_uval_RBV', 'output': 'TST:reg_uval'},
             'sarr': {'input': 'TST:reg_sarr_RBV', 'output': 'TST:reg_sarr'},
             'uarr': {'input': 'TST:reg_uarr_RBV', 'output': 'TST:reg_uarr'},
+            'circle_data': dict({
+                'input0': 'TST:wf0', 'scale0': 'TST:wf0_scale',
+                'input1': 'TST:wf1', 'scale1': 'TST:wf1_scale',
+            }, **dict([('enable%d' % n, 'TST:enable%d' % n)
+                       for n in range(12)])),
+            'wave_samp_per': {'setting': 'TST:wave_samp_per'},
         },
     }
     regmap = {
@@ -90,6 +133,20 @@ class TestCA(unittest.TestCase):
             'base_addr': 102,
             'data_width': 32,
         },
+        'wave_samp_per': {
+            'access': 'rw',
+            'addr_width': 0,
+            'sign': 'unsigned',
+            'base_addr': 104,
+            'data_width': 8,
+        },
+        'chan_keep': {
+            'access': 'rw',
+            'addr_width': 0,
+            'sign': 'unsigned',
+            'base_addr': 105,
+            'data_width': 12,
+        },
     }
 
     def setUp(self):
@@ -164,3 +221,148 @@ class TestCA(unittest.TestCase):
 
             assert_equal(_PVs['TST:reg_sarr'], [0x12345679, -559038737])
             assert_equal(_PVs['TST:reg_uarr'], [0x12345679, -559038737])
+
+    def test_shared_regmap(self):
+        with open('ca://TST:') as dev1, open('ca://TST:') as dev2:
+            self.assertIs(dev1.regmap, dev2.regmap)
+            self.assertRaises(RuntimeError, dev1.expand_regname, 'arr')
+            self.assertIn(('arr',), dev2.regmap._search)
+
+    def test_slice(self):
+        with open('ca://TST:') as dev:
+            _PVs['TST:reg_sarr_RBV'] = _PVs['TST:reg_uarr_RBV'] = np.asarray(
+                [0x12345678, -559038737], dtype='i')
+
+            A, B, C = dev.reg_read(['uarr[1]', 'sarr[1]',
+                                    ('uarr', slice(0, 1))])
+            self.assertEqual(A, 0xdeadbeef)
+            self.assertEqual(B, -559038737)
+            assert_equal(C, [0x12345678])
+
+            _PVs['TST:reg_uarr'] = np.asarray([1, 2], dtype='i')
+
+            dev.reg_write([('uarr[1]', 0xdeadbeef)])
+            assert_equal(_PVs['TST:reg_uarr'], [1, -559038737])
+
+            dev.reg_write([(('uarr', slice(0, 1)), [5])])
+            assert_equal(_PVs['TST:reg_uarr'], [5, -559038737])
+
+    def test_deadline(self):
+        with open('ca://TST:') as dev:
+            _PVs['TST:reg_sval_RBV'] = 1
+            _PVs['TST:reg_uval_RBV'] = _hang
+
+            T0 = time.time()
+            with dev.deadline(0.1):
+                try:
+                    dev.reg_read(['sval', 'uval'])
+                    self.fail('No DeadlineError')
+                except DeadlineError as e:
+                    self.assertEqual((e.done, e.total), (1, 2))
+            self.assertLess(time.time() - T0, 1.0)
+
+            # CA timeouts not caused by a deadline are not changed
+            dev.timeout = 0.2
+            self.assertRaises(Timedout, dev.reg_read, ['uval'])
+            with dev.deadline(10.0):
+                self.assertRaises(Timedout, dev.reg_read, ['uval'])
+
+    def test_channels(self):
+        with open('ca://TST:') as dev:
+            # IOC serves floating point samples
+            _PVs['TST:wf0'] = _waveform([1.5, -2.5, 3.0], 1)
+            _PVs['TST:wf1'] = _waveform([10.0, 20.0, 30.0], 1)
+            _PVs['TST:wf0_scale'] = 2.0
+            _PVs['TST:wf1_scale'] = 10.0
+
+            A, B = dev.get_channels([0, 1], dtype='f4')
+            self.assertEqual(A.dtype, np.float32)
+            assert_equal(A, [0.75, -1.25, 1.5])
+            assert_equal(B, [1.0, 2.0, 3.0])
+            self.assertEqual(A.raw_stamp, 1)
+
+            A, B = dev.get_channels([0, 1])  # scaled in place
+            assert_equal(A, [0.75, -1.25, 1.5])
+            self.assertEqual(A.raw_stamp, 1)
+            # served waveforms are not modified
+            assert_equal(_PVs['TST:wf0'], [1.5, -2.5, 3.0])
+
+            (A, B), scales = dev.get_channels([0, 1], raw=True)
+            self.assertEqual(scales, [2.0, 10.0])
+            assert_equal(A, [1.5, -2.5, 3.0])  # not truncated
+            assert_equal(A / scales[0], [0.75, -1.25, 1.5])
+
+            _PVs['TST:wf0'] = _waveform(np.asarray([1, -2], dtype='i2'), 2)
+            _PVs['TST:wf1'] = _waveform(np.asarray([3, 4], dtype='i2'), 2)
+            (A, B), scales = dev.get_channels([0, 1], raw=True)
+            self.assertEqual(A.dtype, np.int32)
+            assert_equal(A, [1, -2])
+            self.assertEqual(A.raw_stamp, 2)
+            A, B = dev.get_channels([0, 1])
+            assert_equal(A, [0.5, -1.0])
+            self.assertEqual(A.raw_stamp, 2)
+
+    def test_shadow(self):
+        _PVs['TST:wave_samp_per'] = 4
+        for n in range(12):
+            _PVs['TST:enable%d' % n] = int(n < 2)
+
+        with open('ca://TST:') as dev:
+            C = dev._stats.counters
+
+            # registers not listed are not cached
+            dev.enable_shadow(names=['sval'])
+            N = C['ca_get']
+            self.assertEqual(dev.get_decimate(), [4])
+            self.assertEqual(dev.get_channel_mask(), 0xc00)
+            dev.set_decimate(2)
+            self.assertEqual(dev.get_decimate(), [2])
+            self.assertEqual(C['ca_get'] - N, 1 + 12 + 1)
+
+            dev.enable_shadow()
+            N = C['ca_get']
+            self.assertEqual(dev.get_decimate(), [2])
+            self.assertEqual(dev.get_decimate(), [2])
+            self.assertEqual(dev.get_channel_mask(), 0xc00)
+            self.assertEqual(dev.get_channel_mask(), 0xc00)
+            self.assertEqual(C['ca_get'] - N, 1 + 12)
+
+            dev.set_channel_mask([1])
+            self.assertEqual(dev.get_channel_mask(), 0x400)
+            self.assertEqual(C['ca_get'] - N, 1 + 12)
+
+            # cached as chan_keep
+            for n in range(12):
+                _PVs['TST:enable%d' % n] = int(n < 2)
+            dev.invalidate_shadow(['chan_keep'])
+            self.assertEqual(dev.get_channel_mask(), 0xc00)
+            self.assertEqual(C['ca_get'] - N, 1 + 12 + 12)
+
+    def test_poller(self):
+        with open('ca://TST:') as dev:
+            _PVs['TST:reg_sval_RBV'] = -2
+            _PVs['TST:reg_uarr_RBV'] = np.asarray([5, 6], dtype='i')
+
+            values = []
+            P = Poller(dev)
+            G = P.add(['uarr[1]', ('uarr', slice(0, 2)), 'sval'], 0.1,
+                      values.append)
+            self.assertEqual(P.poll(now=G.next_due), [G])
+            self.assertEqual(P.errors, 0)
+
+            (A, B, C), = values
+            self.assertEqual(A, 6)
+            assert_equal(B, [5, 6])
+            self.assertEqual(C, -2)
+
+    def test_transaction(self):
+        with open('ca://TST:') as dev:
+            _PVs['TST:reg_sval_RBV'] = 0x12345678
+            _PVs['TST:reg_uval'] = 0
+
+            with dev.transaction() as tx:
+                tx.write([('uval', 5)])
+                R = tx.read(['sval'])
+
+            self.assertEqual(_PVs['TST:reg_uval'], 5)
+            self.assertEqual(list(R), [0x12345678])
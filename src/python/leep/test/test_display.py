@@ -0,0 +1,39 @@
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_equal
+
+from ..display import envelope
+
+
+class TestDisplay(unittest.TestCase):
+    def test_envelope(self):
+        T = np.arange(1000) * 0.5
+        data = np.zeros((2, 1000), dtype='i4')
+        data[0, 123] = 7  # spike
+        data[1] = np.arange(1000)
+
+        T2, E = envelope(data, T, buckets=100)
+        self.assertEqual(E.shape, (2, 200))
+        self.assertEqual(E.dtype, data.dtype)
+        assert_equal(T2[:4], [0.0, 0.0, 5.0, 5.0])
+        # spike preserved in bucket 12
+        self.assertEqual(E[0].max(), 7)
+        assert_equal(E[0, 24:26], [0, 7])
+        assert_equal(E[1, :4], [0, 9, 10, 19])
+        assert_equal(E[1, -2:], [990, 999])
+
+    def test_uneven(self):
+        data = np.arange(10.0)
+        T, E = envelope(data, buckets=3)
+        self.assertIsNone(T)
+        # buckets [0, 3), [3, 6), [6, 10)
+        assert_equal(E, [0, 2, 3, 5, 6, 9])
+
+    def test_short(self):
+        data = np.arange(10.0)
+        T, E = envelope(data, np.arange(10), buckets=5)
+        self.assertIs(E, data)
+        self.assertRaises(RuntimeError, envelope, data, np.arange(9))
+        self.assertRaises(RuntimeError, envelope, data, buckets=0)
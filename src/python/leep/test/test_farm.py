@@ -0,0 +1,43 @@
+
+import unittest
+import time
+
+from numpy.testing import assert_allclose
+
+from ..raw import yscale_rfs
+from ..ring import shared_memory
+from ..farm import Farm
+from .test_raw import AcqServer
+
+
+@unittest.skipIf(shared_memory is None, 'requires shared_memory')
+class TestFarm(unittest.TestCase):
+    def setUp(self):
+        self.servs = [AcqServer(), AcqServer()]
+        for i, S in enumerate(self.servs):
+            S.data[206] = i + 1  # setp
+
+    def tearDown(self):
+        [S.join() for S in self.servs]
+
+    def test_capture(self):
+        _shift, Ymax = yscale_rfs(1)
+        with Farm([S.url for S in self.servs], [0, 1], nsamp=8,
+                  restart_delay=0.0) as F:
+            F.start()
+            data, stamps = F.capture()
+            self.assertEqual(data.shape, (2, 2, 8))
+            self.assertEqual(len(stamps), 2)
+            for i in range(2):
+                assert_allclose(data[i, 0, :2] * Ymax,
+                                [(i + 1) * 100, (i + 1) * 100 + 2])
+
+            # a failed worker is restarted
+            M = F.members[0]
+            M.proc.terminate()
+            M.proc.join()
+            deadline = time.time() + 5.0
+            while M.restarts == 0 and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(M.restarts, 1)
+            F.capture()
@@ -0,0 +1,76 @@
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from numpy.testing import assert_equal
+
+from ..base import open as leep_open
+from .test_raw import SimServer
+
+
+class TestFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.json = os.path.join(self.dir, 'regmap.json')
+        with open(self.json, 'w') as F:
+            json.dump(SimServer.regmap, F)
+        self.url = 'file://' + self.json
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_readwrite(self):
+        with leep_open(self.url) as dev:
+            self.assertEqual(dev.reg_read(['sval', 'uval']), [0, 0])
+
+            dev.reg_write([('sval', -2), ('uval', 0xdeadbeef),
+                           ('uarr', [1, 2]), ('sarr[1]', -3)])
+            S, U, UA, SA = dev.reg_read(['sval', 'uval', 'uarr', 'sarr'])
+            self.assertEqual(S, -2)
+            self.assertEqual(U, 0xdeadbeef)
+            assert_equal(UA, [1, 2])
+            assert_equal(SA, [0, -3])
+            self.assertEqual(dev.exchange([101])[0], 0xfffffffd)
+
+            with dev.transaction() as tx:
+                tx.write([('uval', 5)])
+                R = tx.read(['uval'])
+            self.assertEqual(R.value, [5])
+
+    def test_preload(self):
+        dump = os.path.join(self.dir, 'capture.initial')
+        with open(dump, 'w') as F:
+            F.write('0000002a ffffffff sval\n')
+            F.write('00000067 00000007 uarr[1]\n')
+
+        with leep_open(self.url, initial=dump) as dev:
+            self.assertEqual(dev['sval'], -1)
+            assert_equal(dev['uarr'], [0, 7])
+
+        with leep_open(self.url, initial={43: 4}) as dev:
+            self.assertEqual(dev['uval'], 4)
+
+    def test_image(self):
+        image = os.path.join(self.dir, 'image.bin')
+        with leep_open(self.url, image=image) as dev:
+            dev['uval'] = 9
+
+        with leep_open(self.url, image=image) as dev:
+            self.assertEqual(dev['uval'], 9)
+
+    def test_sparse(self):
+        image = os.path.join(self.dir, 'image.bin')
+        with leep_open(self.url, image=image) as dev:
+            # only the addresses of registers are kept
+            self.assertEqual(os.path.getsize(image), 4 * (2 + 4))
+            dev.exchange([103], [5])
+            assert_equal(dev['uarr'], [0, 5])
+            self.assertRaises(RuntimeError, dev.exchange, [99999])
+            self.assertRaises(RuntimeError, dev.exchange, [44, 42], [1, 2])
+            self.assertEqual(dev['sval'], 0)
+
+        self.assertRaises(RuntimeError, leep_open, self.url,
+                          initial={99999: 1})
@@ -0,0 +1,45 @@
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ..base import open
+from ..raw import yscale_rfs
+from ..group import group_capture
+from .test_raw import AcqServer
+
+
+class TestGroup(unittest.TestCase):
+    def setUp(self):
+        self.servs = [AcqServer(), AcqServer()]
+        for i, S in enumerate(self.servs):
+            S.data[200] = 5 + i  # dsp_tag
+            S.data[206] = i + 1  # setp
+
+    def tearDown(self):
+        [S.join() for S in self.servs]
+
+    def test_capture(self):
+        devs = [open(S.url) for S in self.servs]
+        try:
+            G = group_capture(devs, [0, 1])
+        finally:
+            [D.close() for D in devs]
+
+        self.assertEqual(G.data.shape, (2, 2, 8))
+        self.assertEqual(G.tags, [5, 6])
+        _shift, Ymax = yscale_rfs(1)
+        for i in range(2):
+            assert_allclose(G.data[i, 0] * Ymax,
+                            (i + 1) * 100 + np.arange(0, 16, 2))
+            assert_allclose(G.data[i, 1] * Ymax,
+                            (i + 1) * 100 + np.arange(1, 16, 2))
+            self.assertLessEqual(G.armed[i], G.ready[i])
+
+    def test_error(self):
+        devs = [open(S.url) for S in self.servs]
+        try:
+            self.assertRaises(RuntimeError, group_capture, devs, [2])
+        finally:
+            [D.close() for D in devs]
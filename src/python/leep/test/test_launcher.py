@@ -0,0 +1,179 @@
+import logging
+
+import os
+import sys
+import time
+import signal
+import unittest
+import subprocess as sp
+
+from . import test_ca  # noqa: F401  installs fake cothread
+
+import cothread
+import cothread.catools as ca
+import feed_launcher as FL
+
+_log = logging.getLogger(__name__)
+
+
+class _Queue(object):
+    # stand in for cothread.EventQueue
+    def __init__(self, *vals):
+        self.vals = list(vals)
+
+    def Signal(self, val):
+        self.vals.append(val)
+
+    def Wait(self):
+        return self.vals.pop(0)
+
+
+class _Recorder(object):
+    # stand in for StatusWriter
+    def __init__(self):
+        self.writes = []
+
+    def put(self, pv, value):
+        self.writes.append((pv, value))
+
+
+class _Ret(object):
+    def __init__(self, name, ok):
+        self.name, self.ok = name, ok
+
+
+class TestLauncher(unittest.TestCase):
+    def setUp(self):
+        self._writer = FL.writer
+        FL.writer = _Recorder()
+        FL.ProcControl.by_pid.clear()
+
+    def tearDown(self):
+        FL.writer = self._writer
+        FL.ProcControl.by_pid.clear()
+
+    def proc(self, *vals):
+        # a ProcControl without its CA subscriptions and runner
+        P = FL.ProcControl.__new__(FL.ProcControl)
+        P.pref = 'TST:'
+        P.args = [sys.executable, '-c', 'pass']
+        P.logto, P.launch_args = None, {}
+        P.evt = _Queue(*vals)
+        P.child = None
+        P.current_status = None
+        return P
+
+    def reap(self, P):
+        # as for SIGCHLD, until P has been notified
+        T0 = time.time()
+        while P.child.pid in FL.ProcControl.by_pid:
+            self.assertLess(time.time() - T0, 5.0)
+            FL.reap_all()
+            time.sleep(0.01)
+
+    def test_status(self):
+        P = self.proc()
+        P.set_status(0)
+        P.set_status(0)
+        P.check_status()  # no child
+        self.assertEqual(FL.writer.writes, [('TST:STS', 0)])
+
+        P.handle_start()
+        P.handle_start()  # already running
+        self.assertEqual(P.current_status, 2)
+        self.assertEqual(FL.writer.writes[1], ('TST:STS', 2))
+        self.assertEqual([W[0] for W in FL.writer.writes], ['TST:STS'] * 2 +
+                         ['TST:TS'])
+
+        self.reap(P)
+        self.assertEqual(P.evt.vals, [FL.sigchld])
+        P.check_status()
+        P.check_status()
+        self.assertEqual(P.child.returncode, 0)
+        self.assertEqual(FL.writer.writes[3:], [('TST:STS', 1)])
+
+    def test_reap_signaled(self):
+        P = self.proc()
+        P.args = [sys.executable, '-c', 'import time; time.sleep(30)']
+        P.handle_start()
+        P.handle_abort()
+        self.reap(P)
+        self.assertEqual(P.child.returncode, -signal.SIGKILL)
+        P.check_status()
+        self.assertEqual(P.current_status, 0)  # Crash
+
+    def test_reap_unknown(self):
+        child = sp.Popen([sys.executable, '-c', 'pass'])
+        T0 = time.time()
+        while True:
+            self.assertLess(time.time() - T0, 5.0)
+            FL.reap_all()
+            try:
+                os.kill(child.pid, 0)
+            except OSError:
+                break  # reaped
+            time.sleep(0.01)
+        child.returncode = 0  # not for Popen to reap
+        self.assertEqual(FL.ProcControl.by_pid, {})
+
+    def test_start_before_sigchld(self):
+        P = self.proc()
+        P.handle_start()
+        first = P.child
+        # wait until exited, but not reaped
+        if hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, first.pid, os.WEXITED | os.WNOWAIT)
+        else:  # py2
+            time.sleep(1.0)
+
+        P.evt = _Queue(FL.start, FL.join)
+        P.loop()
+        # restarted
+        self.assertIsNot(P.child, first)
+        self.assertEqual(first.returncode, 0)
+        self.assertEqual(P.current_status, 2)
+        self.assertEqual([W for W in FL.writer.writes if W[0] == 'TST:STS'],
+                         [('TST:STS', 2), ('TST:STS', 1), ('TST:STS', 2)])
+        self.reap(P)
+
+
+class TestStatusWriter(unittest.TestCase):
+    def setUp(self):
+        self.callbacks, self.puts = [], []
+        self._Callback = getattr(cothread, 'Callback', None)
+        self._caput = ca.caput
+        cothread.Callback = self.callbacks.append
+
+        def caput(pvs, values, wait=True, throw=True):
+            self.assertFalse(wait)
+            self.assertFalse(throw)
+            self.puts.append((pvs, values))
+            return [_Ret(N, N != 'TST:BAD') for N in pvs]
+        ca.caput = caput
+
+    def tearDown(self):
+        ca.caput = self._caput
+        if self._Callback is None:
+            del cothread.Callback
+        else:
+            cothread.Callback = self._Callback
+
+    def test_flush(self):
+        W = FL.StatusWriter()
+        W.put('TST:STS', 2)
+        W.put('TST:TS', 'now')
+        W.put('TST:STS', 1)  # latest value wins
+        W.put('TST:BAD', 0)
+        # one flush scheduled
+        self.assertEqual(self.callbacks, [W.flush])
+        self.assertEqual(self.puts, [])
+
+        self.callbacks.pop()()
+        self.assertEqual(self.puts, [(['TST:STS', 'TST:TS', 'TST:BAD'],
+                                      [1, 'now', 0])])
+
+        W.flush()  # nothing pending
+        self.assertEqual(len(self.puts), 1)
+
+        W.put('TST:STS', 0)
+        self.assertEqual(self.callbacks, [W.flush])
@@ -4,13 +4,23 @@ import logging
 import unittest
 import json
 import zlib
+import hashlib
 import threading
 import socket
+import select
+import struct
+import time
+from io import StringIO, BytesIO
 
 import numpy as np
-from numpy.testing import assert_equal
+from numpy.testing import assert_equal, assert_allclose
 
-from ..base import open
+from ..base import open, RomError, DeadlineError
+from ..raw import _RomParser, yscale_rfs
+from ..stats import exposition
+from ..coalesce import SingleFlight
+from ..poller import Poller
+from ..mux import MuxTransport
 
 _log = logging.getLogger(__name__)
 
@@ -56,16 +66,23 @@ class SimServer(object):
         self.url = 'leep://%s:%d' % self.S.getsockname()
         _log.info('SimServer %s starting', self.url)
 
-        blob = zlib.compress(json.dumps(self.regmap).encode('utf-8'), 9)
+        J = json.dumps(self.regmap).encode('utf-8')
+        blob = zlib.compress(J, 9)
         if len(blob) & 1:
             blob = blob + b'\0'
         RM = np.frombuffer(blob, '>H')
         assert len(RM) <= 0x3fff
-        rom = np.zeros(1+len(RM), dtype='>I')  # high half-word not used
-        rom[0] = 0xc000 | len(RM)
-        rom[1:] = RM
+        H = np.frombuffer(hashlib.sha1(J).digest(), '>H')
+        rom = np.zeros(2*(1+len(H)) + 1+len(RM), dtype='>I')
+        rom[0] = 0x8000 | len(H)  # JSON hash
+        rom[1:11] = H
+        rom[11] = 0x8000 | len(H)  # code hash (dummy)
+        rom[22] = 0xc000 | len(RM)  # JSON
+        rom[23:] = RM
 
         self.data = dict([(0x800+i, val) for i, val in enumerate(rom)])
+        self.nrequests = 0
+        self.reply_limit = None  # ignore requests beyond this count
 
         self.running = True
         self.T = threading.Thread(target=self.run)
@@ -92,6 +109,10 @@ class SimServer(object):
             if not self.running:
                 break
             _log.debug('Request from %s', src)
+            self.nrequests += 1
+            if self.reply_limit is not None and \
+                    self.nrequests > self.reply_limit:
+                continue
 
             buf = np.frombuffer(buf, dtype='>I')
             buf = buf.copy()
@@ -104,14 +125,62 @@ class SimServer(object):
                 else:
                     # write
                     if buf[i+1] == 0:
-                        self.data.pop(addr)
+                        self.data.pop(addr, None)
                     else:
                         self.data[addr] = buf[i+1]
+                    self.on_write(addr, buf[i+1])
 
             _log.debug('Reply to %s', src)
             self.S.sendto(buf.tobytes(), src)
         print('ran')
 
+    def on_write(self, addr, value):
+        pass
+
+
+def _reg(addr, width=0, dwidth=32):
+    return {
+        'access': 'rw',
+        'addr_width': width,
+        'sign': 'unsigned',
+        'base_addr': addr,
+        'data_width': dwidth,
+    }
+
+
+class AcqServer(SimServer):
+    """Simulates acquisition of a waveform which reflects 'setp'
+    """
+    regmap = dict(SimServer.regmap, **{
+        'dsp_tag': _reg(200),
+        'circle_buf_flip': _reg(201),
+        'llrf_circle_ready': _reg(202),
+        'chan_keep': _reg(203, dwidth=12),
+        'wave_samp_per': _reg(204),
+        'wave_shift': _reg(205),
+        'setp': _reg(206),
+        'slow_data': _reg(0x100, width=6, dwidth=8),
+        'circle_data': _reg(0x200, width=4),
+    })
+
+    def __init__(self):
+        SimServer.__init__(self)
+        self.data[203] = 0xc00  # channels 0 and 1
+        self.data[204] = 1
+        self.stale = 0  # number of acquisitions to start before a tag change
+
+    def on_write(self, addr, value):
+        if addr != 201:
+            return
+        T = self.data.get(200, 0)
+        if self.stale:
+            self.stale -= 1
+            T = (T - 1) & 0xff
+        self.data[0x100 + 33] = self.data[0x100 + 34] = T
+        for i in range(16):
+            self.data[0x200 + i] = self.data.get(206, 0) * 100 + i
+        self.data[202] = 1
+
 
 class TestRaw(unittest.TestCase):
     def setUp(self):
@@ -189,3 +258,537 @@ class TestRaw(unittest.TestCase):
             self.assertEqual(self.serv.data[101], 0xdeadbeef)
             self.assertEqual(self.serv.data[102], 0x12345679)
             self.assertEqual(self.serv.data[103], 0xdeadbeef)
+
+    def test_slice(self):
+        with open(self.serv.url) as dev:
+            self.serv.data[100] = self.serv.data[102] = 0x12345678
+            self.serv.data[101] = self.serv.data[103] = 0xdeadbeef
+
+            A, B, C, D = dev.reg_read(['uarr[1]', 'sarr[-1]',
+                                       ('uarr', slice(1, 2)), 'sarr[0:0]'])
+            self.assertEqual(A, 0xdeadbeef)
+            self.assertEqual(B, -559038737)
+            assert_equal(C, [0xdeadbeef])
+            self.assertEqual(len(D), 0)
+
+            dev.reg_write([('uarr[1]', 5),
+                           (('sarr', slice(0, 1)), [6])])
+            self.assertEqual(self.serv.data[100], 6)
+            self.assertEqual(self.serv.data[101], 0xdeadbeef)
+            self.assertEqual(self.serv.data[102], 0x12345678)
+            self.assertEqual(self.serv.data[103], 5)
+
+            self.assertRaises(RuntimeError, dev.reg_read, ['uarr[2]'])
+            self.assertRaises(RuntimeError, dev.reg_read, ['uarr[::2]'])
+            self.assertRaises(AssertionError, dev.reg_write,
+                              [('uarr[0:1]', [1, 2])])
+
+    def test_transaction(self):
+        with open(self.serv.url) as dev:
+            self.serv.data[43] = 0x12345678
+            self.serv.data[101] = 0xdeadbeef
+            N = self.serv.nrequests
+
+            with dev.transaction() as tx:
+                R1 = tx.read(['uval', 'sarr[1]'])
+                tx.write([('uval', 42), ('sval', -1)])
+                R2 = tx.read(['uval', 'sval'])
+                self.assertRaises(RuntimeError, lambda: R1.value)
+
+            # one message
+            self.assertEqual(self.serv.nrequests - N, 1)
+
+            A, B = R1
+            self.assertEqual(A, 0x12345678)
+            self.assertEqual(B, -559038737)
+            self.assertEqual(list(R2), [42, -1])
+            self.assertEqual(self.serv.data[43], 42)
+
+    def test_transaction_error(self):
+        with open(self.serv.url) as dev:
+            N = self.serv.nrequests
+            try:
+                with dev.transaction() as tx:
+                    tx.write([('uval', 42)])
+                    raise KeyError('oops')
+            except KeyError:
+                pass
+            self.assertEqual(self.serv.nrequests, N)
+
+    def test_shadow(self):
+        with open(self.serv.url) as dev:
+            self.serv.data[43] = 5
+            dev.enable_shadow(['uval', 'sval'])
+
+            N = self.serv.nrequests
+            self.assertEqual(dev._cached_read(['uval']), [5])
+            self.assertEqual(self.serv.nrequests - N, 1)
+
+            # cached
+            self.serv.data[43] = 6
+            self.assertEqual(dev._cached_read(['uval']), [5])
+            self.assertEqual(self.serv.nrequests - N, 1)
+
+            # write through
+            dev.reg_write([('uval', 7), ('sval', 0xffffffff)])
+            self.assertEqual(dev._cached_read(['uval', 'sval']), [7, -1])
+            self.assertEqual(self.serv.nrequests - N, 2)
+
+            dev.invalidate_shadow(['uval'])
+            self.serv.data[43] = 8
+            self.assertEqual(dev._cached_read(['uval', 'sval']), [8, -1])
+            self.assertEqual(self.serv.nrequests - N, 3)
+
+            dev.disable_shadow()
+            self.serv.data[43] = 9
+            self.assertEqual(dev._cached_read(['uval']), [9])
+
+            # registers not listed are always read
+            dev.enable_shadow(['sval'])
+            self.assertEqual(dev._cached_read(['uval', 'sval']), [9, -1])
+            self.serv.data[43] = 10
+            N = self.serv.nrequests
+            self.assertEqual(dev._cached_read(['uval', 'sval']), [10, -1])
+            self.assertEqual(self.serv.nrequests - N, 1)
+            self.assertNotIn('uval', dev._shadow)
+
+    def test_threadsafe(self):
+        self.serv.data[42] = 0xdeadbeef
+        self.serv.data[102] = 1
+        self.serv.data[103] = 2
+        errors = []
+
+        with open(self.serv.url, threadsafe=True, timeout=1.0) as dev:
+            def work():
+                try:
+                    for _i in range(20):
+                        S, A = dev.reg_read(['sval', 'uarr'])
+                        self.assertEqual(S, -559038737)
+                        assert_equal(A, [1, 2])
+                except Exception as e:
+                    errors.append(e)
+
+            workers = [threading.Thread(target=work) for _i in range(8)]
+            [T.start() for T in workers]
+            [T.join() for T in workers]
+
+            self.assertEqual(errors, [])
+            C = dev.stats()['counters']
+            self.assertEqual(C['replies_nonce_mismatch'], 0)
+            self.assertEqual(dev._mux.unmatched, 0)
+
+    def test_shared_transport(self):
+        serv2 = SimServer()
+        self.serv.data[43] = 1
+        serv2.data[43] = 2
+        try:
+            for thread in (True, False):
+                T = MuxTransport(thread=thread)
+                errors = []
+                with open(self.serv.url, transport=T, timeout=1.0) as dev1, \
+                        open(serv2.url, transport=T, timeout=1.0) as dev2:
+                    self.assertIs(dev1.sock, dev2.sock)
+
+                    def work(dev, expect):
+                        try:
+                            for _i in range(20):
+                                self.assertEqual(dev['uval'], expect)
+                        except Exception as e:
+                            errors.append(e)
+
+                    workers = [threading.Thread(target=work, args=args)
+                               for args in [(dev1, 1), (dev2, 2)] * 4]
+                    [W.start() for W in workers]
+                    [W.join() for W in workers]
+
+                self.assertEqual(errors, [])
+                self.assertEqual(T.unmatched, 0)
+                # devices do not close a shared transport
+                self.assertNotEqual(T.fileno(), -1)
+                T.close()
+        finally:
+            serv2.join()
+
+    def test_transport_callback(self):
+        self.serv.data[43] = 5
+        T = MuxTransport(thread=False)
+        try:
+            replies = []
+            dest = self.serv.S.getsockname()
+            msg = np.asarray([1, 0xfffffffe] + [0x1000002b, 0] * 3, '>u4')
+            key = T.register(dest, msg[:2].tobytes(), replies.append)
+            T.sock.sendto(msg.tobytes(), dest)
+            select.select([T], [], [], 1.0)
+            T.handle_read()
+            T.unregister(key)
+            self.assertEqual(len(replies), 1)
+            self.assertEqual(np.frombuffer(replies[0], '>u4')[3], 5)
+        finally:
+            T.close()
+
+    def test_dedup(self):
+        with open(self.serv.url) as dev:
+            self.serv.data[42] = 0xdeadbeef
+            self.serv.data[102] = 1
+            self.serv.data[103] = 2
+            dev.stats(reset=True)
+
+            S1, A1, S2, A2 = dev.reg_read(['sval', 'uarr', 'sval', 'uarr'])
+            self.assertEqual(S1, -559038737)
+            self.assertEqual(S2, -559038737)
+            assert_equal(A1, [1, 2])
+            assert_equal(A2, [1, 2])
+            A1[0] = 5
+            assert_equal(A2, [1, 2])
+
+            # 3 unique addresses
+            self.assertEqual(dev.stats()['counters']['bytes_sent'], 32)
+
+    def test_single_flight(self):
+        self.serv.data[42] = 0xdeadbeef
+        self.serv.data[43] = 3
+        self.serv.data[102] = 1
+        self.serv.data[103] = 2
+        results, errors = [], []
+
+        with open(self.serv.url, threadsafe=True, timeout=1.0) as dev:
+            SF = SingleFlight(dev, window=0.1)
+            N = self.serv.nrequests
+
+            def work(names):
+                try:
+                    results.append(SF.reg_read(names))
+                except Exception as e:
+                    errors.append(e)
+
+            workers = [threading.Thread(target=work, args=(names,))
+                       for names in (['sval'], ['uval', 'sval'],
+                                     ['uarr[1]'], ['uarr'])]
+            [T.start() for T in workers]
+            [T.join() for T in workers]
+
+            self.assertEqual(errors, [])
+            self.assertEqual(self.serv.nrequests - N, 1)
+            results = sorted([repr([np.asarray(V).tolist() for V in R])
+                              for R in results])
+            self.assertEqual(results, [
+                '[-559038737]',
+                '[2]',
+                '[3, -559038737]',
+                '[[1, 2]]',
+            ])
+
+    def test_poller(self):
+        self.serv.data[42] = 0xdeadbeef
+        self.serv.data[43] = 3
+        self.serv.data[102] = 1
+        fast, slow = [], []
+
+        with open(self.serv.url) as dev:
+            P = Poller(dev)
+            GF = P.add(['sval', 'uarr'], 0.1, fast.append)
+            GS = P.add(['uval', 'sval'], 0.2, slow.append)
+            # due times are aligned
+            self.assertLessEqual(GF.next_due, GS.next_due)
+            self.assertEqual(P.poll(now=GF.next_due - 0.05), [])
+
+            N = self.serv.nrequests
+            self.assertEqual(P.poll(now=GS.next_due), [GF, GS])
+            # one message for both groups
+            self.assertEqual(self.serv.nrequests - N, 1)
+
+            self.assertEqual(len(fast), 1)
+            self.assertEqual(fast[0][0], -559038737)
+            assert_equal(fast[0][1], [1, 0])
+            self.assertEqual(slow, [[3, -559038737]])
+
+            GF.next_due -= 1.0
+            self.assertEqual(P.poll(), [GF])
+            self.assertGreaterEqual(GF.misses, 5)
+            self.assertEqual(GS.misses, 0)
+
+            R = P.report()
+            self.assertEqual(R['ticks'], 2)
+            self.assertEqual(R['errors'], 0)
+            self.assertEqual(R['groups'][0]['count'], 2)
+            self.assertEqual(R['groups'][0]['latency']['count'], 2)
+            self.assertEqual(R['groups'][1]['count'], 1)
+
+    def test_watch(self):
+        self.serv.data[42] = 1
+        self.serv.data[43] = 0x10
+        self.serv.data[102] = 1
+        changes = []
+
+        with open(self.serv.url) as dev:
+            # background polling would share the plain socket
+            self.assertRaises(RuntimeError, dev.watch, ['sval'],
+                              changes.append)
+
+        with open(self.serv.url, threadsafe=True) as dev:
+            W = dev.watch(['sval', 'uval', 'uarr'], changes.append,
+                          period=1000.0, mask=[~0, 0xf, ~0])
+            P = dev._poller
+            P.stop()  # poll explicitly
+
+            P.poll(now=W.group.next_due)
+            self.assertEqual(len(changes), 1)
+            self.assertEqual([N for N, V in changes[0]],
+                             ['sval', 'uval', 'uarr'])
+
+            P.poll(now=W.group.next_due)
+            self.assertEqual(len(changes), 1)  # no change
+
+            self.serv.data[43] = 0x20  # masked
+            self.serv.data[103] = 5
+            P.poll(now=W.group.next_due)
+            self.assertEqual(len(changes), 2)
+            (name, value), = changes[1]
+            self.assertEqual(name, 'uarr')
+            assert_equal(value, [1, 5])
+
+            self.serv.data[42] = 2
+            self.serv.data[43] = 0x21
+            P.poll(now=W.group.next_due)
+            self.assertEqual(changes[2], [('sval', 2), ('uval', 0x21)])
+
+            W.cancel()
+            self.assertEqual(P.groups, [])
+
+    def test_watch_concurrent(self):
+        self.serv.data[42] = 1
+        changes = []
+
+        with open(self.serv.url, threadsafe=True) as dev:
+            W = dev.watch(['sval', 'uarr'], changes.append, period=0.001)
+            # main thread polls while the watch thread does
+            i, end = 0, time.time() + 5.0
+            while (i < 200 or W.group.count < 20) and time.time() < end:
+                i += 1
+                self.serv.data[43] = i
+                uval, = dev.reg_read(['uval'])
+                self.assertEqual(uval, i)
+            W.cancel()
+
+            self.assertGreaterEqual(W.group.count, 20)
+            self.assertEqual(changes[0][0], ('sval', 1))
+            self.assertEqual(dev.stats()['counters']['timeouts'], 0)
+
+    def test_capture(self):
+        self.serv.data[43] = 0x12345678
+        with open(self.serv.url) as dev:
+            C = dev.enable_capture(size=3)
+            dev.reg_read(['sval'])
+            dev.reg_read(['uval'])
+            self.assertEqual(len(C.ring), 3)  # oldest dropped
+
+            F = BytesIO()
+            C.write(F)
+            F = F.getvalue()
+
+        magic, _vmaj, _vmin, _zone, _sig, _snap, link = struct.unpack(
+            '<IHHiIII', F[:24])
+        self.assertEqual((magic, link), (0xa1b2c3d4, 101))
+        pkts, F = [], F[24:]
+        while F:
+            _sec, _usec, N, _orig = struct.unpack('<IIII', F[:16])
+            pkts.append(F[16:16 + N])
+            F = F[16 + N:]
+        self.assertEqual(len(pkts), 3)
+
+        port = self.serv.S.getsockname()[1]
+        # UDP ports of received reply, request, and reply
+        self.assertEqual([struct.unpack('!HH', P[20:24]) for P in pkts], [
+            (port, dev._local[1]),
+            (dev._local[1], port),
+            (port, dev._local[1]),
+        ])
+        reply = np.frombuffer(pkts[2][28:], '>I')
+        self.assertEqual(reply[2:4].tolist(), [0x1000002b, 0x12345678])
+
+    def test_deadline(self):
+        with open(self.serv.url, timeout=1.0) as dev:
+            with dev.deadline(10.0):
+                with dev.deadline(0.1):
+                    self.assertLess(dev._remaining(), 0.2)
+                self.assertGreater(dev._remaining(), 5.0)
+            self.assertIsNone(dev._remaining())
+
+            # first message of three is answered
+            self.serv.reply_limit = self.serv.nrequests + 1
+            T0 = time.time()
+            with dev.deadline(0.2):
+                try:
+                    dev.exchange(range(200, 500))
+                    self.fail('No DeadlineError')
+                except DeadlineError as e:
+                    self.assertEqual((e.done, e.total), (127, 300))
+                    self.assertIn('after 127 of 300', str(e))
+                self.assertLess(time.time() - T0, 1.0)
+
+            # expired, so fails without sending
+            sent = dev.stats()['counters']['packets_sent']
+            with dev.deadline(0.0):
+                self.assertRaises(DeadlineError, dev.reg_read, ['sval'])
+            self.assertEqual(sent, dev.stats()['counters']['packets_sent'])
+
+    def test_shared_regmap(self):
+        with open(self.serv.url) as dev1:
+            N1 = self.serv.nrequests
+            with open(self.serv.url) as dev2:
+                N2 = self.serv.nrequests - N1
+
+                self.assertIs(dev1.regmap, dev2.regmap)
+                self.assertEqual(dev1.jsonhash, dev2.jsonhash)
+                # second open only reads the preamble
+                self.assertEqual(N2, 1)
+                self.assertLess(N2, N1)
+
+    def test_stats(self):
+        with open(self.serv.url) as dev:
+            dev.stats(reset=True)
+
+            dev.reg_read(['sval', 'uarr'])
+            dev.reg_write([('sval', 1)])
+
+            S = dev.stats()
+            self.assertEqual(S['labels']['backend'], 'leep')
+            self.assertEqual(S['counters']['packets_sent'], 2)
+            self.assertEqual(S['counters']['packets_received'], 2)
+            self.assertEqual(S['counters']['bytes_sent'], 64)
+            self.assertEqual(S['counters']['replies_nonce_mismatch'], 0)
+            self.assertEqual(S['latency']['reg_read']['count'], 1)
+            self.assertEqual(S['latency']['reg_write']['count'], 1)
+            self.assertEqual(S['latency']['reg_read']['buckets'][-1][1], 1)
+
+            txt = exposition([dev])
+            self.assertIn('# TYPE leep_op_seconds histogram\n', txt)
+            self.assertIn('leep_packets_sent_total{backend="leep",'
+                          'device="%s:%d"} 2\n' % dev.dest, txt)
+            self.assertIn('leep_op_seconds_count{backend="leep",'
+                          'device="%s:%d",op="reg_read"} 1\n' % dev.dest,
+                          txt)
+
+            dev.stats(reset=True)
+            self.assertEqual(dev.stats()['counters']['packets_sent'], 0)
+
+    def test_trace(self):
+        with open(self.serv.url) as dev:
+            self.assertFalse(dev.trace)
+            self.assertNotIn('reg_read', dev.__dict__)
+
+            dev.trace = True
+            self.assertIn('reg_read', dev.__dict__)
+
+            self.serv.data[43] = 0x12345678
+            dev.reg_write([('sval', 5)])
+            dev.reg_read(['uval', 'uarr'])
+
+            dev.trace = False
+            self.assertNotIn('reg_read', dev.__dict__)
+            dev.reg_read(['uval'])
+
+            R = dev.tracer.records()
+            self.assertEqual([(r.op, r.name, r.addr) for r in R], [
+                ('write', 'sval', 42),
+                ('read', 'uval', 43),
+                ('read', 'uarr', 102),
+            ])
+            self.assertEqual(R[0].value, 5)
+            self.assertEqual(R[1].value, 0x12345678)
+            self.assertEqual(R[2].length, 2)
+
+            out = StringIO()
+            dev.tracer.dump(out)
+            lines = out.getvalue().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[1].endswith(' read uval 0x00002b 12345678'),
+                            lines[1])
+
+            # large arrays are not retained
+            dev.tracer.clear()
+            dev.tracer.max_values = 1
+            dev.trace = True
+            self.serv.data[102] = 3
+            A, = dev.reg_read(['uarr'])
+            R, = dev.tracer.records()
+            assert_equal(R.value, [3])
+            self.assertEqual(R.length, 2)
+            self.assertIsNot(R.value.base, A)
+            out = StringIO()
+            dev.tracer.dump(out)
+            self.assertTrue(out.getvalue().endswith(' 3 ... (2)\n'),
+                            out.getvalue())
+            dev.trace = False
+
+
+class TestAcquire(unittest.TestCase):
+    def setUp(self):
+        self.serv = AcqServer()
+
+    def tearDown(self):
+        self.serv.join()
+
+    def test_channels(self):
+        self.serv.on_write(201, 1)  # fill circle_data
+        with open(self.serv.url) as dev:
+            A, B = dev.get_channels([1, 0])
+            self.assertEqual(A.dtype, np.float64)
+
+            C, D = dev.get_channels([1, 0], dtype='f4')
+            self.assertEqual(C.dtype, np.float32)
+            assert_allclose(C, A, rtol=1e-6)
+            assert_allclose(D, B, rtol=1e-6)
+
+            (E, F), scales = dev.get_channels([1, 0], raw=True)
+            self.assertEqual(E.dtype, np.int32)
+            assert_allclose(E, np.arange(1, 16, 2))
+            assert_allclose(F, np.arange(0, 16, 2))
+            _shift, Ymax = yscale_rfs(1)
+            self.assertEqual(scales, [Ymax, Ymax])
+            assert_allclose(E / scales[0], A)
+
+
+class TestRomParser(unittest.TestCase):
+    def build_rom(self, regmap):
+        def descriptor(type, blob):
+            if len(blob) & 1:
+                blob = blob + b'\0'
+            words = np.frombuffer(blob, '>H')
+            return [(type << 14) | len(words)] + list(words)
+
+        rom = []
+        rom += descriptor(1, b'Test ROM')
+        rom += descriptor(2, b'\x01' * 20)
+        rom += descriptor(2, b'\x02' * 20)
+        rom += descriptor(3, zlib.compress(json.dumps(regmap).encode(), 9))
+        rom += [0]
+        return np.asarray(rom, dtype='>I')
+
+    def test_chunks(self):
+        regmap = dict([('reg%d' % i, {
+            'access': 'rw',
+            'addr_width': 0,
+            'base_addr': i,
+            'data_width': 32,
+            'sign': 'unsigned',
+        }) for i in range(200)])
+        rom = self.build_rom(regmap)
+
+        for step in (1, 7, 127, len(rom)):
+            P = _RomParser()
+            for i in range(0, len(rom), step):
+                P.feed(rom[i:i + step])
+
+            self.assertTrue(P.done)
+            self.assertEqual(P.descript, b'Test ROM')
+            self.assertEqual(P.jsonhash, '0101' * 10)
+            self.assertEqual(P.codehash, '0202' * 10)
+            self.assertEqual(P.json_end, len(rom) - 1)
+            self.assertEqual(P.regmap().to_dict(), regmap)
+
+    def test_truncated(self):
+        rom = self.build_rom({'reg': {'base_addr': 1}})
+        P = _RomParser()
+        P.feed(rom[:-4])
+        self.assertRaises(RomError, P.regmap)
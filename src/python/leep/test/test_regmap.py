@@ -0,0 +1,66 @@
+import unittest
+import json
+import pickle
+
+from numpy.testing import assert_equal
+
+from ..regmap import RegInfo, RegMap, to_jsonable, addr_index
+
+
+class TestRegMap(unittest.TestCase):
+    regmap = {
+        'sval': {
+            'access': 'rw',
+            'addr_width': 0,
+            'sign': 'signed',
+            'base_addr': 42,
+            'data_width': 32,
+        },
+        'noinfo': {},
+        '__metadata__': {
+            'application': 'testing',
+            'tgen_granularity_log2': 0,
+        },
+    }
+
+    def test_mapping(self):
+        M = RegMap(self.regmap)
+        self.assertEqual(len(M), 3)
+        self.assertIn('sval', M)
+        self.assertIsInstance(M['sval'], RegInfo)
+        self.assertEqual(M['sval']['base_addr'], 42)
+        self.assertEqual(M['noinfo'].get('addr_width', 0), 0)
+        self.assertRaises(KeyError, lambda: M['noinfo']['base_addr'])
+        self.assertEqual(M['__metadata__']['application'], 'testing')
+        self.assertEqual(dict(M['noinfo']), {})
+        self.assertEqual(M.to_dict(), self.regmap)
+
+    def test_immutable(self):
+        M = RegMap(self.regmap)
+        self.assertRaises(AttributeError, setattr, M['sval'], 'base_addr', 1)
+        with self.assertRaises(TypeError):
+            M['sval'] = {}
+        self.assertFalse(hasattr(M['sval'], '__dict__'))
+
+    def test_serialize(self):
+        M = RegMap(self.regmap)
+        J = json.dumps(M, default=to_jsonable)
+        self.assertEqual(json.loads(J), self.regmap)
+        self.assertEqual(pickle.loads(pickle.dumps(M)).to_dict(), self.regmap)
+
+    def test_addr_index(self):
+        regmap = dict(self.regmap)
+        regmap['arr'] = {'base_addr': '0x100', 'addr_width': 4}
+        M = RegMap(regmap)
+        index = addr_index(M)
+        self.assertIs(addr_index(M), index)
+
+        self.assertEqual(index.lookup(42), ('sval', 0))
+        self.assertEqual(index.lookup(0x10f), ('arr', 15))
+        self.assertIsNone(index.lookup(41))
+        self.assertIsNone(index.lookup(43))
+        self.assertIsNone(index.lookup(0x110))
+
+        names, offsets = index.lookup_many([0, 42, 0x100, 0x105, 0x110])
+        self.assertEqual(list(names), [None, 'sval', 'arr', 'arr', None])
+        assert_equal(offsets, [-1, 0, 0, 5, -1])
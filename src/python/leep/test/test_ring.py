@@ -0,0 +1,76 @@
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_equal
+
+from ..base import open
+from ..ring import WaveRing, produce, shared_memory
+from .test_raw import AcqServer
+
+
+@unittest.skipIf(shared_memory is None, 'requires shared_memory')
+class TestRing(unittest.TestCase):
+    def test_publish(self):
+        with WaveRing.create(None, nframes=2, nchans=2, nsamp=4) as P:
+            with WaveRing.attach(P.name) as C:
+                self.assertIsNone(C.latest())
+                self.assertIsNone(C.wait(0, timeout=0.01))
+
+                self.assertEqual(P.publish([np.arange(4), np.arange(5)],
+                                           stamp=1.0), 1)
+                seq, stamp, F = C.wait(0)
+                self.assertEqual((seq, stamp), (1, 1.0))
+                assert_equal(F, [[0, 1, 2, 3], [0, 1, 2, 3]])
+
+                P.publish([[1] * 4, [2] * 4])
+                self.assertTrue(C.valid(1))
+                P.publish([[3] * 4, [4] * 4])
+                self.assertFalse(C.valid(1))  # overwritten
+                self.assertIsNone(C.get(1))
+                # the view now sees frame 3
+                assert_equal(F, [[3] * 4, [4] * 4])
+                self.assertEqual(C.latest()[0], 3)
+
+    def test_align(self):
+        with WaveRing.create(None, nframes=2, nchans=3, nsamp=5) as P:
+            # 8 byte sequence numbers are aligned
+            self.assertEqual(P._seq.ctypes.data % 8, 0)
+            self.assertEqual(P._fseq.ctypes.data % 8, 0)
+            P.publish([[1] * 5] * 3)
+            with WaveRing.attach(P.name) as C:
+                self.assertEqual(C.seq, 1)
+
+    def test_short(self):
+        with WaveRing.create(None, nframes=1, nchans=2, nsamp=4) as P:
+            P.publish([np.arange(4), np.arange(4)])
+            P.publish([np.arange(4), np.arange(3)])
+            _seq, _stamp, F = P.latest()
+            assert_equal(F, [[0, 1, 2, 3], [0, 1, 2, np.nan]])
+
+        with WaveRing.create(None, nframes=1, nchans=1, nsamp=4,
+                             dtype='i4') as P:
+            P.publish([np.arange(1, 5)])
+            P.publish([np.arange(1, 3)])
+            assert_equal(P.latest()[2], [[1, 2, 0, 0]])
+
+    def test_produce(self):
+        serv = AcqServer()
+        try:
+            with open(serv.url) as dev:
+                with WaveRing.create(None, nframes=4, nchans=2,
+                                     nsamp=8) as ring:
+                    produce(dev, ring, [0, 1], count=2)
+                    self.assertEqual(ring.seq, 2)
+                    seq, _stamp, F = ring.latest()
+                    assert_equal(F, dev.get_channels([0, 1]))
+                    self.assertGreater(ring.timebase[0, 1], 0)
+
+                # more samples than the device provides
+                with WaveRing.create(None, nframes=4, nchans=1,
+                                     nsamp=10) as ring:
+                    produce(dev, ring, [0], count=1)
+                    self.assertTrue(np.isnan(ring.timebase[0, 8:]).all())
+                    self.assertTrue(np.isnan(ring.latest()[2][0, 8:]).all())
+        finally:
+            serv.join()
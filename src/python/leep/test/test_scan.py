@@ -0,0 +1,72 @@
+
+import logging
+
+import unittest
+import time
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ..base import open, DeadlineError
+from ..raw import yscale_rfs
+from ..scan import scan
+from .test_raw import AcqServer
+
+_log = logging.getLogger(__name__)
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.serv = AcqServer()
+
+    def tearDown(self):
+        self.serv.join()
+
+    def test_scan(self):
+        self.serv.stale = 1
+        done = []
+        with open(self.serv.url) as dev:
+            N = self.serv.nrequests
+            out = scan(dev, [[('setp', V)] for V in (1, 2, 3)], [1, 0],
+                       callback=lambda i, D: done.append(i))
+
+            self.assertEqual(done, [0, 1, 2])
+            self.assertEqual(out.shape, (3, 2, 8))
+            _shift, Ymax = yscale_rfs(1)
+            for i, V in enumerate((1, 2, 3)):
+                assert_allclose(out[i, 0] * Ymax, V*100 + np.arange(1, 16, 2))
+                assert_allclose(out[i, 1] * Ymax, V*100 + np.arange(0, 16, 2))
+
+            # read configuration and tag, then arm, poll, and read for
+            # each point.  plus one retry with poll and re-arm
+            self.assertEqual(self.serv.nrequests - N, 2 + 3 * 3 + 2)
+            self.assertEqual(dev.stats()['counters']['acq_retries'], 1)
+
+    def test_timeout(self):
+        self.serv.stale = 2**30  # tag never matches
+        with open(self.serv.url) as dev:
+            T0 = time.time()
+            self.assertRaises(DeadlineError, dev.wait_for_acq, tag=True,
+                              timeout=0.2)
+            self.assertRaises(DeadlineError, scan, dev, [[]], [0],
+                              timeout=0.2)
+            self.assertLess(time.time() - T0, 1.0)
+            self.assertGreater(dev.stats()['counters']['acq_retries'], 0)
+
+    def test_reject(self):
+        with open(self.serv.url) as dev:
+            self.assertRaises(RuntimeError, scan, dev,
+                              [[('wave_samp_per', 2)]], [0])
+            self.assertRaises(RuntimeError, scan, dev, [[]], [2])
+            self.assertRaises(RuntimeError, scan, dev,
+                              [[('wave_samp_per[0]', 2)]], [0])
+            self.assertRaises(RuntimeError, scan, dev,
+                              [[(('wave_shift', slice(0, 1)), [2])]], [0])
+
+    def test_index(self):
+        with open(self.serv.url) as dev:
+            scan(dev, [[('uarr[1]', 3)]], [0])
+            self.assertEqual(self.serv.data[103], 3)
+            scan(dev, [[(('uarr', slice(0, 2)), [1, 2])]], [0])
+            self.assertEqual(self.serv.data[103], 2)
+            self.assertEqual(self.serv.data[102], 1)
@@ -0,0 +1,60 @@
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ..spectrum import get_window, rfft, Welch
+
+
+class TestSpectrum(unittest.TestCase):
+    def test_window(self):
+        W = get_window('hann', 8)
+        assert_allclose(W, 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(8) / 8))
+        self.assertIs(W, get_window('hann', 8))
+        assert_allclose(get_window('rect', 4), np.ones(4))
+        self.assertRaises(RuntimeError, get_window, 'other', 4)
+        self.assertRaises(RuntimeError, get_window, np.ones(3), 4)
+
+    def test_rfft(self):
+        N, period = 256, 1e-3
+        T = np.arange(N) * period
+        # 2 captures of 2 channels.  amplitudes 1, 2, 3, 4 at 125 Hz
+        data = np.arange(1, 5).reshape(2, 2, 1) * np.sin(2 * np.pi * 125 * T)
+
+        for win in ('rect', 'hann'):
+            F, X = rfft(data, period, window=win)
+            self.assertEqual(X.shape, (2, 2, N // 2 + 1))
+            assert_allclose(F[32], 125.0)
+            assert_allclose(np.abs(X[..., 32]),
+                            np.arange(1, 5).reshape(2, 2) / 2.0)
+
+        # rect is normalized by length, as the IOC
+        F, X = rfft(data, period, window='rect')
+        assert_allclose(X, np.fft.rfft(data) / N)
+
+    def test_welch(self):
+        rng = np.random.RandomState(42)
+        N, period = 1024, 1e-3
+        caps = rng.normal(size=(20, 2, N)) * np.asarray([[1.0], [3.0]])
+
+        W = Welch(N, period, nperseg=256)
+        self.assertEqual(W.nseg, 7)
+        for C in caps[:5]:
+            W.update(list(C))
+        W.update(caps[5:])
+        self.assertEqual(W.count, 20 * 7)
+        self.assertEqual(W.psd.shape, (2, 129))
+
+        # running average equals average of everything at once
+        P = W.periodogram(caps)
+        assert_allclose(W.psd, P.mean(axis=(0, 2)))
+
+        # white noise.  PSD integrates to variance
+        df = W.freq[1]
+        assert_allclose(W.psd.sum(axis=-1) * df, [1.0, 9.0], rtol=0.05)
+        assert_allclose(W.asd, np.sqrt(W.psd))
+
+        W.reset()
+        self.assertIsNone(W.psd)
+        self.assertRaises(RuntimeError, W.update, caps[0, :, :100])
@@ -0,0 +1,155 @@
+"""Register access tracing.
+
+When enabled, the reg_read() and reg_write() methods of a device are
+shadowed by instance attributes which record each register accessed into
+a fixed size ring buffer.  When disabled, these attributes are removed,
+so untraced calls go directly to the class methods.
+
+>>> dev.trace = True
+>>> dev.reg_read(['foo'])
+>>> dev.tracer.dump()
+1600000000.000000 read foo 0x000010 5
+"""
+
+import sys
+import time
+import collections
+
+import numpy
+
+__all__ = (
+    'TraceRecord',
+    'Tracer',
+)
+
+TraceRecord = collections.namedtuple('TraceRecord',
+                                     ['time', 'op', 'name', 'addr', 'value',
+                                      'length'])
+TraceRecord.__doc__ = """One register access.
+
+Array values are truncated to the first Tracer.max_values elements.
+length is the full number of elements, or None for scalars.
+"""
+
+
+class Tracer(object):
+    """Ring buffer of register accesses for one device.
+
+    :param dev: A :py:class:`base.DeviceBase`
+    :param int size: Maximum number of register accesses retained.
+    :param int max_values: Maximum number of elements of array values
+                           retained for each access.
+    """
+
+    def __init__(self, dev, size=4096, max_values=16):
+        self.dev = dev
+        self.max_values = max_values
+        self.ring = collections.deque(maxlen=size)
+        self.active = False
+
+    def install(self):
+        """Begin recording register accesses
+        """
+        if self.active:
+            return
+        dev = self.dev
+        read, write = dev.reg_read, dev.reg_write
+
+        def reg_read(names, instance=[]):
+            ret = read(names, instance=instance)
+            self.record_read(names, ret, instance)
+            return ret
+
+        def reg_write(ops, instance=[]):
+            self.record_write(ops, instance)
+            return write(ops, instance=instance)
+
+        reg_read.__doc__ = read.__doc__
+        reg_write.__doc__ = write.__doc__
+
+        dev.reg_read, dev.reg_write = reg_read, reg_write
+        self.active = True
+
+    def record_read(self, names, values, instance=[]):
+        T = time.time()
+        inst = instance if instance is None else tuple(instance)
+        for name, value in zip(names, values):
+            self.ring.append((T, 'read', name, inst) +
+                             self._truncate(value))
+
+    def record_write(self, ops, instance=[]):
+        T = time.time()
+        inst = instance if instance is None else tuple(instance)
+        for name, value in ops:
+            self.ring.append((T, 'write', name, inst) +
+                             self._truncate(value))
+
+    def _truncate(self, value):
+        # Keep a copy of only the first few elements of an array,
+        # so that large waveforms are not retained.
+        if isinstance(value, (bytes, str)):
+            return value, None
+        try:
+            N = len(value)
+        except TypeError:
+            return value, None  # scalar
+        return numpy.array(value[:self.max_values]), N
+
+    def remove(self):
+        """Stop recording.  Previous records are retained.
+        """
+        if self.active:
+            del self.dev.reg_read
+            del self.dev.reg_write
+            self.active = False
+
+    def clear(self):
+        self.ring.clear()
+
+    def records(self):
+        """:returns: A list of :py:class:`TraceRecord`, oldest first.
+
+        Register names are expanded, and addresses looked up,
+        when records are exported, not when they are recorded.
+        """
+        ret = []
+        for T, op, name, inst, value, length in list(self.ring):
+            addr = None
+            try:
+                if inst is not None:
+                    inst = list(inst)
+                name, info, start, _count, _scalar = self.dev._resolve_reg(
+                    name, instance=inst)
+                addr = info['base_addr']
+                if isinstance(addr, (bytes, str)):
+                    addr = int(addr, 0)
+                addr += start
+            except (KeyError, RuntimeError, TypeError, ValueError):
+                pass  # leave addr=None for fake registers
+            ret.append(TraceRecord(T, op, name, addr, value, length))
+        return ret
+
+    def dump(self, out=None):
+        """Print records, oldest first.
+
+        :param out: A file-like object.  Default is sys.stdout.
+        """
+        out = out or sys.stdout
+        for R in self.records():
+            addr = '-' if R.addr is None else '0x%06x' % R.addr
+            value = _format(R.value)
+            if R.length is not None and R.length > len(R.value):
+                value += ' ... (%d)' % R.length
+            out.write('%.6f %s %s %s %s\n' % (R.time, R.op, R.name,
+                                              addr, value))
+
+
+def _format(value):
+    try:
+        return ' '.join(['%x' % V for V in value])
+    except TypeError:
+        pass
+    try:
+        return '%x' % value
+    except TypeError:
+        return str(value)